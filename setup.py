@@ -49,6 +49,9 @@ extras_require = {
     'docs': [
         'Sphinx>=1.5,<1.6',
     ],
+    'prometheus': [
+        'prometheus-client>=0.7.1',
+    ],
     'tests': tests_require,
 }
 
@@ -57,6 +60,14 @@ for name, reqs in extras_require.items():
     extras_require['all'].extend(reqs)
 
 # Do not include in all requirement
+extras_require['zstd'] = [
+    'zstandard>=0.11.1',
+]
+
+extras_require['parquet'] = [
+    'pyarrow>=0.16.0',
+]
+
 extras_require['xrootd'] = [
     'invenio-xrootd>=1.0.0a6',
     'xrootdpyfs>=0.1.6,<0.2.0',
@@ -140,7 +151,6 @@ install_requires = [
     'python-slugify>=3.0.1',
     'raven>=6.10.0',
     'requests-kerberos>=0.12.0',
-    'sickle>=0.6.4',
     'scikit-learn>=0.20.4',
     'scipy>=1.2.3',
     'uwsgi>=2.0.18',
@@ -294,7 +304,10 @@ setup(
         'dojson.contrib.to_marc21': [
             'zenodo = zenodo.modules.records.serializers.to_marc21.rules',
         ],
-        "invenio_db.alembic": ["zenodo_spam = zenodo.modules.spam:alembic"],
+        "invenio_db.alembic": [
+            "zenodo_metrics = zenodo.modules.metrics:alembic",
+            "zenodo_spam = zenodo.modules.spam:alembic",
+        ],
         "invenio_db.models": ["zenodo_spam = zenodo.modules.spam.models"],
     },
     extras_require=extras_require,
@@ -37,6 +37,8 @@ from mock import MagicMock
 
 from zenodo.modules.auditor.oai import OAIAudit, OAICorrespondenceCheck, \
     OAISetResultCheck
+from zenodo.modules.auditor.utils import sorted_difference, sorted_ids, \
+    sorted_union
 from zenodo.modules.records.resolvers import record_resolver
 
 oai_set_result_count_params = (
@@ -148,10 +150,18 @@ def test_oai_set_result_count(mocker, audit_records, db, es, communities,
     audit = OAIAudit('testAudit', logging.getLogger('auditorTesting'), [])
     check = OAISetResultCheck(audit, Community.get('c1'))
     check.perform()
-    audit.clear_db_oai_set_cache()
 
     result_issues = check.issues.get('missing_ids', {})
     db_issues, es_issues, api_issues = issues
     assert set(result_issues.get('db', [])) == set(db_issues)
     assert set(result_issues.get('es', [])) == set(es_issues)
     assert set(result_issues.get('oai2d', [])) == set(api_issues)
+
+
+def test_sorted_ids_operations():
+    a, b = sorted_ids([3, 1, 2, 3]), sorted_ids([4, 2])
+    assert list(a) == [1, 2, 3]
+    assert list(sorted_union(a, b, sorted_ids())) == [1, 2, 3, 4]
+    assert list(sorted_difference(a, b)) == [1, 3]
+    assert list(sorted_difference(b, a)) == [4]
+    assert list(sorted_difference(a, sorted_ids())) == [1, 2, 3]
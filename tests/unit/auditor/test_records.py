@@ -32,6 +32,8 @@ import pytest
 from invenio_records.models import RecordMetadata
 
 from zenodo.modules.auditor.records import RecordAudit, RecordCheck
+from zenodo.modules.auditor.tasks import audit_records_distributed
+from zenodo.modules.auditor.utils import record_uuid_ranges
 from zenodo.modules.records.api import ZenodoRecord
 
 
@@ -389,3 +391,35 @@ def test_jsonschema(app, record_audit, minimal_record):
     check = RecordCheck(record_audit, ZenodoRecord(minimal_record))
     check.jsonschema()
     assert check.issues.get('jsonschema')
+
+
+def test_record_audit_prefetch(record_audit, minimal_record, db, users,
+                               oaiid_pid):
+    db.session.add(oaiid_pid)
+    db.session.commit()
+    records = [
+        dict(minimal_record, owners=[1, 8], _oai={'id': oaiid_pid.pid_value}),
+        dict(minimal_record, owners=[2, 9], _oai={'id': 'oai:invalid'}),
+    ]
+    record_audit.prefetch(records)
+
+    assert record_audit.missing_owners([1, 2, 8, 9]) == {8, 9}
+    assert record_audit.missing_oai_pids(
+        [oaiid_pid.pid_value, 'oai:invalid']) == {'oai:invalid'}
+    # Values outside of the prefetched chunk are looked up on demand
+    assert record_audit.missing_owners([3, 10]) == {10}
+
+
+def test_audit_records_distributed(app, db, record_with_bucket, tmpdir):
+    pid, record = record_with_bucket
+    record['owners'] = [12345]
+    record.commit()
+    db.session.commit()
+
+    assert record_uuid_ranges(1) == [(record.id, None)]
+
+    logfile = tmpdir.join('audit.log')
+    audit_records_distributed.delay(str(logfile), chunk_size=1)
+    log = logfile.read()
+    assert log.count('"unresolvable": [12345]') == 1
+    assert '"checked": 1' in log
@@ -256,7 +256,8 @@ def default_config(tmp_db_path, spam_domains_forbidden_list_file,
         },
         SEARCH_INDEX_PREFIX='zenodo-test-',
         ZENODO_SPAM_DOMAINS_FORBIDDEN_PATH=spam_domains_forbidden_list_file,
-        ZENODO_SPAM_DOMAINS_SAFELIST_PATH=spam_domains_safelist_file
+        ZENODO_SPAM_DOMAINS_SAFELIST_PATH=spam_domains_safelist_file,
+        ZENODO_RECORDS_SERIALIZATION_CACHE_ENABLED=False,
     )
 
 
@@ -967,6 +968,19 @@ def published_record(db, es, record_with_bucket):
     return record
 
 
+@pytest.yield_fixture
+def serialization_cache(app):
+    """Enable the record serialization cache."""
+    from zenodo.modules.records.serializers.cache import \
+        current_serialization_cache
+    app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_ENABLED'] = True
+    cache = current_serialization_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
+    app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_ENABLED'] = False
+
+
 @pytest.fixture
 def closed_access_record(db, es, record_with_files_creation):
     """Creation of a full record with closed access right."""
@@ -26,10 +26,15 @@
 
 from __future__ import absolute_import, print_function
 
+import bz2
+import json
+from datetime import datetime, timedelta
+
 from invenio_files_rest.models import ObjectVersion
 from invenio_indexer.api import RecordIndexer
 from invenio_search import current_search
 
+from zenodo.modules.exporter import Exporter, ExportRun
 from zenodo.modules.exporter.tasks import export_job
 
 
@@ -42,4 +47,72 @@ def test_exporter(app, db, es, exporter_bucket, record_with_files_creation):
     with app.app_context():
         assert ObjectVersion.get_by_bucket(exporter_bucket).count() == 0
         export_job(job_id='records')
-        assert ObjectVersion.get_by_bucket(exporter_bucket).count() == 1
+        # One object per shard plus the manifest
+        objs = ObjectVersion.get_by_bucket(exporter_bucket).all()
+        assert len(objs) == 9
+        manifest = next(o for o in objs if o.key.endswith('manifest.json'))
+        with manifest.file.storage().open() as fp:
+            data = json.load(fp)
+        assert data['shards'] == 8
+        assert [p['shard'] for p in data['parts']] == list(range(8))
+        assert set(p['key'] for p in data['parts']) == \
+            set(o.key for o in objs if o.key.endswith('.json.bz2'))
+        # The finished run is cleared
+        assert ExportRun.get('records') is None
+
+
+def test_exporter_resume(app, db, es, exporter_bucket,
+                         record_with_files_creation):
+    """Test resuming an unfinished sharded export."""
+    pid, record, record_url = record_with_files_creation
+    RecordIndexer().index_by_id(record.id)
+    current_search.flush_and_refresh('records')
+
+    with app.app_context():
+        run = ExportRun.create('records', 8)
+        for shard_id in range(6):
+            run.checkpoint(shard_id, {'shard': shard_id, 'key': 'done'})
+        assert run.pending_shards == [6, 7]
+
+        export_job(job_id='records')
+        # Only the missing shards and the manifest are written
+        keys = [o.key for o in ObjectVersion.get_by_bucket(exporter_bucket)]
+        assert len(keys) == 3
+        assert any('part-0006-of-0008' in k for k in keys)
+        assert any('part-0007-of-0008' in k for k in keys)
+        assert ExportRun.get('records') is None
+
+
+def test_exporter_delta(app, db, es, exporter_bucket,
+                        record_with_files_creation, monkeypatch):
+    """Test incremental export of the records updated since the base."""
+    pid, record, record_url = record_with_files_creation
+    RecordIndexer().index_by_id(record.id)
+    current_search.flush_and_refresh('records')
+    # Include the records updated within the current second
+    monkeypatch.setitem(
+        app.config, 'EXPORTER_DELTA_LAG', timedelta(seconds=-1))
+
+    with app.app_context():
+        exporter = Exporter(
+            **app.extensions['invenio-exporter'].job('records'))
+        # No deltas without a base dump
+        assert exporter.run_delta() is None
+
+        exporter.publish_base({'key': 'base'}, datetime(2000, 1, 1))
+        entry = exporter.run_delta()
+        assert entry['since'] == '2000-01-01T00:00:00'
+        index = exporter.read_index()
+        assert index['base']['key'] == 'base'
+        assert index['deltas'] == [entry]
+
+        obj = ObjectVersion.get(exporter_bucket.id, entry['key'])
+        with obj.file.storage().open() as fp:
+            lines = bz2.decompress(fp.read()).splitlines()
+        assert [json.loads(l.decode('utf8'))['id'] for l in lines] == \
+            [record['recid']]
+
+        # The next delta starts where the previous one ended
+        entry2 = exporter.run_delta()
+        assert entry2['since'] == entry['until']
+        assert len(exporter.read_index()['deltas']) == 2
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Exporter columnar stream tests."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import date
+
+import pytest
+from six import BytesIO
+
+from zenodo.modules.exporter import ParquetResultStream, record_columns_v1
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+@pytest.fixture()
+def searchobj():
+    """Search object."""
+    class Hit(dict):
+        def __init__(self, *args, **kwargs):
+            super(Hit, self).__init__(*args, **kwargs)
+
+            class Meta(object):
+                id = args[0]['recid']
+
+            self.meta = Meta()
+            self._d_ = args[0]
+
+    class Search(object):
+        def scan(self):
+            return iter([
+                Hit({
+                    'recid': i,
+                    'doi': '10.5072/zenodo.{0}'.format(i),
+                    'conceptrecid': '1',
+                    'resource_type': {'type': 'publication',
+                                      'subtype': 'article'},
+                    'access_right': 'open',
+                    'communities': ['zenodo'],
+                    'publication_date': '2018-01-0{0}'.format(i),
+                    'filecount': 1,
+                    'size': 100,
+                    '_stats': {'views': 10.0, 'downloads': 5.0},
+                }) for i in range(2, 5)
+            ])
+    return Search()
+
+
+def test_parquet_resultstream(searchobj):
+    """Test Parquet result stream."""
+    stream = ParquetResultStream(
+        searchobj, lambda id_, data: id_, record_columns_v1, batch_size=2)
+    data = b''
+    chunk = stream.read()
+    while chunk:
+        data += chunk
+        chunk = stream.read()
+
+    pqfile = pq.ParquetFile(BytesIO(data))
+    assert pqfile.num_row_groups == 2
+    table = pqfile.read().to_pydict()
+    assert table['recid'] == [2, 3, 4]
+    assert table['conceptrecid'] == [1, 1, 1]
+    assert table['resource_subtype'] == ['article'] * 3
+    assert table['communities'] == [['zenodo']] * 3
+    assert table['publication_date'][0] == date(2018, 1, 2)
+    assert table['stats_views'] == [10, 10, 10]
+    assert table['stats_volume'] == [None, None, None]
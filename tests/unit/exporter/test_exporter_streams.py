@@ -27,10 +27,15 @@
 from __future__ import absolute_import, print_function
 
 import bz2
+import gzip
 
 import pytest
+import six
+from six import BytesIO
 
-from zenodo.modules.exporter import BZip2ResultStream, ResultStream
+from zenodo.modules.exporter import BZip2ResultStream, \
+    ParallelCompressedResultStream, ResultStream
+from zenodo.modules.exporter.errors import FailedExportJobError
 
 
 @pytest.fixture()
@@ -86,13 +91,59 @@ def bzip2resultstream(searchobj, serializerobj, fetcher):
 
 def test_resultstream(resultstream):
     """Test result stream serializer."""
+    assert resultstream.read() == b'test 1test 2'
+    assert resultstream.read() == b''
+    assert resultstream.read() == b''
+
+
+def test_resultstream_batches(searchobj, serializerobj, fetcher):
+    """Test result stream serializer batches."""
+    resultstream = ResultStream(
+        searchobj, fetcher, serializerobj, batch_size=1)
     assert resultstream.read() == b'test 1'
     assert resultstream.read() == b'test 2'
     assert resultstream.read() == b''
-    assert resultstream.read() == b''
+    assert resultstream.batch_count == 2
+
+
+def test_resultstream_failures(searchobj, fetcher):
+    """Test result stream serialization failures."""
+    class Serializer(object):
+        def serialize_exporter_many(self, records):
+            return [None if pid == 2 else b'ok' for pid, _ in records]
+
+    resultstream = ResultStream(searchobj, fetcher, Serializer())
+    assert resultstream.read() == b'ok'
+    with pytest.raises(FailedExportJobError) as excinfo:
+        resultstream.read()
+    assert excinfo.value.failed_count == 1
+    assert excinfo.value.total == 2
+    assert excinfo.value.failed_batches == [
+        dict(batch=0, failed=1, sample=[2])]
 
 
-def test_resultstream(bzip2resultstream):
+def test_resultstream_failed_batch(searchobj, fetcher):
+    """Test that a batch without serialized records doesn't end the stream."""
+    class Serializer(object):
+        def serialize_exporter(self, pid, record):
+            if pid == 1:
+                raise ValueError()
+            return b'ok'
+
+        def serialize_exporter_many(self, records):
+            raise ValueError()
+
+    resultstream = ResultStream(
+        searchobj, fetcher, Serializer(), batch_size=1)
+    assert resultstream.read() == b'ok'
+    with pytest.raises(FailedExportJobError) as excinfo:
+        resultstream.read()
+    assert excinfo.value.total == 2
+    assert excinfo.value.failed_batches == [
+        dict(batch=0, failed=1, sample=[1])]
+
+
+def test_bzip2resultstream(bzip2resultstream):
     """Test result stream serializer."""
     c = bz2.BZ2Compressor()
     c.compress(b'test 1')
@@ -101,3 +152,33 @@ def test_resultstream(bzip2resultstream):
 
     assert bzip2resultstream.read() == data
     assert bzip2resultstream.read() == b''
+
+
+@pytest.mark.parametrize('codec,decompress', [
+    ('bz2', bz2.decompress),
+    ('gzip', lambda data: gzip.GzipFile(fileobj=BytesIO(data)).read()),
+])
+def test_parallel_compressed_resultstream(searchobj, serializerobj, fetcher,
+                                          codec, decompress):
+    """Test parallel compressed result stream."""
+    # Use tiny blocks, so that each record is compressed on its own.
+    stream = ParallelCompressedResultStream(
+        searchobj, fetcher, serializerobj, codec=codec, workers=2,
+        block_size=1)
+    data = b''
+    chunk = stream.read()
+    while chunk:
+        data += chunk
+        chunk = stream.read()
+    # Python 2 only reads the first member of a multi-stream BZip2 file
+    if codec != 'bz2' or not six.PY2:
+        assert decompress(data) == b'test 1test 2'
+    assert stream.read() == b''
+
+
+def test_parallel_compressed_resultstream_codecs(searchobj, serializerobj,
+                                                 fetcher):
+    """Test parallel compressed result stream codec validation."""
+    with pytest.raises(ValueError):
+        ParallelCompressedResultStream(
+            searchobj, fetcher, serializerobj, codec='lzma')
@@ -30,7 +30,7 @@ import pytest
 from invenio_files_rest.models import ObjectVersion
 from six import BytesIO
 
-from zenodo.modules.exporter import filename_factory
+from zenodo.modules.exporter import filename_factory, part_filename_factory
 
 
 def test_filename_factory():
@@ -42,6 +42,15 @@ def test_filename_factory():
     assert fname.endswith('.json')
 
 
+def test_part_filename_factory():
+    """Test part filename factory."""
+    factory = part_filename_factory(name='records', format='json.bz2')
+    assert factory('2018-01-01T00:00:00', 3, 8) == \
+        'records-2018-01-01T00:00:00.part-0003-of-0008.json.bz2'
+    assert factory('2018-01-01T00:00:00') == \
+        'records-2018-01-01T00:00:00.json.bz2'
+
+
 def test_bucket_writer(writer):
     """Test bucket writer."""
     writer.open()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2017-2023 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+
+"""Test Zenodo metrics API."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from invenio_cache import current_cache
+
+from zenodo.modules.metrics.api import running_total
+from zenodo.modules.metrics.hyperloglog import HyperLogLog
+
+
+def test_hyperloglog():
+    """Test the HyperLogLog sketch."""
+    assert HyperLogLog().count() == 0
+
+    first, second = HyperLogLog(), HyperLogLog()
+    first.update(str(i) for i in range(10000))
+    first.update(str(i) for i in range(10000))
+    second.update(str(i) for i in range(5000, 20000))
+    assert first.count() == pytest.approx(10000, rel=0.05)
+    assert second.count() == pytest.approx(15000, rel=0.05)
+
+    union = first.merge(second)
+    assert union.count() == pytest.approx(20000, rel=0.05)
+    # Merging does not modify the sketches
+    assert first.count() == pytest.approx(10000, rel=0.05)
+
+    with pytest.raises(ValueError):
+        first.merge(HyperLogLog(precision=10))
+
+
+def test_running_total(app):
+    """Test the incremental computation of the running totals."""
+    today = datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    checkpoint = today - app.config['ZENODO_METRICS_CHECKPOINT_LAG']
+    start = app.config['ZENODO_METRICS_START_DATE']
+    current_cache.delete('ZENODO_METRICS_STORE::test')
+
+    calls = []
+
+    def compute(start, end=None):
+        calls.append((start, end))
+        return 1
+
+    days = [checkpoint + timedelta(days=i)
+            for i in range((today - checkpoint).days)]
+    day_calls = [(d, d + timedelta(days=1)) for d in days]
+
+    assert running_total('test', compute, initial=0) == 2 + len(days)
+    assert calls == [(start, checkpoint)] + day_calls + [(today, None)]
+
+    # Only the current day is computed again
+    del calls[:]
+    assert running_total('test', compute, initial=0) == 2 + len(days)
+    assert calls == [(today, None)]
+
+    # The stored total is advanced to the new checkpoint
+    state = current_cache.get('ZENODO_METRICS_STORE::test')
+    state['checkpoint'] -= timedelta(days=1)
+    current_cache.set('ZENODO_METRICS_STORE::test', state, timeout=-1)
+    del calls[:]
+    assert running_total('test', compute, initial=0) == 3 + len(days)
+    assert calls == [(checkpoint - timedelta(days=1), checkpoint),
+                     (today, None)]
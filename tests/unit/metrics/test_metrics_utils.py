@@ -23,7 +23,12 @@
 # as an Intergovernmental Organization or submit itself to any jurisdiction.
 
 """Test Zenodo metrics utils."""
-from zenodo.modules.metrics.utils import calculate_metrics, formatted_response
+import time
+
+from invenio_cache import current_cache
+
+from zenodo.modules.metrics.utils import calculate_metrics, \
+    formatted_response, get_metrics
 
 
 def test_calculate_metrics(api, db, es, cache, use_metrics_config):
@@ -61,6 +66,32 @@ def test_calculate_metrics(api, db, es, cache, use_metrics_config):
     assert calculated_metrics == expected_data
 
 
+def test_calculate_metrics_timeout(api, db, es, use_metrics_config):
+    api.config['ZENODO_METRICS_DATA']['openaire-nexus'].append({
+        'name': 'zenodo_slow',
+        'help': 'Slow metric',
+        'type': 'gauge',
+        'value': lambda: time.sleep(5) or 1,
+        'timeout': 0.1,
+    })
+    # A metric that times out is left out without blocking the others
+    calculated_metrics = calculate_metrics('openaire-nexus')
+    assert [m['name'] for m in calculated_metrics] == [
+        'zenodo_unique_visitors_web_total', 'zenodo_researchers_total',
+        'zenodo_files_total', 'zenodo_communities_total',
+    ]
+
+    # ...or keeps its last computed value
+    current_cache.set('ZENODO_METRICS_CACHE::openaire-nexus', {
+        'metrics': [{'name': 'zenodo_slow', 'value': 7}],
+        'updated': time.time(),
+    }, timeout=-1)
+    calculated_metrics = calculate_metrics('openaire-nexus')
+    assert calculated_metrics[-1]['name'] == 'zenodo_slow'
+    assert calculated_metrics[-1]['value'] == 7
+    assert get_metrics('openaire-nexus') == calculated_metrics
+
+
 def test_formatted_response(api, use_metrics_config):
     metrics = [
         {
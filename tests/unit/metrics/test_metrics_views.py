@@ -24,8 +24,16 @@
 
 """Test Zenodo metrics views."""
 
+import time
+
+import pytest
 from invenio_cache import current_cache
-from zenodo.modules.metrics.utils import calculate_metrics
+from mock import patch
+
+from zenodo.modules.metrics.tasks import \
+    calculate_metrics as calculate_metrics_task
+from zenodo.modules.metrics.utils import calculate_metrics, refresh_metrics, \
+    release_refresh_lock
 
 
 def test_metrics(api, api_client, db, es, use_metrics_config):
@@ -62,9 +70,52 @@ def test_metrics(api, api_client, db, es, use_metrics_config):
     res = api_client.get("/metrics/openaire-nexus")
     assert res.status_code == 200
     assert res.get_data() == expected_data
+    assert int(res.headers['Age']) < 60
+
+
+def test_metrics_stale(api, api_client, db, es, use_metrics_config):
+    calculate_metrics("openaire-nexus")
+    cached = current_cache.get("ZENODO_METRICS_CACHE::openaire-nexus")
+    cached['updated'] = time.time() - 2 * 60 * 60
+    current_cache.set("ZENODO_METRICS_CACHE::openaire-nexus", cached,
+                      timeout=-1)
+
+    # Stale metrics are served while a single refresh is sent off
+    with patch('zenodo.modules.metrics.tasks.calculate_metrics.delay') \
+            as delay:
+        for _ in range(3):
+            res = api_client.get("/metrics/openaire-nexus")
+            assert res.status_code == 200
+            assert int(res.headers['Age']) >= 2 * 60 * 60
+    delay.assert_called_once_with("openaire-nexus", release_lock=True)
+
+    release_refresh_lock("openaire-nexus")
+    with patch('zenodo.modules.metrics.tasks.calculate_metrics.delay'):
+        assert refresh_metrics("openaire-nexus")
+        assert not refresh_metrics("openaire-nexus")
+
+        # The periodic task doesn't release the lock of a running refresh
+        with patch('zenodo.modules.metrics.utils.calculate_metrics'):
+            calculate_metrics_task("openaire-nexus")
+        assert not refresh_metrics("openaire-nexus")
+    release_refresh_lock("openaire-nexus")
 
 
 def test_metrics_invalid_key(api_client):
         res = api_client.get("/metrics/invalid-key")
         assert res.status_code == 404
         assert res.get_data() == 'Invalid key'
+
+
+def test_instrumentation_metrics(api, api_client):
+    pytest.importorskip('prometheus_client')
+
+    api_client.get("/metrics/invalid-key")
+    res = api_client.get("/metrics")
+    assert res.status_code == 200
+    assert res.content_type.startswith('text/plain')
+    data = res.get_data(as_text=True)
+    assert '# TYPE zenodo_http_request_duration_seconds histogram' in data
+    assert ('zenodo_http_request_duration_seconds_count{'
+            'blueprint="zenodo_metrics",endpoint="zenodo_metrics.metrics",'
+            'method="GET",status="404"}') in data
@@ -161,3 +161,28 @@ def test_apply_version_filters(es, api, query, result):
         url = urlparse(res.json["links"]["self"])
         qs = parse_qs(url.query, keep_blank_values=True)
         assert qs.get("all_versions", [None]) == [result]
+
+
+@pytest.mark.parametrize('mimetype', [
+    'application/x-datacite+xml',
+    'application/marcxml+xml',
+    'application/x-dc+xml',
+])
+def test_search_serialization_cache(es, api, record_with_bucket,
+                                    serialization_cache, mimetype):
+    """Test search results reusing the cached serializations of the hits."""
+    pid, record = record_with_bucket
+    RecordIndexer().index(record)
+    current_search.flush_and_refresh(index='records')
+    with api.test_request_context():
+        url = url_for('invenio_records_rest.recid_list',
+                      q='recid:{0}'.format(record['recid']))
+    with api.test_client() as client:
+        res = client.get(url, headers={'Accept': mimetype})
+        assert res.status_code == 200
+        assert record['title'] in res.get_data(as_text=True)
+        assert any(
+            str(record.id) in k and ':hit:' in k
+            for k in serialization_cache._entries)
+        cached = client.get(url, headers={'Accept': mimetype})
+        assert cached.get_data() == res.get_data()
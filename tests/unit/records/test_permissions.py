@@ -32,10 +32,15 @@ import jwt
 import pytest
 from flask import url_for
 from flask_principal import ActionNeed
+from flask_security import current_user
 from invenio_access.models import ActionUsers
 from invenio_accounts.models import User
+from invenio_cache import current_cache
+from mock import patch
 
 from zenodo.modules.records.models import AccessRight
+from zenodo.modules.records.permissions import get_bucket_record_access, \
+    has_read_files_permission
 
 
 @pytest.mark.parametrize('user,access_right,expected', [
@@ -139,3 +144,68 @@ def test_rat_token(app, db, rat_generate_token, closed_access_record):
         assert res.status_code == 404
         res = client.get(file_url, query_string={'token': rat_token})
         assert res.status_code == 404
+
+
+def test_bucket_record_access(app, db, record_with_files_creation):
+    """Test the cached access information of record buckets."""
+    pid, record, record_url = record_with_files_creation
+    bucket_id = record['_buckets']['record']
+
+    with app.test_request_context():
+        access = get_bucket_record_access(bucket_id)
+        assert access.id == str(record.id)
+        assert access.kind == 'record'
+        assert access['recid'] == record['recid']
+        assert access['access_right'] == record['access_right']
+        assert access['_buckets'] == record['_buckets']
+        with pytest.raises(TypeError):
+            access['recid'] = 1
+
+        # Memoized for the request and cached for the next ones
+        with patch('zenodo.modules.records.permissions.Record.get_record') \
+                as get_record:
+            assert get_bucket_record_access(bucket_id) is access
+            with app.app_context():
+                assert get_bucket_record_access(bucket_id)['recid'] == \
+                    record['recid']
+        assert not get_record.called
+
+        # Invalidated on record commit, and again once the transaction is
+        # committed (e.g. if cached by a concurrent request in between)
+        record['access_right'] = AccessRight.CLOSED
+        record.commit()
+        current_cache.set(
+            'zenodo:bucket-access:{0}'.format(bucket_id), access.dumps())
+        db.session.commit()
+        assert current_cache.get(
+            'zenodo:bucket-access:{0}'.format(bucket_id)) is None
+        assert get_bucket_record_access(bucket_id)['access_right'] == \
+            AccessRight.CLOSED
+
+
+def test_permission_decisions_memoized(app, db, record_with_files_creation):
+    """Test that permission decisions are computed once per request."""
+    pid, record, record_url = record_with_files_creation
+
+    with patch.object(AccessRight, 'get', wraps=AccessRight.get) as get:
+        with app.test_request_context():
+            assert has_read_files_permission(current_user, record)
+            assert has_read_files_permission(current_user, record)
+            assert get.call_count == 1
+
+            # A new revision of the record is checked again
+            record.commit()
+            db.session.commit()
+            assert has_read_files_permission(current_user, record)
+            assert get.call_count == 2
+
+        # ...as well as the same record in another request
+        with app.test_request_context():
+            assert has_read_files_permission(current_user, record)
+            assert get.call_count == 3
+
+        # Plain dictionaries are not memoized
+        with app.test_request_context():
+            has_read_files_permission(current_user, dict(record))
+            has_read_files_permission(current_user, dict(record))
+            assert get.call_count == 5
@@ -29,8 +29,9 @@ from six import BytesIO, b
 
 from zenodo.modules.deposit.api import ZenodoDeposit
 from zenodo.modules.deposit.resolvers import deposit_resolver
+from zenodo.modules.records.indexer import BulkIndexingContext
 from zenodo.modules.records.serializers.pidrelations import \
-    serialize_related_identifiers
+    serialize_related_identifiers, serialize_version_relations
 
 
 def test_relations_serialization(app, db, deposit, deposit_file):
@@ -208,3 +209,36 @@ def test_related_identifiers_serialization(app, db, deposit, deposit_file):
         }
     ]
     assert rids == expected_parent
+
+
+def test_bulk_relations_serialization(app, db, es, deposit, deposit_file):
+    """Serialize the PID relations of many records at once."""
+    deposit_v1 = publish_and_expunge(db, deposit)
+    depid_v1_value = deposit_v1['_deposit']['id']
+    recid_v1, record_v1 = deposit_v1.fetch_published()
+
+    def assert_same_relations(*pids):
+        relations = serialize_version_relations(pids)
+        for pid in pids:
+            assert relations[pid.id] == serialize_relations(pid)
+
+    assert_same_relations(recid_v1)
+
+    # With a draft of the new version
+    deposit_v1.newversion()
+    assert_same_relations(recid_v1)
+
+    pv = PIDVersioning(child=recid_v1)
+    depid_v2 = pv.draft_child_deposit
+    deposit_v2 = ZenodoDeposit.get_record(depid_v2.get_assigned_object())
+    deposit_v2.files['file.txt'] = BytesIO(b('file1'))
+    deposit_v2 = publish_and_expunge(db, deposit_v2)
+    recid_v2, record_v2 = deposit_v2.fetch_published()
+    depid_v1, deposit_v1 = deposit_resolver.resolve(depid_v1_value)
+    recid_v1, record_v1 = deposit_v1.fetch_published()
+    assert_same_relations(recid_v1, recid_v2)
+
+    context = BulkIndexingContext([record_v1, record_v2])
+    assert context.get_relations(record_v2) == serialize_relations(recid_v2)
+    assert context.get_related_identifiers(record_v2) == \
+        serialize_related_identifiers(recid_v2)
@@ -30,10 +30,17 @@ from datetime import datetime
 from invenio_cache import current_cache
 from invenio_pidrelations.contrib.versioning import PIDVersioning
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_search import current_search
 
 from zenodo.modules.records.api import ZenodoRecord
+from zenodo.modules.records.indexer import ZenodoRecordIndexer
 from zenodo.modules.records.minters import zenodo_record_minter
-from zenodo.modules.records.tasks import schedule_update_datacite_metadata
+from zenodo.modules.records.serializers import bibtex_v1
+from zenodo.modules.records.serializers.cache import \
+    current_serialization_cache
+from zenodo.modules.records.tasks import process_bulk_queue, \
+    schedule_update_datacite_metadata, warm_serialization_cache
+from zenodo.modules.stats.utils import get_record_stats
 
 
 def test_datacite_update(mocker, db, minimal_record):
@@ -134,3 +141,48 @@ def test_datacite_update(mocker, db, minimal_record):
     assert update_date < new_update_date3
 
     assert_datacite_calls_and_content(r1, doi_tags)
+
+
+def test_process_bulk_queue(app, db, es, indexer_queue, record_with_bucket,
+                            mocker):
+    """Test bulk indexing with prefetched record statistics."""
+    pid, record = record_with_bucket
+    build_stats = mocker.patch(
+        'zenodo.modules.records.indexer.build_records_stats',
+        return_value={str(record['recid']): {'views': 1.0}})
+
+    ZenodoRecordIndexer().bulk_index([str(record.id)])
+    process_bulk_queue()
+    current_search.flush_and_refresh(index='records')
+
+    # The stats of the whole chunk are fetched at once
+    assert build_stats.call_count == 1
+    assert get_record_stats(record.id) == {'views': 1.0}
+
+
+def test_warm_serialization_cache(app, db, record_with_bucket):
+    """Test warming and invalidation of the serialization cache."""
+    pid, record = record_with_bucket
+    app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_ENABLED'] = True
+    try:
+        cache = current_serialization_cache()
+        cache.clear()
+        warm_serialization_cache(str(record.id), formats=['hx'])
+
+        record = ZenodoRecord.get_record(record.id)
+        key = cache.make_key(
+            record.id, record.revision_id, 'bibtex_v1',
+            'recid-{0}'.format(pid.pid_value), int('_files' in record), 0)
+        cached = cache.get(key)
+        assert cached
+        assert bibtex_v1.serialize(pid, record) == cached
+
+        # A committed change is served from a new revision
+        record['title'] = 'A new title'
+        record.commit()
+        db.session.commit()
+        assert cache._entries == {}
+        record = ZenodoRecord.get_record(record.id)
+        assert 'A new title' in bibtex_v1.serialize(pid, record)
+    finally:
+        app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_ENABLED'] = False
@@ -26,6 +26,12 @@
 
 from __future__ import absolute_import, print_function
 
+import uuid
+from copy import deepcopy
+
+from lxml import etree
+
+from zenodo.modules.records.fetchers import zenodo_record_fetcher
 from zenodo.modules.records.serializers import dcat_v1
 
 
@@ -41,3 +47,28 @@ def test_dcat_serializer(db, es, record_with_bucket):
         assert creator['givennames'] in serialized_record
     for f in record['_files']:
         assert f['key'] in serialized_record
+
+
+def test_dcat_serializer_search(db, es, record_with_bucket):
+    """Tests the batched DCAT serialization of search results."""
+    pid, record = record_with_bucket
+    other = deepcopy(record.dumps())
+    other['title'] = 'Another title'
+    search_result = {'hits': {'hits': [
+        {'_id': str(record.id), '_source': deepcopy(record.dumps())},
+        {'_id': str(uuid.uuid4()), '_source': other},
+    ]}}
+    data = b''.join(
+        dcat_v1.serialize_search(zenodo_record_fetcher, search_result))
+
+    root = etree.fromstring(data)
+    descriptions = root.findall(
+        '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}Description')
+    assert len(descriptions) == 2
+    serialized = data.decode('utf-8')
+    assert record['title'] in serialized
+    assert 'Another title' in serialized
+    for description in descriptions:
+        serialized_description = etree.tostring(description).decode('utf-8')
+        for f in record['_files']:
+            assert f['key'] in serialized_description
@@ -194,6 +194,35 @@ def test_records_ui_export(app, db, full_record):
             assert res.status_code == 410 if val is None else 200
 
 
+def test_records_ui_export_cached(app, db, full_record, serialization_cache):
+    """Test export pages served from the serialization cache."""
+    r = Record.create(full_record)
+    PersistentIdentifier.create(
+        'recid', '12345', object_type='rec', object_uuid=r.id,
+        status=PIDStatus.REGISTERED)
+    db.session.commit()
+
+    with app.test_client() as client:
+        for f in ('dcite4', 'hx', 'xm', 'dcat'):
+            url = url_for(
+                'invenio_records_ui.recid_export', pid_value='12345',
+                format=f)
+            res = client.get(url)
+            assert res.status_code == 200
+            assert any(str(r.id) in k for k in serialization_cache._entries)
+            assert client.get(url).get_data() == res.get_data()
+
+        # Committed changes are exported right away
+        r['title'] = 'An updated title'
+        r.commit()
+        db.session.commit()
+        for f in ('dcite4', 'hx', 'xm', 'dcat'):
+            res = client.get(url_for(
+                'invenio_records_ui.recid_export', pid_value='12345',
+                format=f))
+            assert 'An updated title' in res.get_data(as_text=True)
+
+
 def test_citation_formatter_styles_get(api, api_client, db):
     """Test get CSL styles."""
     with api.test_request_context():
@@ -32,7 +32,22 @@ import re
 from flask import current_app, render_template
 
 from zenodo.modules.sitemap.generators import _sitemapdtformat
-from zenodo.modules.sitemap.tasks import update_sitemap_cache
+from zenodo.modules.sitemap.tasks import update_sitemap_cache, \
+    update_sitemap_cache_incremental
+
+
+def _cached_pages(cache_mock):
+    """Get the decompressed pages stored in the mocked cache."""
+    sitemap = current_app.extensions['zenodo-sitemap']
+    pages = {}
+    for args, kwargs in cache_mock.set.call_args_list:
+        key, value = args
+        assert kwargs == {'timeout': -1}
+        if key == 'sitemap:state':
+            continue
+        assert set(value) == {'data', 'etag', 'last_modified'}
+        pages[key] = sitemap.decompress(value['data']).decode('utf-8')
+    return pages
 
 
 def test_sitemap_cache_update_simple(mocker, app):
@@ -43,23 +58,28 @@ def test_sitemap_cache_update_simple(mocker, app):
     urls = [make_url('/record/' + str(i)) for i in range(5)]
     cache_mock = mocker.patch('zenodo.modules.sitemap.ext.current_cache')
     update_sitemap_cache(urls=urls, max_url_count=2)
+    pages = _cached_pages(cache_mock)
 
     sitemap1 = render_template('zenodo_sitemap/sitemap.xml',
                                urlset=urls[:2])
-    cache_mock.set.assert_any_call('sitemap:1', sitemap1, timeout=-1)
+    assert pages['sitemap:1'] == sitemap1
 
     sitemap2 = render_template('zenodo_sitemap/sitemap.xml',
                                urlset=urls[2:4])
-    cache_mock.set.assert_any_call('sitemap:2', sitemap2, timeout=-1)
+    assert pages['sitemap:2'] == sitemap2
 
     sitemap3 = render_template('zenodo_sitemap/sitemap.xml',
                                urlset=urls[4:])
-    cache_mock.set.assert_any_call('sitemap:3', sitemap3, timeout=-1)
+    assert pages['sitemap:3'] == sitemap3
 
     sitemapindex = [make_url('/sitemap{}.xml'.format(i)) for i in range(1, 4)]
     sitemap0 = render_template('zenodo_sitemap/sitemapindex.xml',
                                urlset=sitemapindex, url_scheme='https')
-    cache_mock.set.assert_any_call('sitemap:0', sitemap0, timeout=-1)
+    assert pages['sitemap:0'] == sitemap0
+
+    # The incremental state is reset to the renumbered pages
+    cache_mock.set.assert_any_call(
+        'sitemap:state', {'pages': [1, 2, 3]}, timeout=-1)
 
 
 def test_sitemap_generators(app, record_with_bucket, communities):
@@ -112,3 +132,40 @@ def test_sitemap_date_generator():
     assert _sitemapdtformat(dt) == '2018-01-02T03:04:05Z'
     dt = datetime.datetime(2018, 11, 12, 13, 14, 15)
     assert _sitemapdtformat(dt) == '2018-11-12T13:14:15Z'
+
+
+def test_sitemap_cache_update_incremental(mocker, app, db, record_with_bucket,
+                                          communities):
+    """Test incremental Sitemap cache updating."""
+    pid, record = record_with_bucket
+    sitemap = current_app.extensions['zenodo-sitemap']
+    update_sitemap_cache_incremental()
+
+    def get_page(key):
+        return sitemap.decompress(sitemap.get_cache(key)['data']).decode()
+
+    # Record 12345 is in the second recid range page
+    page = get_page('sitemap:2')
+    assert '<loc>https://localhost/record/12345</loc>' in page
+    page = get_page('sitemap:3')
+    assert '<loc>https://localhost/communities/c1/</loc>' in page
+    index = get_page('sitemap:0')
+    assert '<loc>https://localhost/sitemap2.xml</loc>' in index
+    assert '<loc>https://localhost/sitemap3.xml</loc>' in index
+    assert '<loc>https://localhost/sitemap1.xml</loc>' not in index
+
+    # Unchanged records pages are not regenerated
+    set_cache = mocker.spy(sitemap, 'set_cache')
+    update_sitemap_cache_incremental()
+    keys = [args[0] for args, _ in set_cache.call_args_list]
+    assert 'sitemap:2' not in keys
+    assert 'sitemap:3' in keys
+
+    # Modified records pages are regenerated
+    record['title'] = 'Updated title'
+    record.commit()
+    db.session.commit()
+    set_cache.reset_mock()
+    update_sitemap_cache_incremental()
+    keys = [args[0] for args, _ in set_cache.call_args_list]
+    assert 'sitemap:2' in keys
@@ -27,6 +27,7 @@
 from __future__ import absolute_import, print_function
 
 from flask import current_app, render_template, url_for
+from invenio_cache import current_cache
 
 from zenodo.modules.sitemap.tasks import update_sitemap_cache
 
@@ -95,3 +96,50 @@ def test_sitemap_views(app, record_with_bucket, communities):
             # Clear the cache to clean up after test
             sitemap = current_app.extensions['zenodo-sitemap']
             sitemap.clear_cache()
+
+
+def test_sitemap_views_cached(app, record_with_bucket, communities):
+    """Test serving the compressed sitemap pages."""
+    sitemap = current_app.extensions['zenodo-sitemap']
+    update_sitemap_cache()
+    with app.test_request_context():
+        with app.test_client() as client:
+            url = url_for('zenodo_sitemap.sitemappage', page=1)
+            res = client.get(url, headers={'Accept-Encoding': 'gzip'})
+            assert res.status_code == 200
+            assert res.headers['Content-Encoding'] == 'gzip'
+            etag = res.headers['ETag']
+            last_modified = res.headers['Last-Modified']
+            page = sitemap.decompress(res.get_data()).decode('utf-8')
+            assert '<loc>https://localhost/record/12345</loc>' in page
+
+            # Clients not accepting gzip get the uncompressed page
+            res = client.get(url)
+            assert res.status_code == 200
+            assert 'Content-Encoding' not in res.headers
+            assert res.get_data(as_text=True) == page
+
+            # Conditional requests
+            res = client.get(url, headers={'If-None-Match': etag})
+            assert res.status_code == 304
+            res = client.get(
+                url, headers={'If-Modified-Since': last_modified})
+            assert res.status_code == 304
+
+
+def test_sitemap_views_legacy_cached(app):
+    """Test serving the uncompressed pages stored by previous versions."""
+    page = render_template('zenodo_sitemap/sitemap.xml', urlset=[
+        {'loc': 'https://localhost/record/1'}])
+    current_cache.set('sitemap:1', page, timeout=-1)
+    try:
+        with app.test_request_context():
+            with app.test_client() as client:
+                res = client.get(
+                    url_for('zenodo_sitemap.sitemappage', page=1),
+                    headers={'Accept-Encoding': 'gzip'})
+                assert res.status_code == 200
+                assert 'Content-Encoding' not in res.headers
+                assert res.get_data(as_text=True) == page
+    finally:
+        current_cache.delete('sitemap:1')
@@ -45,3 +45,31 @@ def test_safelist_search(app):
     assert not current_domain_safelist.matches("other.ch")
     assert current_domain_safelist.matches("safedomain.org")
     assert current_domain_safelist.matches("safe.domain.org")
+
+
+def test_safelist_cache(app, db, users):
+    """Test the cached safelist and its invalidation."""
+    from invenio_accounts.models import User
+    from zenodo.modules.spam.models import SafelistEntry
+    from zenodo.modules.spam.utils import is_user_safelisted
+
+    user = User.query.get(users[0]['id'])
+    SafelistEntry.invalidate_cache()
+    assert SafelistEntry.get_safelist() == frozenset()
+    assert not is_user_safelisted(user)
+
+    SafelistEntry.create(user_id=user.id)
+    db.session.commit()
+    # The cached set is only refreshed after invalidation
+    assert not is_user_safelisted(user)
+    SafelistEntry.invalidate_cache()
+    assert is_user_safelisted(user)
+    assert SafelistEntry.get_users_status([user.id, users[1]['id']]) == {
+        user.id: True, users[1]['id']: False}
+    assert SafelistEntry.get_record_status({'owners': [user.id]})
+    assert not SafelistEntry.get_record_status({'owners': [users[1]['id']]})
+
+    SafelistEntry.remove_by_user_id(user.id)
+    db.session.commit()
+    SafelistEntry.invalidate_cache()
+    assert not is_user_safelisted(user)
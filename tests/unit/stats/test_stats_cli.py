@@ -23,10 +23,14 @@
 """Unit tests CLI commands for statistics."""
 
 from click.testing import CliRunner
+from elasticsearch_dsl import Search
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records.api import Record
+from invenio_search import current_search, current_search_client
+from invenio_search.utils import build_alias_name
 
 from zenodo.modules.stats.cli import import_events
+from zenodo.modules.stats.importer import parse_record_urls
 
 
 def test_record_view_import(app, db, es, event_queues, full_record,
@@ -70,3 +74,57 @@ def test_record_view_import(app, db, es, event_queues, full_record,
         'user_agent': 'foo',
         'user_id': None,
     }
+
+
+def test_record_view_import_direct(app, db, es, event_queues, full_record,
+                                   script_info, tmpdir):
+    """Test record page view event import bypassing the events queue."""
+    r = Record.create(full_record)
+    PersistentIdentifier.create(
+        'recid', '12345', object_type='rec', object_uuid=r.id,
+        status=PIDStatus.REGISTERED)
+    db.session.commit()
+
+    csv_file = tmpdir.join('record-views.csv')
+    csv_file.write(
+        ',userAgent,ipAddress,url,serverTimePretty,timestamp,referrer\n'
+        ',foo,137.138.36.206,https://zenodo.org/record/12345,,1367928000,\n'
+        ',foo,137.138.36.207,https://zenodo.org/record/12345,,1367929000,\n'
+        ',foo,137.138.36.206,https://zenodo.org/record/999,,1367928000,\n'
+        ',foo,137.138.36.206,https://example.org/record/12345,,1367928000,\n')
+
+    runner = CliRunner()
+    res = runner.invoke(
+        import_events, ['record-view', csv_file.dirname, '--direct',
+                        '--batch-size', '2'],
+        obj=script_info)
+    assert res.exit_code == 0
+    assert 'Imported 2 events from 4 rows.' in res.output
+    assert list(event_queues['stats-record-view'].consume()) == []
+
+    current_search.flush_and_refresh(index='events-stats-record-view-*')
+    search = Search(using=current_search_client,
+                    index=build_alias_name('events-stats-record-view-*'))
+    assert search.count() == 2
+    assert set(hit.recid for hit in search.scan()) == {'12345'}
+
+
+def test_parse_record_urls():
+    """Test parsing of record URLs."""
+    assert parse_record_urls([
+        'https://zenodo.org/record/123',
+        'https://zenodo.org/record/123/export/hx',
+        'https://www.zenodo.org:443/record/123/files/some.pdf?download=1',
+        'https://example.org/record/123',
+        'https://zenodo.org/communities/zenodo',
+        '',
+        None,
+    ]) == [
+        ('123', None),
+        ('123', None),
+        ('123', 'some.pdf'),
+        (None, None),
+        (None, None),
+        (None, None),
+        (None, None),
+    ]
@@ -56,7 +56,7 @@ def mocked_requests_fail(*args, **kwargs):
     return MockResponse({}, 500)
 
 
-@mock.patch('zenodo.modules.stats.exporters.requests.post',
+@mock.patch('zenodo.modules.stats.exporters.requests.Session.post',
             side_effect=mocked_requests_success)
 def test_piwik_exporter(app, db, es, locations, event_queues, full_record):
     records = create_stats_fixtures(
@@ -86,7 +86,7 @@ def test_piwik_exporter(app, db, es, locations, event_queues, full_record):
     assert bookmark == u'2018-01-01T14:30:00'
 
 
-@mock.patch('zenodo.modules.stats.exporters.requests.post',
+@mock.patch('zenodo.modules.stats.exporters.requests.Session.post',
             side_effect=mocked_requests_invalid)
 def test_piwik_exporter_invalid_request(app, db, es, locations, event_queues,
                                         full_record):
@@ -111,7 +111,7 @@ def test_piwik_exporter_invalid_request(app, db, es, locations, event_queues,
     assert bookmark is None
 
 
-@mock.patch('zenodo.modules.stats.exporters.requests.post',
+@mock.patch('zenodo.modules.stats.exporters.requests.Session.post',
             side_effect=mocked_requests_fail)
 def test_piwik_exporter_request_fail(app, db, es, locations, event_queues,
                                      full_record):
@@ -152,8 +152,51 @@ def test_piwik_exporter_no_bookmark(app, db, es, locations, event_queues,
     bookmark = current_cache.get('piwik_export:bookmark')
     assert bookmark is None
 
-    with mock.patch('zenodo.modules.stats.exporters.requests.post') as mocked:
+    with mock.patch(
+            'zenodo.modules.stats.exporters.requests.Session.post') as mocked:
         PiwikExporter().run()
         mocked.assert_not_called()
     bookmark = current_cache.get('piwik_export:bookmark')
     assert bookmark is None
+
+
+def test_piwik_exporter_ordered_bookmark(app, db, es, locations, event_queues,
+                                         full_record):
+    records = create_stats_fixtures(
+        metadata=full_record, n_records=1, n_versions=1, n_files=1,
+        event_data={'user_id': '1', 'country': 'CH'},
+        # 4 event timestamps
+        start_date=datetime(2018, 1, 1, 13),
+        end_date=datetime(2018, 1, 1, 15),
+        interval=timedelta(minutes=30),
+        do_process_events=True)
+
+    current_cache.delete('piwik_export:bookmark')
+    exporter_config = dict(app.config['ZENODO_STATS_PIWIK_EXPORTER'],
+                           chunk_size=1, workers=2)
+    start_date = datetime(2018, 1, 1, 12)
+    end_date = datetime(2018, 1, 1, 14)
+
+    def mocked_requests_first_fail(url, json=None, **kwargs):
+        # Fail the requests of the first events, which may be sent
+        # concurrently with the following ones.
+        if any('cdt=2018-01-01T13%3A00%3A00' in r for r in json['requests']):
+            return mocked_requests_fail()
+        return mocked_requests_success()
+
+    with mock.patch.dict(app.config,
+                         ZENODO_STATS_PIWIK_EXPORTER=exporter_config), \
+            mock.patch('zenodo.modules.stats.exporters.requests.Session.post',
+                       side_effect=mocked_requests_first_fail):
+        with pytest.raises(PiwikExportRequestError):
+            PiwikExporter().run(start_date=start_date, end_date=end_date)
+    # The bookmark does not advance past the unacknowledged chunk
+    assert current_cache.get('piwik_export:bookmark') is None
+
+    with mock.patch.dict(app.config,
+                         ZENODO_STATS_PIWIK_EXPORTER=exporter_config), \
+            mock.patch('zenodo.modules.stats.exporters.requests.Session.post',
+                       side_effect=mocked_requests_success):
+        PiwikExporter().run(start_date=start_date, end_date=end_date)
+    assert current_cache.get('piwik_export:bookmark') == \
+        u'2018-01-01T14:00:00'
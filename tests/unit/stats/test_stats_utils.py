@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo. If not, see <http://www.gnu.org/licenses/>.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Test Zenodo stats utilities."""
+
+from datetime import datetime, timedelta
+
+from invenio_indexer.api import RecordIndexer
+from invenio_search import current_search, current_search_client
+from invenio_search.utils import build_alias_name
+from stats_helpers import create_stats_fixtures
+
+from zenodo.modules.stats.utils import build_record_stats, \
+    build_records_stats, get_record_stats, get_record_versions, \
+    update_records_stats
+
+
+def test_build_records_stats(app, db, es, locations, event_queues,
+                             minimal_record):
+    """Test building the stats of many records at once."""
+    records = create_stats_fixtures(
+        metadata=minimal_record, n_records=2, n_versions=3, n_files=2,
+        event_data={'user_id': '1'},
+        start_date=datetime(2018, 1, 1, 13),
+        end_date=datetime(2018, 1, 1, 15),
+        interval=timedelta(minutes=30),
+        do_update_record_statistics=False)
+
+    pairs = [(r['recid'], r['conceptrecid']) for _, r, _ in records]
+    stats = build_records_stats(pairs + [(123456, '123455')])
+    for recid, conceptrecid in pairs:
+        assert stats[str(recid)] == build_record_stats(recid, conceptrecid)
+    # Records without any statistics
+    assert stats['123456']['views'] == 0.0
+    assert stats['123456']['version_views'] == 0.0
+
+
+def test_update_records_stats(app, db, es, locations, event_queues,
+                              minimal_record):
+    """Test updating the stats of the records' versions."""
+    records = create_stats_fixtures(
+        metadata=minimal_record, n_records=1, n_versions=2, n_files=1,
+        event_data={'user_id': '1'},
+        start_date=datetime(2018, 1, 1, 13),
+        end_date=datetime(2018, 1, 1, 14),
+        interval=timedelta(minutes=30))
+    conceptrecid = records[0][1]['conceptrecid']
+
+    versions = get_record_versions([conceptrecid])
+    assert sorted(v[0] for v in versions) == \
+        sorted(str(r['recid']) for _, r, _ in records)
+
+    assert update_records_stats([conceptrecid]) == (2, 0)
+    current_search.flush_and_refresh(index='records')
+    for recid, record, _ in records:
+        assert get_record_stats(recid.object_uuid) == \
+            build_record_stats(record['recid'], conceptrecid)
+        # The document version is still the record revision
+        doc = current_search_client.get(
+            index=build_alias_name('records'), id=str(recid.object_uuid))
+        assert doc['_version'] == record.revision_id
+        # ...thus reindexing the same revision isn't rejected
+        RecordIndexer().index(record)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2023 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Test the file integrity report."""
+
+from __future__ import absolute_import, print_function
+
+import csv
+import io
+
+from invenio_files_rest.models import FileInstance, ObjectVersion
+
+from zenodo.modules.utils.tasks import file_integrity_report
+
+
+def test_file_integrity_report(app, db, es, record_with_files_creation):
+    """Test the file integrity report attachment and summary."""
+    pid, record, _ = record_with_files_creation
+    f = FileInstance.query.one()
+    f.last_check = False
+    db.session.commit()
+
+    with app.extensions['mail'].record_messages() as outbox:
+        file_integrity_report.delay()
+    assert len(outbox) == 1
+    msg = outbox[0]
+    assert 'Unhealthy files: 1' in msg.body
+    assert 'Affected record files: 1' in msg.body
+
+    attachment, = msg.attachments
+    assert attachment.content_type == 'text/csv'
+    data = attachment.data
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    row, = csv.DictReader(io.StringIO(data))
+    assert row['file_id'] == str(f.id)
+    assert row['filename'] == 'Test.pdf'
+    assert row['type'] == 'record'
+    assert row['recid'] == str(record['recid'])
+
+
+def test_file_integrity_report_distinct_files(app, db, es,
+                                              record_with_files_creation):
+    """Test that a file with several object versions is counted once."""
+    pid, record, _ = record_with_files_creation
+    f = FileInstance.query.one()
+    f.last_check = False
+    ObjectVersion.create(
+        ObjectVersion.query.filter_by(file_id=f.id).first().bucket,
+        'Copy.pdf', _file_id=f.id)
+    db.session.commit()
+
+    with app.extensions['mail'].record_messages() as outbox:
+        file_integrity_report.delay()
+    msg, = outbox
+    assert 'Unhealthy files: 1' in msg.body
+    assert 'Affected record files: 1' in msg.body
+
+
+def test_file_integrity_report_revalidation(app, db, es,
+                                            record_with_files_creation):
+    """Test that errored files are revalidated before the report."""
+    f = FileInstance.query.one()
+    f.last_check = None
+    db.session.commit()
+
+    with app.extensions['mail'].record_messages() as outbox:
+        file_integrity_report.delay()
+    assert not outbox
+    assert FileInstance.query.one().last_check is True
@@ -26,11 +26,15 @@
 
 from __future__ import absolute_import, print_function
 
+import uuid
+
 from invenio_oaiserver.models import OAISet
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.api import Record
 from mock import MagicMock
 
 from zenodo.modules.utils.tasks import comm_sets_match, get_synced_sets, \
-    requires_sync, update_oaisets_cache
+    requires_sync, sync_records_oai, update_oaisets_cache
 
 
 def make_rec(comm, sets):
@@ -190,3 +194,47 @@ def test_sets_cache(mocker, db, oaisets):
     assert not requires_sync(r, cache=cache)  # Should not require sync
     # Should be only called once for the item not in cache
     query_mock.filter_by.assert_called_once_with(spec='user-c2')
+
+
+def test_sync_records_oai(app, db, es, oaisets):
+    """Test bulk OAI ID minting and syncing."""
+    rec_new = Record.create({'recid': 1, 'communities': ['c1']})
+    rec_sync = Record.create({
+        'recid': 2,
+        'communities': ['c1'],
+        '_oai': {'id': 'oai:zenodo.org:2', 'sets': ['extra', 'user-c2']},
+    })
+    PersistentIdentifier.create(
+        'oai', 'oai:zenodo.org:2', pid_provider='oai', object_type='rec',
+        object_uuid=rec_sync.id, status=PIDStatus.REGISTERED)
+    db.session.commit()
+
+    sync_records_oai.delay([str(rec_new.id), str(rec_sync.id)])
+
+    rec_new = Record.get_record(rec_new.id)
+    assert rec_new['_oai'] == {'id': 'oai:zenodo.org:1', 'sets': ['user-c1']}
+    pid = PersistentIdentifier.get('oai', 'oai:zenodo.org:1')
+    assert pid.object_uuid == rec_new.id
+    assert pid.status == PIDStatus.REGISTERED
+
+    rec_sync = Record.get_record(rec_sync.id)
+    assert rec_sync['_oai']['sets'] == ['extra', 'user-c1']
+    assert rec_sync['_oai']['updated']
+
+
+def test_sync_records_oai_conflict(app, db, es, oaisets):
+    """Test that an already minted OAI ID only fails its record."""
+    rec_conflict = Record.create({'recid': 3, 'communities': ['c1']})
+    rec_new = Record.create({'recid': 4, 'communities': ['c1']})
+    PersistentIdentifier.create(
+        'oai', 'oai:zenodo.org:3', pid_provider='oai', object_type='rec',
+        object_uuid=uuid.uuid4(), status=PIDStatus.REGISTERED)
+    db.session.commit()
+
+    sync_records_oai.delay([str(rec_conflict.id), str(rec_new.id)])
+
+    assert not PersistentIdentifier.query.filter_by(
+        pid_type='oai', object_uuid=rec_conflict.id).count()
+    pid = PersistentIdentifier.get('oai', 'oai:zenodo.org:4')
+    assert pid.object_uuid == rec_new.id
+    assert Record.get_record(rec_new.id)['_oai']['sets'] == ['user-c1']
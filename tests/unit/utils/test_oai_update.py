@@ -30,7 +30,8 @@ from datetime import datetime
 
 from invenio_records.api import Record
 
-from zenodo.modules.utils.tasks import update_search_pattern_sets
+from zenodo.modules.utils.tasks import sync_oaiset_chunk, \
+    update_search_pattern_sets
 
 
 def make_rec(comm, sets):
@@ -63,3 +64,28 @@ def test_oaiset_update(app, db, oaisets, es, oaiset_update_records):
     assert rec_rm['_oai']['updated'].startswith(year_now)
     assert set(rec_add['_oai']['sets']) == set(['extra', 'user-foobar', ])
     assert rec_add['_oai']['updated'].startswith(year_now)
+
+
+def test_oaiset_sync_chunk(app, db, oaisets, es, oaiset_update_records):
+    """Test idempotent chunked OAI set syncing."""
+    rec_ok, rec_rm, rec_add = [str(uuid) for uuid in oaiset_update_records]
+
+    result = sync_oaiset_chunk.delay(
+        'run', 'extra', 'add', 0, [rec_ok, rec_add]).get()
+    # Records which already have the set are not counted
+    assert result == {'add': 1}
+    assert set(Record.get_record(rec_add)['_oai']['sets']) == \
+        set(['extra', 'user-foobar', ])
+
+    # A redelivered chunk is not applied again
+    rec = Record.get_record(rec_add)
+    rec['_oai']['sets'] = ['user-foobar']
+    rec.commit()
+    db.session.commit()
+    assert sync_oaiset_chunk.delay(
+        'run', 'extra', 'add', 0, [rec_ok, rec_add]).get() == {'add': 1}
+    assert Record.get_record(rec_add)['_oai']['sets'] == ['user-foobar']
+
+    assert sync_oaiset_chunk.delay(
+        'run', 'extra', 'remove', 1, [rec_ok, rec_rm]).get() == {'remove': 2}
+    assert Record.get_record(rec_rm)['_oai']['sets'] == ['user-foobar']
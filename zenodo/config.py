@@ -83,6 +83,7 @@ from zenodo.modules.records.permissions import deposit_delete_permission_factory
 from zenodo.modules.stats import current_stats_search_client
 from zenodo.modules.theme.ext import useragent_and_ip_limit_key
 from zenodo.modules.metrics.config import ZENODO_METRICS_CACHE_UPDATE_INTERVAL
+from zenodo.modules.metrics.instrumentation import TimedUrllib3HttpConnection
 
 
 def _(x):
@@ -184,7 +185,9 @@ CELERY_TASK_ROUTES = {
     'zenodo.modules.spam.tasks.delete_record': {'queue': 'low'},
     'invenio_openaire.tasks.register_grant': {'queue': 'low'},
     # Indexer
-    'invenio_indexer.tasks.process_bulk_queue': {'queue': 'celery-indexer'}
+    'invenio_indexer.tasks.process_bulk_queue': {'queue': 'celery-indexer'},
+    'zenodo.modules.records.tasks.process_bulk_queue': {
+        'queue': 'celery-indexer'},
 }
 #: Beat schedule
 CELERY_BEAT_SCHEDULE = {
@@ -193,7 +196,7 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(minute=2, hour=0),
     },
     'indexer': {
-        'task': 'invenio_indexer.tasks.process_bulk_queue',
+        'task': 'zenodo.modules.records.tasks.process_bulk_queue',
         'schedule': timedelta(minutes=5),
         'kwargs': {
             'es_bulk_kwargs': {'raise_on_error': False},
@@ -242,8 +245,10 @@ CELERY_BEAT_SCHEDULE = {
         },
     },
     'sitemap-updater': {
-        'task': 'zenodo.modules.sitemap.tasks.update_sitemap_cache',
-        'schedule': timedelta(hours=24)
+        'task': (
+            'zenodo.modules.sitemap.tasks.update_sitemap_cache_incremental'
+        ),
+        'schedule': timedelta(hours=6)
     },
     'file-integrity-report': {
         'task': 'zenodo.modules.utils.tasks.file_integrity_report',
@@ -264,6 +269,20 @@ CELERY_BEAT_SCHEDULE = {
             'job_id': 'records',
         }
     },
+    'export-parquet': {
+        'task': 'zenodo.modules.exporter.tasks.export_job',
+        'schedule': crontab(minute=0, hour=4, day_of_month=2),
+        'kwargs': {
+            'job_id': 'records-parquet',
+        }
+    },
+    'export-delta': {
+        'task': 'zenodo.modules.exporter.tasks.export_delta_job',
+        'schedule': crontab(minute=0, hour=5),
+        'kwargs': {
+            'job_id': 'records',
+        }
+    },
     # Stats
     'stats-process-events': {
         'task': 'invenio_stats.tasks.process_events',
@@ -912,6 +931,11 @@ FILES_REST_FILE_URI_MAX_LEN = 1000
 FILES_REST_CHECKSUM_VERIFICATION_URI_PREFIXES = [
     # 'root://eospublic'
 ]
+#: Number of files fetched per query for the file integrity report.
+ZENODO_FILE_INTEGRITY_REPORT_PAGE_SIZE = 1000
+#: Maximum number of file checksums recomputed in parallel before sending the
+#: file integrity report.
+ZENODO_FILE_INTEGRITY_REPORT_WORKERS = 4
 #: URL template for generating URLs outside the application/request context
 FILES_REST_ENDPOINT = '{scheme}://{host}/api/files/{bucket}/{key}'
 
@@ -970,6 +994,8 @@ RECORDS_REST_ENDPOINTS = dict(
                 'zenodo.modules.records.serializers.datacite_v31_search'),
             'application/x-dc+xml': (
                 'zenodo.modules.records.serializers.dc_v1_search'),
+            'application/dcat+xml': (
+                'zenodo.modules.records.serializers.dcat_v1_search'),
         },
         default_media_type='application/vnd.zenodo.v1+json',
         read_permission_factory_imp=allow_all,
@@ -1312,6 +1338,10 @@ OAISERVER_METADATA_FORMATS = {
 }
 # Relative URL to XSL Stylesheet, placed under `modules/records/static`.
 OAISERVER_XSL_URL = '/static/xsl/oai2.xsl'
+#: Number of records updated per task when syncing search-patterned OAISets.
+ZENODO_OAISETS_SYNC_CHUNK_SIZE = 500
+#: Time (in seconds) to keep the results of OAISet sync chunks.
+ZENODO_OAISETS_SYNC_PROGRESS_TIMEOUT = 2 * 24 * 60 * 60
 
 # REST
 # ====
@@ -1384,6 +1414,10 @@ SEARCH_MAPPINGS = [
 ]
 #: ElasticSearch index prefix
 SEARCH_INDEX_PREFIX = 'zenodo-dev-'
+#: ElasticSearch client configuration (requests durations are instrumented)
+SEARCH_CLIENT_CONFIG = {
+    'connection_class': TimedUrllib3HttpConnection,
+}
 
 # Communities
 # ===========
@@ -29,7 +29,7 @@ from __future__ import absolute_import, print_function
 import click
 from flask.cli import with_appcontext
 
-from .tasks import audit_oai, audit_records
+from .tasks import audit_oai, audit_records, audit_records_distributed
 
 
 @click.group()
@@ -41,13 +41,19 @@ def audit():
 @click.option('--logfile', '-l', type=click.Path(exists=False, dir_okay=False,
                                                  resolve_path=True))
 @click.option('--eager', '-e', is_flag=True)
+@click.option('--chunk-size', '-c', type=int, default=None,
+              help='Audit the records in parallel chunks of this size.')
 @with_appcontext
-def _audit_records(logfile, eager):
+def _audit_records(logfile, eager, chunk_size):
     """Audit all records."""
+    if chunk_size:
+        task, args = audit_records_distributed, (logfile, chunk_size)
+    else:
+        task, args = audit_records, (logfile,)
     if eager:
-        audit_records.apply((logfile,), throw=True)
+        task.apply(args, throw=True)
     else:
-        audit_records.apply_async((logfile,))
+        task.apply_async(args)
 
 
 @audit.command('oai')
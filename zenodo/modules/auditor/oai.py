@@ -26,22 +26,27 @@
 
 from __future__ import absolute_import, print_function, unicode_literals
 
+from array import array
 from itertools import chain
 
 from elasticsearch_dsl import Q
 from flask import current_app
-from invenio_cache import current_cache
 from invenio_communities.models import Community
 from invenio_db import db
 from invenio_oaiserver.models import OAISet
+from invenio_oaiserver.query import get_records
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records.models import RecordMetadata
 from invenio_search import RecordsSearch
-from mock import patch
-from sickle import Sickle
 
 from .api import Audit, Check
-from .utils import sickle_requests_get_mock
+from .utils import IDS_TYPECODE, sorted_difference, sorted_ids, \
+    sorted_union
+
+
+def _oai_recid(oai_id):
+    """Return the control number of an OAI identifier."""
+    return int(oai_id.rsplit(':', 1)[-1])
 
 
 class OAIAudit(Audit):
@@ -56,45 +61,33 @@ class OAIAudit(Audit):
                              (OAISetResultCheck(self, c) for c in communities))
 
     def _build_oai_sets_from_db(self):
-        # NOTE: We're relying on Redis-specific data types and commands, so we
-        # have to be sure that we have Redis as our cache type.
-        if current_app.config.get('CACHE_TYPE') != 'redis':
-            raise Exception('OAIAudit: Redis cache type required.')
-
-        self.cache = current_cache.cache._write_client
-        self.cache_prefix = 'zenodo.auditor.oai:{}'.format(str(self.audit_id))
+        """Build the sorted recid arrays of every OAI set from the database.
 
+        Only the OAI identifier and the ``_oai.sets`` of each record are
+        fetched, by projecting the records JSON in the database.
+        """
         record_oai_sets = (
-            db.session.query(RecordMetadata)
+            db.session.query(
+                PersistentIdentifier.pid_value,
+                RecordMetadata.json['_oai']['sets'])
             .join(
-                PersistentIdentifier,
+                RecordMetadata,
                 RecordMetadata.id == PersistentIdentifier.object_uuid)
             .filter(
                 PersistentIdentifier.pid_type == 'oai',
                 PersistentIdentifier.status == PIDStatus.REGISTERED)
-            .with_entities(
-                PersistentIdentifier.pid_value,
-                RecordMetadata.json)
         )
 
-        for oai_id, record in record_oai_sets:
-            for s in record.get('_oai', {}).get('sets', []):
-                oai_control_number = oai_id.split(':')[-1]
-                self.cache.sadd('{}:{}'.format(self.cache_prefix, s),
-                                oai_control_number)
+        oai_sets = {}
+        for oai_id, sets in record_oai_sets.yield_per(10000):
+            recid = _oai_recid(oai_id)
+            for s in sets or []:
+                oai_sets.setdefault(s, array(IDS_TYPECODE)).append(recid)
+        self.oai_sets = {s: sorted_ids(ids) for s, ids in oai_sets.items()}
 
     def pop_db_oai_set(self, oai_set):
-        """Return and remove from cache an OAI Set."""
-        key = '{}:{}'.format(self.cache_prefix, oai_set)
-        # TODO: Remove map as it needs to be string
-        oai_sets = set(map(int, self.cache.smembers(key)))
-        self.cache.delete(key)
-        return oai_sets
-
-    def clear_db_oai_set_cache(self):
-        """Clear all cached OAI Sets generated for this audit."""
-        for key in self.cache.scan_iter('{}:*'.format(self.cache_prefix)):
-            self.cache.delete(key)
+        """Return and remove the sorted recids of an OAI Set."""
+        return self.oai_sets.pop(oai_set, sorted_ids())
 
 
 class OAICorrespondenceCheck(Check):
@@ -143,36 +136,44 @@ class OAISetResultCheck(Check):
         sources is vital.
         """
         db_ids = self._db_identifiers()
-        es_ids = self._es_identifiers()
-        oai2d_ids = self._oai2d_endpoint_identifiers()
+        es_ids = sorted_ids(self._es_identifiers())
+        oai2d_ids = sorted_ids(self._oai2d_endpoint_identifiers())
 
-        all_ids = (db_ids | es_ids | oai2d_ids)
+        all_ids = sorted_ids(sorted_union(db_ids, es_ids, oai2d_ids))
         for source, ids in zip(('db', 'es', 'oai2d'),
                                (db_ids, es_ids, oai2d_ids)):
-            missing_ids = list(all_ids - ids)
+            missing_ids = list(sorted_difference(all_ids, ids))
             if missing_ids:
                 self.issues['missing_ids'][source] = missing_ids
 
     def _db_identifiers(self):
-        """Return a set of the Community OAI Set recids from the database."""
+        """Return the Community OAI Set recids from the database."""
         return self.audit.pop_db_oai_set(self.community.oaiset_spec)
 
     def _es_identifiers(self):
-        """Return a set of the Community OAI Set recids from Elasticsearch."""
+        """Return the Community OAI Set recids from Elasticsearch."""
         query = Q('bool',
                   filter=Q('exists', field='_oai.id'),
                   must=Q('match', **{'_oai.sets': self.community.oaiset_spec}))
         index = current_app.config['OAISERVER_RECORD_INDEX']
         search = RecordsSearch(index=index).source(['_oai.id']).query(query)
-        return {int(r._oai.id.rsplit(':', 1)[-1]) for r in search.scan()}
+        return (_oai_recid(r._oai.id) for r in search.scan())
 
     def _oai2d_endpoint_identifiers(self):
-        """Return a set of the Community OAI Set recids from OAI endpoint."""
-        with patch('sickle.app.requests.get', new=sickle_requests_get_mock()):
-            sickle = Sickle('http://auditor/oai2d')
-            ids = sickle.ListIdentifiers(set=self.community.oaiset_spec,
-                                         metadataPrefix='oai_dc')
-            return {int(i.identifier.rsplit(':', 1)[-1]) for i in ids}
+        """Return the Community OAI Set recids from the OAI endpoint.
+
+        The pages are fetched with the same paginated query and resumption
+        scroll that serve ``ListIdentifiers``, without rendering them.
+        """
+        spec = self.community.oaiset_spec
+        result = get_records(set=spec)
+        while True:
+            for item in result.items:
+                yield _oai_recid(item['json']['_source']['_oai']['id'])
+            if not result.has_next:
+                return
+            result = get_records(set=spec, resumptionToken={
+                'page': result.next_num, 'scroll_id': result._scroll_id})
 
     def perform(self):
         """Perform OAI Set result checks."""
@@ -24,49 +24,83 @@
 
 """Zenodo Auditor for records."""
 
+from itertools import islice
+
 from invenio_accounts.models import User
 from invenio_communities.models import Community
 from invenio_oaiserver.models import OAISet
 from invenio_pidstore.models import PersistentIdentifier
-from jsonschema import SchemaError, ValidationError
+from jsonschema import SchemaError
+from jsonschema.exceptions import best_match
 from werkzeug.utils import cached_property
 
 from .api import Audit, Check
-from .utils import duplicates
+from .utils import duplicates, get_record_validator, missing_values
 
 
 class RecordAudit(Audit):
-    """Record Audit."""
+    """Record Audit.
+
+    Records are checked in chunks. Before a chunk is checked, the existence of
+    all the owners and OAI identifiers it references is looked up at once.
+    """
 
-    def __init__(self, audit_id, logger, records):
+    def __init__(self, audit_id, logger, records, chunk_size=1000):
         """Initialize a Record audit."""
         super(RecordAudit, self).__init__(audit_id, logger)
-        self._checks = (RecordCheck(self, r) for r in records)
+        self.chunk_size = chunk_size
+        self._missing = {}
+        self._checks = self._iter_checks(iter(records))
+
+    def _iter_checks(self, records):
+        """Yield the checks of the records, prefetching them per chunk."""
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return
+            self.prefetch(chunk)
+            for record in chunk:
+                yield RecordCheck(self, record)
+
+    def prefetch(self, records):
+        """Look up the owners and OAI identifiers referenced by records."""
+        self._missing = {}
+        self.missing_owners(
+            o for r in records for o in r.get('owners', []))
+        self.missing_oai_pids(
+            r.get('_oai', {}).get('id') for r in records)
+
+    def _missing_values(self, name, column, values, *criteria):
+        """Return the values not found in a column, caching the lookups."""
+        checked, missing = self._missing.setdefault(name, (set(), set()))
+        values = {v for v in values if v is not None}
+        pending = values - checked
+        if pending:
+            missing.update(missing_values(column, pending, *criteria))
+            checked.update(pending)
+        return values & missing
+
+    def missing_owners(self, owners):
+        """Return the owner identifiers which do not exist."""
+        return self._missing_values('owners', User.id, owners)
+
+    def missing_oai_pids(self, oai_pids):
+        """Return the OAI identifiers which are not minted."""
+        return self._missing_values(
+            'oai', PersistentIdentifier.pid_value, oai_pids,
+            PersistentIdentifier.pid_type == 'oai')
 
     @cached_property
     def all_communities(self):
         """Set of all the existing community identifiers."""
         return {c.id for c in Community.query.all()}
 
-    @cached_property
-    def all_owners(self):
-        """Set of all the existing owner identifiers."""
-        return {c.id for c in User.query.all()}
-
     @cached_property
     def custom_oai_sets(self):
         """Set of OAI sets that follow a record search pattern."""
         oai_sets = OAISet.query.filter(OAISet.search_pattern.isnot(None)).all()
         return {o.spec for o in oai_sets}
 
-    @cached_property
-    def all_oai_pids(self):
-        """Set of OAI identifiers."""
-        oai_pids = (PersistentIdentifier.query
-                    .filter(PersistentIdentifier.pid_type == 'oai')
-                    .all())
-        return {p.pid_value for p in oai_pids}
-
 
 class RecordCheck(Check):
     """Record Check."""
@@ -105,8 +139,8 @@ class RecordCheck(Check):
             self.issues['owners']['duplicates'] = duplicate_owners
 
     def _unresolvable_owners(self):
-        owners = set(self.record.get('owners', []))
-        unresolvable_owners = owners - self.audit.all_owners
+        unresolvable_owners = self.audit.missing_owners(
+            self.record.get('owners', []))
         if unresolvable_owners:
             self.issues['owners']['unresolvable'] = list(unresolvable_owners)
 
@@ -174,7 +208,7 @@ class RecordCheck(Check):
     def _oai_non_minted_pid(self):
         oai_data = self.record.get('_oai', {})
         oai_pid = oai_data.get('id')
-        if oai_pid and oai_pid not in self.audit.all_oai_pids:
+        if oai_pid and self.audit.missing_oai_pids([oai_pid]):
             self.issues['oai']['non_minted_pid'] = oai_data.get('id')
 
     def _oai_duplicate_sets(self):
@@ -203,10 +237,16 @@ class RecordCheck(Check):
 
     def jsonschema(self):
         """Check JSONSchema."""
+        schema = self.record.get('$schema')
+        if schema is None:
+            return
         try:
-            self.record.validate()
-        except (ValidationError, SchemaError) as e:
-            self.issues['jsonschema'] = str(e.message)
+            error = best_match(
+                get_record_validator(schema).iter_errors(self.record))
+        except SchemaError as e:
+            error = e
+        if error is not None:
+            self.issues['jsonschema'] = str(error.message)
 
     def perform(self):
         """Perform record checks."""
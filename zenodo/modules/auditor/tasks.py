@@ -26,15 +26,23 @@
 
 from __future__ import absolute_import
 
+import json
+import logging
 import uuid
 
-from celery import shared_task
+from celery import chord, shared_task
 from flask import current_app
 from invenio_communities.models import Community
 
 from .oai import OAIAudit
 from .records import RecordAudit
-from .utils import all_records, get_file_logger
+from .utils import all_records, get_file_logger, record_uuid_ranges
+
+#: Logger of the chunks of a distributed audit, whose failed checks are only
+#: logged once the chunk reports are merged.
+chunk_logger = logging.getLogger('zenodo.auditor.records.chunks')
+chunk_logger.addHandler(logging.NullHandler())
+chunk_logger.propagate = False
 
 
 @shared_task(ignore_results=True)
@@ -52,6 +60,70 @@ def audit_records(logfile=None):
         pass
 
 
+@shared_task(ignore_results=True)
+def audit_records_distributed(logfile=None, chunk_size=1000):
+    """Audit all records in parallel chunks.
+
+    The records are split into UUID ranges of ``chunk_size`` records, each
+    audited by a separate task. The chunk reports are merged in a single
+    report once all of them have finished.
+
+    :param str logfile: Logfile path for encountered issues.
+    :param int chunk_size: Number of records audited per task.
+    """
+    audit_id = str(audit_records_distributed.request.id or uuid.uuid4())
+    ranges = record_uuid_ranges(chunk_size)
+    if not ranges:
+        return
+    chord(
+        audit_records_chunk.si(
+            audit_id, str(start), str(end) if end else None)
+        for start, end in ranges
+    )(merge_records_audit.s(audit_id, logfile=logfile))
+
+
+@shared_task
+def audit_records_chunk(audit_id, start, end=None):
+    """Audit the records of a UUID range.
+
+    :param audit_id: Identifier of the distributed audit.
+    :param start: Lowest record UUID of the range (inclusive).
+    :param end: Highest record UUID of the range (exclusive).
+    :returns: Report of the chunk, with the dumps of the failed checks.
+    """
+    audit = RecordAudit(audit_id, chunk_logger, all_records(start, end))
+    report = {'checked': 0, 'failed': []}
+    for check in audit:
+        report['checked'] += 1
+        if not check.is_ok:
+            report['failed'].append(check.dump())
+    return report
+
+
+@shared_task(ignore_results=True)
+def merge_records_audit(reports, audit_id, logfile=None):
+    """Merge the chunk reports of a distributed records audit.
+
+    :param reports: Reports returned by the chunk tasks.
+    :param audit_id: Identifier of the distributed audit.
+    :param str logfile: Logfile path for encountered issues.
+    """
+    logger = current_app.logger
+    if logfile:
+        logger = get_file_logger(logfile, 'records', audit_id)
+    checked = failed = 0
+    for report in reports:
+        checked += report['checked']
+        for dump in report['failed']:
+            failed += 1
+            logger.error(json.dumps(dump))
+    logger.warning(json.dumps({
+        'audit_id': audit_id, 'checked': checked, 'failed': failed}))
+    for handler in logger.handlers:
+        handler.flush()
+    return {'checked': checked, 'failed': failed}
+
+
 @shared_task(ignore_results=True)
 def audit_oai(logfile=None):
     """Audit OAI sets.
@@ -63,10 +135,5 @@ def audit_oai(logfile=None):
     if logfile:
         logger = get_file_logger(logfile, 'oai', audit_id)
     audit = OAIAudit(audit_id, logger, Community.query.all())
-    try:
-        for check in audit:
-            pass
-    except Exception:
-        raise
-    finally:
-        audit.clear_db_oai_set_cache()
+    for check in audit:
+        pass
@@ -26,29 +26,117 @@
 
 from __future__ import absolute_import, print_function, unicode_literals
 
+import heapq
 import logging
+from array import array
 from collections import Counter
 from logging.handlers import MemoryHandler
 
-from flask import current_app, url_for
+from flask import current_app
 from invenio_db import db
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records.models import RecordMetadata
-from mock import MagicMock
+from jsonschema.validators import validator_for
+from sqlalchemy import func
 
 from ..records.api import ZenodoRecord
 
 
-def all_records():
-    """Return a ZenodoRecord generator with all records."""
-    records = (db.session.query(RecordMetadata)
-               .join(PersistentIdentifier,
-                     RecordMetadata.id == PersistentIdentifier.object_uuid)
-               .filter(PersistentIdentifier.pid_type == 'recid',
-                       PersistentIdentifier.status == PIDStatus.REGISTERED))
+def _records_query():
+    """Return a query for the metadata of all registered records."""
+    return (db.session.query(RecordMetadata)
+            .join(PersistentIdentifier,
+                  RecordMetadata.id == PersistentIdentifier.object_uuid)
+            .filter(PersistentIdentifier.pid_type == 'recid',
+                    PersistentIdentifier.status == PIDStatus.REGISTERED))
+
+
+def all_records(start=None, end=None):
+    """Return a ZenodoRecord generator with all records.
+
+    :param start: Lowest record UUID to include (inclusive).
+    :param end: Highest record UUID to include (exclusive).
+    """
+    records = _records_query()
+    if start is not None:
+        records = records.filter(RecordMetadata.id >= start)
+    if end is not None:
+        records = records.filter(RecordMetadata.id < end)
     return (ZenodoRecord(data=r.json, model=r) for r in records)
 
 
+def record_uuid_ranges(chunk_size):
+    """Split the registered records into UUID ranges of ``chunk_size``.
+
+    The range boundaries are picked in the database by numbering the ordered
+    record UUIDs, so that the UUIDs themselves never have to be fetched.
+
+    :returns: List of ``(start, end)`` tuples, where ``end`` is ``None`` for
+        the last range.
+    """
+    numbered = (_records_query()
+                .with_entities(
+                    RecordMetadata.id.label('id'),
+                    func.row_number().over(
+                        order_by=RecordMetadata.id).label('row'))
+                .subquery())
+    bounds = [
+        row.id for row in
+        db.session.query(numbered.c.id)
+        .filter((numbered.c.row - 1) % chunk_size == 0)
+        .order_by(numbered.c.id)
+    ]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def missing_values(column, values, *criteria, **kwargs):
+    """Return the values which have no matching row in a column's table.
+
+    The values are looked up in batches, and the ones which were not found
+    are returned.
+
+    :param column: Model column to check the values against.
+    :param values: Iterable of values to check.
+    :param criteria: Extra filters on the column's table.
+    :param batch_size: Number of values checked per query.
+    """
+    values = list(set(values))
+    batch_size = kwargs.get('batch_size', 500)
+    missing = set()
+    for i in range(0, len(values), batch_size):
+        batch = values[i:i + batch_size]
+        found = {
+            v for v, in db.session.query(column)
+            .filter(column.in_(batch), *criteria)
+        }
+        missing.update(set(batch) - found)
+    return missing
+
+
+_validators = {}
+
+
+def get_record_validator(schema):
+    """Return a precompiled validator for a record JSONSchema.
+
+    Validating through ``Record.validate`` checks the schema and resolves its
+    references on every call. Validators are instead built once per schema
+    and process, and keep the resolved references in their resolver's store.
+    """
+    state = current_app.extensions['invenio-records']
+    key = (id(state), schema)
+    if key not in _validators:
+        ref_schema = {'$ref': schema}
+        cls = validator_for(ref_schema)
+        cls.check_schema(ref_schema)
+        _validators[key] = cls(
+            ref_schema,
+            resolver=state.ref_resolver_cls.from_schema(ref_schema),
+            types=current_app.config.get('RECORDS_VALIDATION_TYPES', {}),
+        )
+    return _validators[key]
+
+
 class tree(dict):
     """Self-vivified dictionary."""
 
@@ -63,27 +151,33 @@ def duplicates(l):
     return [i for i, c in Counter(l).items() if c > 1]
 
 
-def sickle_requests_get_mock():
-    """Return a mock `request.get` for `sickle` that uses `Flask.test_client`.
+#: Typecode of the identifier arrays (typecodes must be native strings).
+IDS_TYPECODE = str('l')
 
-    Because `sickle.Sickle` is strongly dependent on the `requests` library to
-    make all its OAI-PMH harvesting calls, it is not possible to use it for
-    local usage without running a live instance of Invenio-OAIServer. To bypass
-    this we are making a function mock that makes a request using the
-    `Flask.test_client`, and returns a mock containing the text response.
-    """
-    def get(endpoint, params, **kwargs):
-        """Mock `request.get` method."""
-        with current_app.test_request_context():
-            with current_app.test_client() as client:
-                if endpoint == 'http://auditor/oai2d':
-                    oai_url = url_for('invenio_oaiserver.response', **params)
-                    res = client.get(oai_url)
-
-                    mock_res = MagicMock()
-                    mock_res.text = res.get_data(as_text=True)
-                    return mock_res
-    return MagicMock(side_effect=get)
+
+def sorted_ids(ids=()):
+    """Return a compact sorted array of unique integer identifiers."""
+    return array(IDS_TYPECODE, sorted(set(ids)))
+
+
+def sorted_union(*arrays):
+    """Yield the unique elements of sorted arrays, in order."""
+    last = None
+    for i in heapq.merge(*arrays):
+        if i != last:
+            yield i
+            last = i
+
+
+def sorted_difference(a, b):
+    """Yield the elements of sorted array ``a`` missing from sorted ``b``."""
+    b = iter(b)
+    current = next(b, None)
+    for i in a:
+        while current is not None and current < i:
+            current = next(b, None)
+        if current != i:
+            yield i
 
 
 def get_file_logger(logfile, audit_type, audit_id):
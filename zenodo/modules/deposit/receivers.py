@@ -31,6 +31,7 @@ from invenio_sipstore.models import RecordSIP
 
 from zenodo.modules.deposit.tasks import datacite_register
 from zenodo.modules.openaire.tasks import openaire_direct_index
+from zenodo.modules.records.tasks import warm_serialization_cache
 from zenodo.modules.sipstore.tasks import archive_sip
 
 
@@ -52,6 +53,17 @@ def openaire_direct_index_after_publish(sender, action=None, pid=None,
         openaire_direct_index.delay(record_uuid=str(record.id))
 
 
+def warm_serialization_cache_after_publish(sender, action=None, pid=None,
+                                           deposit=None):
+    """Render the export formats of the published record in the cache."""
+    if action == 'publish' and \
+            current_app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_ENABLED'] \
+            and current_app.config[
+                'ZENODO_RECORDS_SERIALIZATION_CACHE_WARM_FORMATS']:
+        _, record = deposit.fetch_published()
+        warm_serialization_cache.delay(str(record.id))
+
+
 def sipstore_write_files_after_publish(sender, action=None, pid=None,
                                        deposit=None):
     """Send the SIP for archiving."""
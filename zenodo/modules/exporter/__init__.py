@@ -27,5 +27,9 @@
 from __future__ import absolute_import, print_function
 
 from .api import Exporter
-from .streams import BZip2ResultStream, ResultStream
-from .writers import BucketWriter, filename_factory
+from .checkpoints import ExportRun
+from .columnar import ColumnarSerializer, ParquetResultStream, \
+    record_columns_v1
+from .streams import COMPRESSION_CODECS, BZip2ResultStream, \
+    ParallelCompressedResultStream, ResultStream
+from .writers import BucketWriter, filename_factory, part_filename_factory
@@ -26,9 +26,14 @@
 
 from __future__ import absolute_import, print_function
 
+import json
+from datetime import datetime
+
+from dateutil.parser import parse as iso2dt
 from elasticsearch_dsl import Q
 from flask import current_app
 from invenio_search.api import RecordsSearch
+from six import BytesIO
 
 from .errors import FailedExportJobError
 from .streams import ResultStream
@@ -39,16 +44,42 @@ class Exporter(object):
 
     Takes as input an index, a query, a serializer and an output writer and
     executes the export job.
+
+    If ``shards`` is set, the search results are split into that many slices
+    (using sliced scrolling), which can be exported independently of each
+    other with :py:meth:`run_shard`. Each shard is written to its own part
+    object (named by ``part_key``), and a manifest listing all the parts
+    (named by ``manifest_key``) is written with :py:meth:`write_manifest`.
+
+    Extra arguments for the result stream (e.g. the compression codec and
+    number of workers) can be passed with ``resultstream_kwargs``.
+
+    If ``index_key`` is set, every full export is published as the base dump
+    of an index object, which also lists the incremental (delta) exports made
+    since then with :py:meth:`run_delta`. Each delta contains the records
+    updated since the previous export (according to their ``_updated``
+    timestamp), followed by the tombstones of the records deleted in the
+    meantime (as returned by the ``tombstones`` function). Deltas are named
+    by ``delta_key``.
     """
 
     def __init__(self, index='records', pid_fetcher=None, query=None,
                  resultstream_cls=ResultStream, search_cls=RecordsSearch,
-                 serializer=None, writer=None, ):
+                 serializer=None, writer=None, shards=None, part_key=None,
+                 manifest_key=None, resultstream_kwargs=None, index_key=None,
+                 delta_key=None, tombstones=None):
         """Initialize exporter."""
         self._index = index
+        self._index_key = index_key
+        self._delta_key = delta_key
+        self._tombstones = tombstones
+        self._shards = shards
+        self._part_key = part_key
+        self._manifest_key = manifest_key
         self._pid_fetcher = pid_fetcher
         self._query = query
         self._resultstream_cls = resultstream_cls
+        self._resultstream_kwargs = resultstream_kwargs or {}
         self._search_cls = search_cls
         self._serializer = serializer
         self._writer = writer
@@ -61,13 +92,142 @@ class Exporter(object):
             s = s.query(Q('query_string', query=self._query))
         return s
 
-    def run(self, progress_updater=None):
-        """Run export job."""
-        fp = self._writer.open()
+    @property
+    def shards(self):
+        """Get the number of shards of a sharded export."""
+        return self._shards
+
+    def shard_search(self, shard_id):
+        """Get Elasticsearch search instance for a single shard."""
+        s = self.search
+        # Elasticsearch does not accept a sliced scroll with a single slice.
+        if self._shards > 1:
+            s = s.extra(slice={'id': shard_id, 'max': self._shards})
+        return s
+
+    def delta_search(self, since, until):
+        """Get Elasticsearch search instance for records updated in a range.
+
+        :param since: Start of the range (inclusive).
+        :param until: End of the range (exclusive).
+        """
+        return self.search.filter('range', _updated={
+            'gte': since.isoformat(), 'lt': until.isoformat()})
+
+    @staticmethod
+    def high_water_mark(started=None):
+        """Get the high-water mark of an export started at a given time.
+
+        Records are indexed asynchronously, so records updated shortly before
+        the export started might not be searchable yet. The high-water mark
+        lags behind to make sure such records are part of the next delta.
+        """
+        started = started or datetime.utcnow()
+        return (started - current_app.config['EXPORTER_DELTA_LAG'])\
+            .replace(microsecond=0)
+
+    def _export(self, search, writer, **kwargs):
+        """Export the results of a search with a writer."""
+        resultstream_kwargs = dict(self._resultstream_kwargs, **kwargs)
+        fp = writer.open()
         try:
             fp.write(self._resultstream_cls(
-                self.search, self._pid_fetcher, self._serializer))
+                search, self._pid_fetcher, self._serializer,
+                **resultstream_kwargs))
         except FailedExportJobError as e:
             current_app.logger.exception(e.message)
         finally:
             fp.close()
+
+    def _write_json(self, key, data):
+        """Write a JSON document to an object."""
+        writer = self._writer.sibling(key)
+        fp = writer.open()
+        try:
+            fp.write(BytesIO(json.dumps(data, indent=2).encode('utf8')))
+        finally:
+            fp.close()
+        return writer.describe()
+
+    def run(self, progress_updater=None):
+        """Run export job."""
+        until = self.high_water_mark()
+        self._export(self.search, self._writer)
+        if self._index_key:
+            self.publish_base(self._writer.describe(), until)
+
+    def run_shard(self, run_id, shard_id):
+        """Export a single shard of a sharded export job.
+
+        :param run_id: Identifier of the export run the shard belongs to.
+        :param shard_id: Number of the shard to export.
+        :returns: Description of the written part.
+        """
+        writer = self._writer.sibling(
+            self._part_key(run_id, shard_id, self._shards))
+        self._export(self.shard_search(shard_id), writer)
+        return dict(shard=shard_id, **writer.describe())
+
+    def write_manifest(self, run_id, parts):
+        """Write the manifest of a sharded export job.
+
+        :param run_id: Identifier of the export run.
+        :param parts: Descriptions of the written parts, ordered by shard.
+        """
+        manifest = {
+            'run_id': run_id,
+            'index': self._index,
+            'query': self._query,
+            'shards': self._shards,
+            'parts': parts,
+        }
+        entry = self._write_json(self._manifest_key(run_id), manifest)
+        if self._index_key:
+            self.publish_base(entry, self.high_water_mark(iso2dt(run_id)))
+        return entry
+
+    def read_index(self):
+        """Read the index of the base dump and its deltas."""
+        data = self._writer.sibling(self._index_key).read()
+        if data:
+            return json.loads(data.decode('utf8'))
+
+    def publish_base(self, entry, until):
+        """Publish a full export as the new base dump, without deltas.
+
+        :param entry: Description of the exported object.
+        :param until: High-water mark of the export.
+        """
+        index = {
+            'base': dict(entry, until=until.isoformat()),
+            'deltas': [],
+        }
+        self._write_json(self._index_key, index)
+        return index
+
+    def run_delta(self):
+        """Export the records changed since the last (base or delta) export.
+
+        :returns: Description of the written delta, or ``None`` if there is
+            no base dump yet.
+        """
+        index = self.read_index()
+        if index is None:
+            return None
+        last = index['deltas'][-1] if index['deltas'] else index['base']
+        since, until = iso2dt(last['until']), self.high_water_mark()
+
+        writer = self._writer.sibling(self._delta_key(until.isoformat()))
+        self._export(
+            self.delta_search(since, until), writer,
+            tombstones=self._tombstones(since, until)
+            if self._tombstones else None,
+        )
+        entry = dict(
+            writer.describe(),
+            since=since.isoformat(),
+            until=until.isoformat(),
+        )
+        index['deltas'].append(entry)
+        self._write_json(self._index_key, index)
+        return entry
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Checkpoints for sharded export jobs."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import datetime
+
+from invenio_cache import current_cache
+
+
+class ExportRun(object):
+    """State of a sharded export run.
+
+    The run itself and each finished shard are stored under separate cache
+    keys, so that shards running in parallel on different workers never
+    overwrite each other's checkpoints. A run which did not finish (i.e. its
+    manifest was never written) is picked up again by the next export job,
+    which then only exports the shards that are still missing.
+    """
+
+    key_prefix = 'exporter'
+
+    def __init__(self, job_id, run_id, shards):
+        """Initialize the export run."""
+        self.job_id = job_id
+        self.run_id = run_id
+        self.shards = shards
+
+    @classmethod
+    def _run_key(cls, job_id):
+        return '{0}:{1}:run'.format(cls.key_prefix, job_id)
+
+    def _shard_key(self, shard_id):
+        return '{0}:{1}:{2}:shard:{3}'.format(
+            self.key_prefix, self.job_id, self.run_id, shard_id)
+
+    @classmethod
+    def get(cls, job_id):
+        """Get the unfinished run of a job, if there is one."""
+        data = current_cache.get(cls._run_key(job_id))
+        if data is not None:
+            return cls(job_id, data['run_id'], data['shards'])
+
+    @classmethod
+    def create(cls, job_id, shards):
+        """Start a new run of a job."""
+        run = cls(
+            job_id,
+            datetime.utcnow().replace(microsecond=0).isoformat(),
+            shards,
+        )
+        current_cache.set(
+            cls._run_key(job_id),
+            {'run_id': run.run_id, 'shards': run.shards},
+            timeout=-1,
+        )
+        return run
+
+    @classmethod
+    def get_or_create(cls, job_id, shards):
+        """Resume the unfinished run of a job or start a new one."""
+        run = cls.get(job_id)
+        if run is None or run.shards != shards:
+            run = cls.create(job_id, shards)
+        return run
+
+    def checkpoint(self, shard_id, part):
+        """Mark a shard as exported.
+
+        :param shard_id: Number of the exported shard.
+        :param part: Description of the written part (key, size, checksum).
+        """
+        current_cache.set(self._shard_key(shard_id), part, timeout=-1)
+
+    @property
+    def parts(self):
+        """Get the written parts of all shards (``None`` if not exported)."""
+        return current_cache.get_many(
+            *[self._shard_key(s) for s in range(self.shards)])
+
+    @property
+    def pending_shards(self):
+        """Get the shards which have not been exported yet."""
+        return [s for s, part in enumerate(self.parts) if part is None]
+
+    def finish(self):
+        """Clear the run and all of its checkpoints."""
+        current_cache.delete_many(
+            self._run_key(self.job_id),
+            *[self._shard_key(s) for s in range(self.shards)]
+        )
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Columnar (Apache Parquet) export of record metadata."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import datetime
+
+from six import BytesIO
+
+from .streams import ResultStream
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+def _int(value):
+    return int(value) if value is not None else None
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _stat(name):
+    return lambda src: _int(src.get('_stats', {}).get(name))
+
+
+RECORD_COLUMNS = [
+    ('recid', lambda: pa.int64(), lambda src: _int(src.get('recid'))),
+    ('doi', lambda: pa.string(), lambda src: src.get('doi')),
+    ('conceptrecid', lambda: pa.int64(),
+     lambda src: _int(src.get('conceptrecid'))),
+    ('conceptdoi', lambda: pa.string(), lambda src: src.get('conceptdoi')),
+    ('resource_type', lambda: pa.string(),
+     lambda src: src.get('resource_type', {}).get('type')),
+    ('resource_subtype', lambda: pa.string(),
+     lambda src: src.get('resource_type', {}).get('subtype')),
+    ('access_right', lambda: pa.string(),
+     lambda src: src.get('access_right')),
+    ('communities', lambda: pa.list_(pa.string()),
+     lambda src: src.get('communities')),
+    ('publication_date', lambda: pa.date32(),
+     lambda src: _date(src.get('publication_date'))),
+    ('filecount', lambda: pa.int32(), lambda src: src.get('filecount')),
+    ('size', lambda: pa.int64(), lambda src: _int(src.get('size'))),
+] + [
+    ('stats_{0}'.format(name), lambda: pa.int64(), _stat(name))
+    for name in (
+        'views', 'unique_views', 'downloads', 'unique_downloads', 'volume',
+        'version_views', 'version_unique_views', 'version_downloads',
+        'version_unique_downloads', 'version_volume',
+    )
+]
+"""Columns of the record metadata export.
+
+Each column is defined by its name, a function returning its Arrow type and
+a function extracting its value from the indexed record.
+"""
+
+
+class ColumnarSerializer(object):
+    """Serializer flattening records into rows of a fixed set of columns.
+
+    :param columns: List of ``(name, type, getter)`` column definitions (see
+        :py:data:`RECORD_COLUMNS`).
+    """
+
+    def __init__(self, columns):
+        """Initialize the serializer."""
+        self.columns = columns
+
+    @property
+    def arrow_schema(self):
+        """Get the Arrow schema of the columns."""
+        return pa.schema([
+            pa.field(name, type_()) for name, type_, _ in self.columns])
+
+    def transform_exporter(self, pid, record):
+        """Flatten a single record into a row for the exporter."""
+        src = record['_source']
+        return dict((name, getter(src)) for name, _, getter in self.columns)
+
+
+record_columns_v1 = ColumnarSerializer(RECORD_COLUMNS)
+"""Columnar serializer of the record metadata export."""
+
+
+class _BufferSink(object):
+    """Write-only file object which can be drained while being written."""
+
+    def __init__(self):
+        self._buf = BytesIO()
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        self._buf.write(data)
+        self._pos += len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        """Get and clear the data written since the last drain."""
+        data = self._buf.getvalue()
+        self._buf = BytesIO()
+        return data
+
+
+class ParquetResultStream(ResultStream):
+    """Parquet file of the flattened records for a search.
+
+    Works like :py:data:`ResultStream`, except that each batch of records is
+    flattened by a :py:class:`ColumnarSerializer` and written as a single row
+    group of a Parquet file. Only one batch is held in memory at a time.
+
+    :param compression: Parquet compression codec of the column chunks.
+    """
+
+    def __init__(self, search, pid_fetcher, serializer, batch_size=10000,
+                 compression='snappy', **kwargs):
+        """Initialize result stream."""
+        if pa is None:
+            raise RuntimeError(
+                'The "pyarrow" package is required for Parquet exports.')
+        super(ParquetResultStream, self).__init__(
+            search, pid_fetcher, serializer, batch_size=batch_size, **kwargs)
+        self.schema = serializer.arrow_schema
+        self.compression = compression
+        self._sink = None
+        self._writer = None
+
+    def _serialize(self, hits):
+        """Flatten a batch of hits, returning ``None`` for failures."""
+        rows = []
+        for hit in hits:
+            try:
+                rows.append(self.serializer.transform_exporter(
+                    self.pid_fetcher(hit.meta.id, hit),
+                    dict(_source=hit._d_, _version=0),
+                ))
+            except Exception:
+                rows.append(None)
+        return rows
+
+    def _table(self, rows):
+        """Build an Arrow table out of rows."""
+        return pa.Table.from_arrays([
+            pa.array([row[field.name] for row in rows], type=field.type)
+            for field in self.schema
+        ], schema=self.schema)
+
+    def __next__(self):
+        """Fetch the next row group (or footer) of the Parquet file."""
+        if self._sink is None:
+            self._sink = _BufferSink()
+            self._writer = pq.ParquetWriter(
+                self._sink, self.schema, compression=self.compression)
+        data = b''
+        while not data:
+            if self._writer is None:
+                raise StopIteration
+            rows = self._next_batch()
+            if rows is None:
+                # Write the footer of the file.
+                self._writer.close()
+                self._writer = None
+            elif rows:
+                self._writer.write_table(self._table(rows))
+            data = self._sink.drain()
+        return data
@@ -26,11 +26,15 @@
 
 from __future__ import absolute_import, print_function
 
+from datetime import timedelta
+
 from zenodo.modules.records.fetchers import zenodo_record_fetcher
 from zenodo.modules.records.serializers import json_v1
 
-from .streams import BZip2ResultStream
-from .writers import BucketWriter, filename_factory
+from .columnar import ParquetResultStream, record_columns_v1
+from .streams import ParallelCompressedResultStream
+from .utils import removed_records_tombstones
+from .writers import BucketWriter, filename_factory, part_filename_factory
 
 EXPORTER_BUCKET_UUID = '00000000-0000-0000-0000-000000000001'
 
@@ -42,9 +46,44 @@ EXPORTER_JOBS = {
             bucket_id=EXPORTER_BUCKET_UUID,
             key=filename_factory(name='records', format='json.bz2'),
         ),
-        'resultstream_cls': BZip2ResultStream,
+        'resultstream_cls': ParallelCompressedResultStream,
+        'resultstream_kwargs': {
+            'codec': 'bz2',
+            'workers': 4,
+            'batch_size': 500,
+        },
+        'pid_fetcher': zenodo_record_fetcher,
+        'query': "+_exists_:recid +_missing_:removal_reason",
+        'shards': 8,
+        'part_key': part_filename_factory(name='records', format='json.bz2'),
+        'manifest_key': part_filename_factory(
+            name='records', format='manifest.json'),
+        'index_key': 'records-index.json',
+        'delta_key': part_filename_factory(
+            name='records-delta', format='json.bz2'),
+        'tombstones': removed_records_tombstones,
+    },
+    'records-parquet': {
+        'index': 'records',
+        'serializer': record_columns_v1,
+        'writer': BucketWriter(
+            bucket_id=EXPORTER_BUCKET_UUID,
+            key=filename_factory(name='records', format='parquet'),
+        ),
+        'resultstream_cls': ParquetResultStream,
+        'resultstream_kwargs': {
+            # Number of records per row group
+            'batch_size': 10000,
+        },
         'pid_fetcher': zenodo_record_fetcher,
-        'query': "+_exists_:recid +_missing_:removal_reason"
-    }
+        'query': "+_exists_:recid +_missing_:removal_reason",
+    },
 }
 """Export jobs definitions."""
+
+EXPORTER_DELTA_LAG = timedelta(hours=1)
+"""Lag of the high-water mark of exports behind the start of the export.
+
+Records updated within this time before an export started are exported
+again in the next delta, since they might not have been indexed yet.
+"""
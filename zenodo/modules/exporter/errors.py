@@ -28,8 +28,23 @@
 class FailedExportJobError(Exception):
     """Error for failed export job."""
 
-    def __init__(self, record_ids=None):
-        """Initialize the error with the list of not serialized records."""
-        msg = "Serialization failed for the following records: {}"\
-            .format(', '.join(record_ids))
-        super(FailedExportJobError, self).__init__(msg)
+    def __init__(self, failed_batches=None, total=None):
+        """Initialize the error with the failures of each batch.
+
+        :param failed_batches: List of failures per batch, each a dictionary
+            with the batch number, the number of failed records and (a
+            sample of) the failed record ids.
+        :param total: Total number of records in the export.
+        """
+        self.failed_batches = failed_batches or []
+        self.failed_count = sum(b['failed'] for b in self.failed_batches)
+        self.total = total
+        msg = "Serialization failed for {0} of {1} records in {2} batches."\
+            .format(self.failed_count, total, len(self.failed_batches))
+        self.message = '\n'.join([msg] + [
+            "Batch {batch}: {failed} failed (e.g. {sample}).".format(
+                batch=b['batch'], failed=b['failed'],
+                sample=', '.join(str(i) for i in b['sample']))
+            for b in self.failed_batches
+        ])
+        super(FailedExportJobError, self).__init__(self.message)
@@ -27,53 +27,131 @@
 from __future__ import absolute_import, print_function
 
 import bz2
+import gzip
+import json
+from collections import deque
+from itertools import islice
+from multiprocessing import cpu_count
+from multiprocessing.pool import Pool, ThreadPool
+
+from six import BytesIO
 
 from .errors import FailedExportJobError
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 class ResultStream(object):
     """Stream of serialized records for a search.
 
     The result stream implements a simple iterator that iterates over all
-    records in a specific search and serializes each record. In addition, it
-    emulates a stream API with the ``read()`` method, so that the serialized
-    records can be written to an output.
+    records in a specific search and serializes them in batches. In
+    addition, it emulates a stream API with the ``read()`` method, so that
+    the serialized records can be written to an output.
 
     :param search: Elasticsearch DSL search instance configured for specific
         index.
     :param pid_fetcher: Persistent identifier fetcher that matches configured
         index.
     :param serializer: Serializer that supports export (i.e. the serialize
-        must have implement the API ``serialize_exporter(pid, record)``).
+        must have implement the API ``serialize_exporter(pid, record)``). If
+        the serializer also implements ``serialize_exporter_many(records)``,
+        it is used to serialize a whole batch at once.
+    :param batch_size: Number of records serialized per batch (and returned
+        in a single chunk).
+    :param tombstones: Iterable of tombstones (dictionaries) of deleted
+        records, which are serialized as JSON lines after all records.
     """
 
-    def __init__(self, search, pid_fetcher, serializer):
+    #: Maximum number of failed record ids reported per batch.
+    failed_sample_size = 10
+
+    def __init__(self, search, pid_fetcher, serializer, batch_size=500,
+                 tombstones=None):
         """Initialize result stream."""
         self.pid_fetcher = pid_fetcher
         self.search = search
         self.serializer = serializer
+        self.batch_size = batch_size
+        self.tombstones = iter(tombstones or [])
         self._iter = None
-        self.failed_record_ids = []
+        self.batch_count = 0
+        self.record_count = 0
+        self.failed_batches = []
 
-    def __next__(self):
-        """Fetch next serialized record."""
+    def _serialize_one(self, pid, record):
+        try:
+            return self.serializer.serialize_exporter(pid, record)
+        except Exception:
+            return None
+
+    def _serialize(self, hits):
+        """Serialize a batch of hits, returning ``None`` for failures."""
+        records = []
+        for hit in hits:
+            try:
+                pid = self.pid_fetcher(hit.meta.id, hit)
+            except Exception:
+                pid = None
+            records.append((pid, dict(_source=hit._d_, _version=0)))
+        if hasattr(self.serializer, 'serialize_exporter_many'):
+            try:
+                results = iter(self.serializer.serialize_exporter_many(
+                    [r for r in records if r[0] is not None]))
+                return [next(results) if pid is not None else None
+                        for pid, _ in records]
+            except Exception:
+                # Serialize the records one by one, to only fail the ones
+                # which can't be serialized.
+                pass
+        return [self._serialize_one(pid, record) if pid is not None else None
+                for pid, record in records]
+
+    def _next_batch(self):
+        """Fetch and serialize the next batch of hits.
+
+        :returns: List of the serialized records of the batch (without the
+            failed ones), or ``None`` once all hits have been read.
+        """
         # Initialize iterator (i.e. execute scroll search), if not already
         # initialized.
         if self._iter is None:
             self._iter = self.search.scan()
-        # Fetch next hit.
-        hit = next(self._iter)
-        # Serialize and return hit.
-        result = ''
-        try:
-            result = self.serializer.serialize_exporter(
-                self.pid_fetcher(hit.meta.id, hit),
-                dict(_source=hit._d_, _version=0),
-            )
-        except Exception as e:
-            self.failed_record_ids.append(hit.meta.id)
+        # Fetch next batch of hits.
+        hits = list(islice(self._iter, self.batch_size))
+        if not hits:
+            return None
+        # Serialize the batch.
+        results = self._serialize(hits)
+        failed = [hit.meta.id for hit, result in zip(hits, results)
+                  if result is None]
+        if failed:
+            self.failed_batches.append(dict(
+                batch=self.batch_count,
+                failed=len(failed),
+                sample=failed[:self.failed_sample_size],
+            ))
+        self.batch_count += 1
+        self.record_count += len(hits)
+        return [r for r in results if r is not None]
 
-        return result
+    def __next__(self):
+        """Fetch next batch of serialized records."""
+        # Skip the batches without any serialized record, since an empty
+        # chunk is read as the end of the stream.
+        results = self._next_batch()
+        while results == []:
+            results = self._next_batch()
+        if results is None:
+            tombstones = list(islice(self.tombstones, self.batch_size))
+            if not tombstones:
+                raise StopIteration
+            return b''.join(
+                json.dumps(t).encode('utf8') + b'\n' for t in tombstones)
+        return b''.join(results)
 
     def __iter__(self):
         """Iterator."""
@@ -84,7 +162,7 @@ class ResultStream(object):
         return self.__next__()
 
     def read(self, *args):
-        """Read next serialized record for search results.
+        """Read next serialized batch of records for search results.
 
         The method will return an empty string for repeated calls once all
         records have been read.
@@ -92,9 +170,11 @@ class ResultStream(object):
         try:
             return next(self)
         except StopIteration:
-            if self.failed_record_ids:
-                # raise an exception with the list of not serialized records
-                raise FailedExportJobError(record_ids=self.failed_record_ids)
+            if self.failed_batches:
+                # raise an exception with the failures of each batch
+                raise FailedExportJobError(
+                    failed_batches=self.failed_batches,
+                    total=self.record_count)
             return b''
 
 
@@ -126,3 +206,124 @@ class BZip2ResultStream(ResultStream):
                 return self.compressor.flush()
             except ValueError:
                 raise StopIteration
+
+
+def bz2_compress(data, level=9):
+    """Compress a block of data into a standalone BZip2 stream."""
+    return bz2.compress(data, level)
+
+
+def gzip_compress(data, level=9):
+    """Compress a block of data into a standalone GZip member."""
+    buf = BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=level,
+                       mtime=0) as fp:
+        fp.write(data)
+    return buf.getvalue()
+
+
+def zstd_compress(data, level=3):
+    """Compress a block of data into a standalone Zstandard frame."""
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+COMPRESSION_CODECS = {
+    'bz2': bz2_compress,
+    'gzip': gzip_compress,
+    'zstd': zstd_compress,
+}
+"""Block compression functions per codec."""
+
+
+class ParallelCompressedResultStream(ResultStream):
+    """Compressed stream of serialized records, compressed by a worker pool.
+
+    Serialized records are collected in blocks of ``block_size`` bytes, and
+    each block is compressed independently by a pool of ``workers``, while
+    the records of the next blocks are still being fetched and serialized.
+    The compressed blocks are returned in order, so that the output is a
+    valid multi-member BZip2/GZip file (or multi-frame Zstandard file), which
+    can be decompressed with the standard tools.
+
+    The compression functions of all codecs release the GIL, so a thread pool
+    (the default) keeps all cores busy. A process pool (``pool='process'``)
+    cannot be used inside a prefork Celery worker, since daemonic processes
+    cannot have children.
+
+    :param codec: Compression codec (one of :py:data:`COMPRESSION_CODECS`).
+    :param level: Compression level (defaults to the codec's default).
+    :param workers: Number of compression workers (defaults to the number of
+        CPUs).
+    :param block_size: Size of the uncompressed blocks in bytes.
+    :param pool: Type of the worker pool, ``'thread'`` or ``'process'``.
+    """
+
+    def __init__(self, search, pid_fetcher, serializer, codec='bz2',
+                 level=None, workers=None, block_size=4 * 1024 * 1024,
+                 pool='thread', **kwargs):
+        """Initialize result stream."""
+        super(ParallelCompressedResultStream, self).__init__(
+            search, pid_fetcher, serializer, **kwargs)
+        if codec not in COMPRESSION_CODECS:
+            raise ValueError('Unknown compression codec: {0}'.format(codec))
+        if codec == 'zstd' and zstandard is None:
+            raise RuntimeError(
+                'The "zstandard" package is required for zstd compression.')
+        if pool not in ('thread', 'process'):
+            raise ValueError('Unknown worker pool type: {0}'.format(pool))
+        self.compress = COMPRESSION_CODECS[codec]
+        self.level = level
+        self.workers = workers or cpu_count()
+        self.block_size = block_size
+        self.pool_cls = ThreadPool if pool == 'thread' else Pool
+        self._pool = None
+        self._pending = deque()
+        self._exhausted = False
+
+    def _read_block(self):
+        """Read the next block of serialized records."""
+        chunks, size = [], 0
+        while size < self.block_size:
+            try:
+                data = super(ParallelCompressedResultStream, self).__next__()
+            except StopIteration:
+                self._exhausted = True
+                break
+            if data:
+                chunks.append(data)
+                size += len(data)
+        return b''.join(chunks)
+
+    def _compress_args(self, block):
+        if self.level is None:
+            return (block, )
+        return (block, self.level)
+
+    def _close(self):
+        """Shut down the worker pool."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __next__(self):
+        """Fetch next compressed block of serialized records."""
+        if self._pool is None and not self._exhausted:
+            self._pool = self.pool_cls(self.workers)
+        try:
+            # Keep every worker busy with a block, plus one block in reserve.
+            while not self._exhausted and \
+                    len(self._pending) <= self.workers:
+                block = self._read_block()
+                if block:
+                    self._pending.append(self._pool.apply_async(
+                        self.compress, self._compress_args(block)))
+            if not self._pending:
+                self._close()
+                raise StopIteration
+            return self._pending.popleft().get()
+        except Exception:
+            # Make sure that failures (and the end of the stream) do not
+            # leave idle pools behind.
+            self._close()
+            raise
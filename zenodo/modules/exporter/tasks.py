@@ -26,14 +26,72 @@
 
 from __future__ import absolute_import, print_function
 
-from celery import shared_task
+from celery import chord, shared_task
 from flask import current_app
 
 from .api import Exporter
+from .checkpoints import ExportRun
+
+
+def _exporter(job_id):
+    """Get the exporter of an export job."""
+    job_definition = current_app.extensions['invenio-exporter'].job(job_id)
+    return Exporter(**job_definition)
 
 
 @shared_task
 def export_job(job_id=None):
-    """Export job."""
-    job_definition = current_app.extensions['invenio-exporter'].job(job_id)
-    Exporter(**job_definition).run()
+    """Export job.
+
+    Sharded jobs are fanned out to one task per shard. If the previous run of
+    the job did not finish, it is resumed by exporting only the shards that
+    are still missing.
+    """
+    exporter = _exporter(job_id)
+    if not exporter.shards:
+        exporter.run()
+        return
+
+    run = ExportRun.get_or_create(job_id, exporter.shards)
+    pending = run.pending_shards
+    if pending:
+        chord(
+            export_shard.si(job_id, run.run_id, shard_id)
+            for shard_id in pending
+        )(export_manifest.si(job_id, run.run_id))
+    else:
+        export_manifest.delay(job_id, run.run_id)
+
+
+@shared_task(acks_late=True)
+def export_shard(job_id, run_id, shard_id):
+    """Export a single shard of a sharded export job."""
+    run = ExportRun.get(job_id)
+    if run is None or run.run_id != run_id:
+        return
+    run.checkpoint(shard_id, _exporter(job_id).run_shard(run_id, shard_id))
+
+
+@shared_task(acks_late=True)
+def export_manifest(job_id, run_id):
+    """Write the manifest of a sharded export job and finish its run."""
+    run = ExportRun.get(job_id)
+    if run is None or run.run_id != run_id:
+        return
+    parts = run.parts
+    if None in parts:
+        current_app.logger.error(
+            'Export run %s of job %s is missing shards %s.',
+            run_id, job_id, run.pending_shards)
+        return
+    _exporter(job_id).write_manifest(run_id, parts)
+    run.finish()
+
+
+@shared_task
+def export_delta_job(job_id=None):
+    """Export the records changed since the last export of a job."""
+    entry = _exporter(job_id).run_delta()
+    if entry is None:
+        current_app.logger.warning(
+            'Export job %s has no base dump for deltas.', job_id)
@@ -31,6 +31,8 @@ from flask import current_app
 from invenio_db import db
 from invenio_files_rest.errors import FilesException
 from invenio_files_rest.models import Bucket, Location
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
 
 
 def initialize_exporter_bucket():
@@ -51,3 +53,34 @@ def initialize_exporter_bucket():
                         default_storage_class=storage_class)
         db.session.add(bucket)
         db.session.commit()
+
+
+def removed_records_tombstones(since, until):
+    """Get the tombstones of the records removed in a time range.
+
+    Removed records keep their (cleared) metadata, but their ``recid`` PID is
+    marked as deleted.
+
+    :param since: Start of the range (inclusive).
+    :param until: End of the range (exclusive).
+    """
+    query = (
+        db.session.query(PersistentIdentifier.pid_value,
+                         RecordMetadata.updated)
+        .join(RecordMetadata,
+              RecordMetadata.id == PersistentIdentifier.object_uuid)
+        .filter(
+            PersistentIdentifier.pid_type == 'recid',
+            PersistentIdentifier.object_type == 'rec',
+            PersistentIdentifier.status == PIDStatus.DELETED,
+            RecordMetadata.updated >= since,
+            RecordMetadata.updated < until,
+        )
+        .order_by(RecordMetadata.updated)
+    )
+    for recid, updated in query.yield_per(1000):
+        yield {
+            'id': int(recid),
+            'deleted': True,
+            'updated': updated.isoformat(),
+        }
@@ -58,6 +58,26 @@ class BucketWriter(object):
         """Close bucket file."""
         db.session.commit()
 
+    def sibling(self, key):
+        """Get a writer for another object in the same bucket."""
+        return self.__class__(bucket_id=self.bucket_id, key=key)
+
+    def read(self):
+        """Read the contents of the object, if it exists."""
+        obj = ObjectVersion.get(self.bucket_id, self.key)
+        if obj is None or obj.file is None:
+            return None
+        with obj.file.storage().open() as fp:
+            return fp.read()
+
+    def describe(self):
+        """Describe the written object."""
+        return {
+            'key': self.obj.key,
+            'size': self.obj.file.size,
+            'checksum': self.obj.file.checksum,
+        }
+
 
 class NullWriter(object):
     """Export writer that does not write anywhere."""
@@ -75,6 +95,17 @@ class NullWriter(object):
     def close(self):
         """Dummy close."""
 
+    def sibling(self, key):
+        """Dummy sibling."""
+        return self
+
+    def read(self):
+        """Dummy read."""
+
+    def describe(self):
+        """Dummy describe."""
+        return {}
+
 
 def filename_factory(**kwargs):
     """Get a function which generates a filename with a timestamp."""
@@ -82,3 +113,17 @@ def filename_factory(**kwargs):
         timestamp=datetime.utcnow().replace(microsecond=0).isoformat(),
         **kwargs
     )
+
+
+def part_filename_factory(**kwargs):
+    """Get a function which generates the filenames of a sharded export.
+
+    The returned function generates the filename of a single part when
+    given a part number, or the filename of the whole run otherwise.
+    """
+    def factory(run_id, part=None, parts=None):
+        if part is None:
+            return '{name}-{run_id}.{format}'.format(run_id=run_id, **kwargs)
+        return '{name}-{run_id}.part-{part:04d}-of-{parts:04d}.{format}'\
+            .format(run_id=run_id, part=part, parts=parts, **kwargs)
+    return factory
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2023 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Create an index on the creation date of the files."""
+
+from alembic import op
+
+revision = 'e8ddd7d523d1'
+down_revision = None
+branch_labels = (u'zenodo_metrics',)
+depends_on = '2e97565eba72'  # invenio_files_rest: create files REST tables
+
+
+def upgrade():
+    """Upgrade database."""
+    op.create_index(
+        'ix_files_files_created', 'files_files', ['created'], unique=False)
+
+
+def downgrade():
+    """Downgrade database."""
+    op.drop_index('ix_files_files_created', table_name='files_files')
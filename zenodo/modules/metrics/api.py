@@ -27,27 +27,97 @@
 from __future__ import absolute_import
 
 import calendar
+import operator
 from datetime import datetime, timedelta
 
 import requests
 from elasticsearch_dsl import Search
 from flask import current_app
 from invenio_accounts.models import User
+from invenio_cache import current_cache
 from invenio_communities.models import Community
 from invenio_files_rest.models import FileInstance
 from invenio_search import current_search_client
 from invenio_search.utils import build_alias_name
 
+from .hyperloglog import HyperLogLog
 from .proxies import current_metrics
 
 
+def _time_range(start, end=None):
+    """Build a range filter from ``start`` (included) to ``end``."""
+    time_range = {'gte': start.isoformat()}
+    if end is not None:
+        time_range['lt'] = end.isoformat()
+    return time_range
+
+
+def running_total(name, compute, initial, merge=operator.add, start=None):
+    """Get the value of a metric from its stored running total.
+
+    The value of the days before the checkpoint (i.e. the current day minus
+    ``ZENODO_METRICS_CHECKPOINT_LAG``) is stored, so that each run only
+    computes the value of the days after the last checkpoint. The values of
+    the past days after the checkpoint are also stored, per day, until they
+    become final and are computed again for the running total. Thus each run
+    only computes the value of the current day.
+
+    :param name: Name of the stored running total.
+    :param compute: Function computing the value of a time range, from a
+        start date (included) to an end date (excluded, ``None`` for now).
+    :param initial: Value of an empty time range.
+    :param merge: Function combining the values of two time ranges.
+    :param start: Date from which the total is computed (defaults to the
+        start date of the metrics).
+    """
+    key = 'ZENODO_METRICS_STORE::{}'.format(name)
+    start = start or current_metrics.metrics_start_date
+    state = current_cache.get(key)
+    if not state or state['start'] != start:
+        state = {'start': start, 'checkpoint': start, 'value': initial}
+    days = state.get('days', {})
+
+    today = datetime.utcnow().replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    checkpoint = today - current_app.config['ZENODO_METRICS_CHECKPOINT_LAG']
+    value = state['value']
+    changed = False
+    if state['checkpoint'] < checkpoint:
+        value = merge(value, compute(state['checkpoint'], checkpoint))
+        changed = True
+    else:
+        checkpoint = state['checkpoint']
+
+    # Drop the days which are now part of the running total
+    for day in [d for d in days if d < checkpoint]:
+        del days[day]
+        changed = True
+    day = checkpoint
+    while day < today:
+        if day not in days:
+            days[day] = compute(day, day + timedelta(days=1))
+            changed = True
+        day += timedelta(days=1)
+
+    if changed:
+        current_cache.set(key, {
+            'start': start,
+            'checkpoint': checkpoint,
+            'value': value,
+            'days': days,
+        }, timeout=-1)
+    for day in sorted(days):
+        value = merge(value, days[day])
+    return merge(value, compute(max(today, checkpoint), None))
+
+
 class ZenodoMetric(object):
     """API class for Zenodo Metrics."""
 
     @staticmethod
-    def get_data_transfer():
-        """Get file transfer volume in TB."""
-        time_range = {'gte': current_metrics.metrics_start_date.isoformat()}
+    def _get_data_transfer(start, end=None):
+        """Get file transfer volume in bytes for a time range."""
+        time_range = _time_range(start, end)
 
         search = Search(
             using=current_search_client,
@@ -69,27 +139,53 @@ class ZenodoMetric(object):
         result = search[:0].execute().aggregations.to_dict()
         upload_volume = result.get('upload_volume', {}).get('value', 0)
 
-        return int(download_volume + upload_volume)
+        return download_volume + upload_volume
 
-    @staticmethod
-    def get_visitors():
-        """Get number of unique zenodo users."""
-        time_range = {'gte': current_metrics.metrics_start_date.isoformat()}
+    @classmethod
+    def get_data_transfer(cls):
+        """Get file transfer volume in bytes."""
+        return int(running_total(
+            'data_transfer', cls._get_data_transfer, initial=0))
 
+    @staticmethod
+    def _get_visitors(start, end=None):
+        """Get the sketch of the unique visitors of a time range."""
+        visitors = HyperLogLog()
         search = Search(
             using=current_search_client,
             index=build_alias_name('events-stats-*')
-        ).filter('range', timestamp=time_range).params(request_timeout=120)
-
-        search.aggs.metric(
-            'visitors_count', 'cardinality', field='visitor_id'
-        )
-        result = search[:0].execute()
-
-        if 'visitors_count' not in result.aggregations:
-            return 0
-
-        return int(result.aggregations.visitors_count.value)
+        ).filter(
+            'range', timestamp=_time_range(start, end)
+        ).params(request_timeout=120)[:0]
+
+        # Page through the distinct visitor IDs
+        after = None
+        while True:
+            composite = {
+                'size': current_app.config['ZENODO_METRICS_VISITORS_PAGE'],
+                'sources': [
+                    {'visitor_id': {'terms': {'field': 'visitor_id'}}},
+                ],
+            }
+            if after:
+                composite['after'] = after
+            page_search = search.extra(
+                aggs={'visitors': {'composite': composite}})
+            result = page_search.execute().to_dict()
+            agg = result.get('aggregations', {}).get('visitors', {})
+            buckets = agg.get('buckets', [])
+            visitors.update(b['key']['visitor_id'] for b in buckets)
+            after = agg.get('after_key')
+            if not buckets or not after:
+                return visitors
+
+    @classmethod
+    def get_visitors(cls):
+        """Get number of unique zenodo users."""
+        visitors = running_total(
+            'visitors', cls._get_visitors, initial=HyperLogLog(),
+            merge=HyperLogLog.merge)
+        return visitors.count()
 
     @staticmethod
     def get_uptime():
@@ -107,7 +203,7 @@ class ZenodoMetric(object):
         res = requests.post(url, json={
             'api_key': api_key,
             'custom_uptime_ranges': '{}_{}'.format(start_ts, end_ts),
-        })
+        }, timeout=current_app.config['ZENODO_METRICS_COMPUTE_TIMEOUT'])
 
         return sum(
             float(d['custom_uptime_ranges'])
@@ -124,9 +220,22 @@ class ZenodoMetric(object):
         ).count()
 
     @staticmethod
-    def get_files():
-        """Get number of files."""
-        return FileInstance.query.count()
+    def _get_files(start, end=None):
+        """Get number of files created in a time range."""
+        query = FileInstance.query.filter(FileInstance.created >= start)
+        if end is not None:
+            query = query.filter(FileInstance.created < end)
+        return query.count()
+
+    @classmethod
+    def get_files(cls):
+        """Get number of files.
+
+        The files are counted from a running total of the files created each
+        day, thus files deleted after being counted are still included.
+        """
+        return running_total(
+            'files', cls._get_files, initial=0, start=datetime(1970, 1, 1))
 
     @staticmethod
     def get_communities():
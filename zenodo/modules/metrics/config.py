@@ -33,6 +33,22 @@ from .api import ZenodoMetric
 ZENODO_METRICS_START_DATE = datetime.datetime(2021, 1, 1)
 ZENODO_METRICS_CACHE_TIMEOUT = int(datetime.timedelta(hours=1).total_seconds())
 ZENODO_METRICS_CACHE_UPDATE_INTERVAL = datetime.timedelta(minutes=30)
+#: Seconds after which a running metrics refresh is considered lost.
+ZENODO_METRICS_REFRESH_LOCK_TIMEOUT = int(
+    datetime.timedelta(minutes=10).total_seconds())
+#: Default seconds to wait for the value of a metric. It can be overridden
+#: per metric with a ``timeout`` key.
+ZENODO_METRICS_COMPUTE_TIMEOUT = 120
+
+#: Days after which the daily values of the metrics are considered final, and
+#: added to the stored running totals.
+ZENODO_METRICS_CHECKPOINT_LAG = datetime.timedelta(days=2)
+#: Number of distinct visitor IDs fetched per request.
+ZENODO_METRICS_VISITORS_PAGE = 10000
+
+#: Record the latency of the requests and Celery tasks (needs the
+#: ``prometheus-client`` package).
+ZENODO_METRICS_INSTRUMENTATION_ENABLED = True
 
 ZENODO_METRICS_UPTIME_ROBOT_METRIC_IDS = {}
 ZENODO_METRICS_UPTIME_ROBOT_URL = 'https://api.uptimerobot.com/v2/getMonitors'
@@ -62,7 +78,8 @@ ZENODO_METRICS_DATA = {
             'name': 'zenodo_last_month_uptime_ratio',
             'help': 'Zenodo uptime percentage for the last month.',
             'type': 'gauge',
-            'value': ZenodoMetric.get_uptime
+            'value': ZenodoMetric.get_uptime,
+            'timeout': 30,
         },
         {
             'name': 'zenodo_researchers',
@@ -26,9 +26,10 @@
 
 from __future__ import absolute_import, print_function
 
+from celery.signals import task_postrun, task_prerun
 from flask import current_app
 
-from . import config
+from . import config, instrumentation
 
 
 class ZenodoMetrics(object):
@@ -49,6 +50,15 @@ class ZenodoMetrics(object):
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
+        if app.config['ZENODO_METRICS_INSTRUMENTATION_ENABLED']:
+            app.before_request(instrumentation.before_request)
+            app.after_request(instrumentation.after_request)
+            task_prerun.connect(
+                instrumentation.task_prerun_receiver, weak=False,
+                dispatch_uid='zenodo_metrics_task_prerun')
+            task_postrun.connect(
+                instrumentation.task_postrun_receiver, weak=False,
+                dispatch_uid='zenodo_metrics_task_postrun')
         app.extensions['zenodo-metrics'] = self
 
     @property
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2021 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""HyperLogLog cardinality sketch."""
+
+from __future__ import absolute_import
+
+import hashlib
+import math
+import struct
+
+from six import text_type
+
+
+class HyperLogLog(object):
+    """HyperLogLog cardinality sketch.
+
+    Estimates the number of distinct values added to it, using ``2 **
+    precision`` bytes of memory (the standard error is about ``1.04 /
+    sqrt(2 ** precision)``, i.e. 0.8% for the default precision). Sketches
+    can be merged to estimate the cardinality of the union of their values,
+    without the values themselves.
+    """
+
+    def __init__(self, precision=14, registers=None):
+        """Initialize the sketch."""
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None \
+            else bytearray(self.size)
+
+    def add(self, value):
+        """Add a value to the sketch."""
+        if isinstance(value, text_type):
+            value = value.encode('utf-8')
+        x = struct.unpack('>Q', hashlib.sha1(value).digest()[:8])[0]
+        index = x >> (64 - self.precision)
+        bits = 64 - self.precision
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        """Add many values to the sketch."""
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Create the sketch of the union of two sketches."""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precision.')
+        return HyperLogLog(self.precision, bytearray(
+            max(a, b) for a, b in zip(self.registers, other.registers)))
+
+    def count(self):
+        """Estimate the number of distinct values."""
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(b'\x00')
+        # Small range correction
+        if zeros and estimate <= 2.5 * m:
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        """Estimate the number of distinct values."""
+        return self.count()
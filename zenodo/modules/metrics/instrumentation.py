@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2021 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Latency and usage instrumentation, exposed in the Prometheus text format.
+
+The metrics are recorded with ``prometheus_client``, when installed. To
+collect the metrics of several processes (e.g. uWSGI, gunicorn or Celery
+workers), the ``PROMETHEUS_MULTIPROC_DIR`` environment variable must point
+to a directory shared by the processes (and emptied on restart).
+"""
+
+from __future__ import absolute_import
+
+import os
+from functools import wraps
+from timeit import default_timer
+
+from elasticsearch import Urllib3HttpConnection
+from flask import g, request
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, \
+        CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+except ImportError:
+    Counter = Histogram = None
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0,
+           60.0, 300.0, 1800.0)
+"""Histogram buckets in seconds, spanning both requests and tasks."""
+
+
+class _NullMetric(object):
+    """Metric discarding the observations."""
+
+    def labels(self, *args, **kwargs):
+        """Get the metric of some labels."""
+        return self
+
+    def observe(self, value):
+        """Discard an observation."""
+
+    def inc(self, amount=1):
+        """Discard an increment."""
+
+
+def _histogram(name, documentation, labelnames):
+    """Create a histogram, if ``prometheus_client`` is installed."""
+    if Histogram is None:
+        return _NullMetric()
+    return Histogram(name, documentation, labelnames, buckets=BUCKETS)
+
+
+def _counter(name, documentation, labelnames):
+    """Create a counter, if ``prometheus_client`` is installed."""
+    if Counter is None:
+        return _NullMetric()
+    return Counter(name, documentation, labelnames)
+
+
+REQUEST_DURATION = _histogram(
+    'zenodo_http_request_duration_seconds',
+    'Duration of the HTTP requests.',
+    ['blueprint', 'endpoint', 'method', 'status'])
+
+SERIALIZER_DURATION = _histogram(
+    'zenodo_serializer_duration_seconds',
+    'Duration of the serialization of the REST API responses.',
+    ['serializer'])
+
+SEARCH_DURATION = _histogram(
+    'zenodo_search_request_duration_seconds',
+    'Duration of the Elasticsearch requests.',
+    ['method', 'operation'])
+
+TASK_DURATION = _histogram(
+    'zenodo_celery_task_duration_seconds',
+    'Runtime of the Celery tasks.',
+    ['task', 'state'])
+
+PERMISSION_CHECKS = _counter(
+    'zenodo_record_permission_checks_total',
+    'Record permission checks, either computed or reused within a request.',
+    ['endpoint', 'action', 'cached'])
+
+
+def is_available():
+    """Check if the instrumentation metrics are recorded."""
+    return Histogram is not None
+
+
+def exposition():
+    """Render the instrumentation metrics in the Prometheus text format."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ or \
+            'prometheus_multiproc_dir' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def timed(histogram, **labels):
+    """Decorator observing the duration of the calls of a function."""
+    def decorator(f):
+        @wraps(f)
+        def inner(*args, **kwargs):
+            start = default_timer()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                histogram.labels(**labels).observe(default_timer() - start)
+        return inner
+    return decorator
+
+
+def before_request():
+    """Start timing a request."""
+    g.zenodo_metrics_request_start = default_timer()
+
+
+def after_request(response):
+    """Observe the duration of a request."""
+    start = g.pop('zenodo_metrics_request_start', None)
+    if start is not None:
+        REQUEST_DURATION.labels(
+            blueprint=request.blueprint or '',
+            endpoint=request.endpoint or '',
+            method=request.method,
+            status=response.status_code,
+        ).observe(default_timer() - start)
+    return response
+
+
+class TimedUrllib3HttpConnection(Urllib3HttpConnection):
+    """Elasticsearch connection observing the duration of the requests."""
+
+    def perform_request(self, method, url, *args, **kwargs):
+        """Perform a request, observing its duration."""
+        # The operation is the last API endpoint of the path, e.g. "_search"
+        operation = next(
+            (part for part in reversed(url.split('?', 1)[0].split('/'))
+             if part.startswith('_')), method.lower())
+        start = default_timer()
+        try:
+            return super(TimedUrllib3HttpConnection, self).perform_request(
+                method, url, *args, **kwargs)
+        finally:
+            SEARCH_DURATION.labels(method=method, operation=operation) \
+                .observe(default_timer() - start)
+
+
+_tasks_start = {}
+
+
+def task_prerun_receiver(task_id=None, task=None, **kwargs):
+    """Start timing a Celery task."""
+    _tasks_start[task_id] = default_timer()
+
+
+def task_postrun_receiver(task_id=None, task=None, state=None, **kwargs):
+    """Observe the runtime of a Celery task."""
+    start = _tasks_start.pop(task_id, None)
+    if start is not None:
+        TASK_DURATION.labels(task=task.name, state=state or '') \
+            .observe(default_timer() - start)
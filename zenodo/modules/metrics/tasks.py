@@ -29,6 +29,14 @@ from . import utils
 
 
 @shared_task(ignore_result=True)
-def calculate_metrics(metric_id=None):
-    """Calculate metrics for the passed metric ID."""
-    utils.calculate_metrics(metric_id)
+def calculate_metrics(metric_id=None, release_lock=False):
+    """Calculate metrics for the passed metric ID.
+
+    :param release_lock: Release the refresh lock of the metric, which was
+        acquired when sending the task.
+    """
+    try:
+        utils.calculate_metrics(metric_id)
+    finally:
+        if release_lock:
+            utils.release_refresh_lock(metric_id)
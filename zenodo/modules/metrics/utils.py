@@ -23,31 +23,122 @@
 # as an Intergovernmental Organization or submit itself to any jurisdiction.
 
 """Utilities for metrics module."""
+
+import time
 from copy import deepcopy
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
 
 from flask import current_app
 from invenio_cache import current_cache
 
 
+def _cache_key(metric_id):
+    return 'ZENODO_METRICS_CACHE::{}'.format(metric_id)
+
+
+def _lock_key(metric_id):
+    return 'ZENODO_METRICS_LOCK::{}'.format(metric_id)
+
+
+def get_cached_metrics(metric_id):
+    """Get the last computed metrics with the time they were computed at.
+
+    :returns: A dictionary with the ``metrics`` and their ``updated``
+        timestamp, or ``None`` if they were never computed.
+    """
+    cached_data = current_cache.get(_cache_key(metric_id))
+    if isinstance(cached_data, dict):
+        return cached_data
+
+
 def get_metrics(metric_id):
-    cached_data = current_cache.get('ZENODO_METRICS_CACHE::{}'.format(metric_id))
+    """Get the last computed metrics."""
+    cached_data = get_cached_metrics(metric_id)
     if cached_data is not None:
-        return cached_data
+        return cached_data['metrics']
+
+
+def metrics_age(cached_data):
+    """Get the age in seconds of cached metrics."""
+    return max(0, int(time.time() - cached_data['updated']))
+
+
+def refresh_metrics(metric_id):
+    """Send off a task to compute metrics, unless one is already running.
+
+    The refresh is guarded by a lock key which is atomically added to the
+    cache, so that concurrent requests only trigger a single computation.
+
+    :returns: ``True`` if a task was sent.
+    """
+    from .tasks import calculate_metrics as calculate_metrics_task
+    timeout = current_app.config['ZENODO_METRICS_REFRESH_LOCK_TIMEOUT']
+    if not current_cache.add(_lock_key(metric_id), True, timeout=timeout):
+        return False
+    try:
+        calculate_metrics_task.delay(metric_id, release_lock=True)
+    except Exception:
+        release_refresh_lock(metric_id)
+        raise
+    return True
+
+
+def release_refresh_lock(metric_id):
+    """Release the refresh lock of a metric."""
+    current_cache.delete(_lock_key(metric_id))
+
+
+def _compute_metric(app, func):
+    with app.app_context():
+        return func()
 
 
 def calculate_metrics(metric_id, cache=True):
-    """Calculate a metric's result."""
+    """Calculate a metric's result.
+
+    The values are computed in parallel, each with its own timeout. A value
+    which fails or times out keeps its last computed value, if any, so that a
+    slow source does not block the rest of the metrics.
+    """
     result = deepcopy(
         current_app.config['ZENODO_METRICS_DATA'][metric_id])
+    default_timeout = current_app.config['ZENODO_METRICS_COMPUTE_TIMEOUT']
+    previous = {m['name']: m['value'] for m in get_metrics(metric_id) or []}
 
-    for metric in result:
-        metric['value'] = metric['value']()
+    app = current_app._get_current_object()
+    pool = ThreadPool(len(result) or 1)
+    try:
+        started = time.time()
+        pending = [
+            (metric, metric.pop('timeout', default_timeout),
+             pool.apply_async(_compute_metric, (app, metric['value'])))
+            for metric in result
+        ]
+        for metric, timeout, value in pending:
+            try:
+                metric['value'] = value.get(
+                    max(0, started + timeout - time.time()))
+            except TimeoutError:
+                current_app.logger.warning(
+                    'Metric %s timed out after %ss.', metric['name'], timeout)
+                metric['value'] = previous.get(metric['name'])
+            except Exception:
+                current_app.logger.exception(
+                    'Failed to compute metric %s.', metric['name'])
+                metric['value'] = previous.get(metric['name'])
+        result = [m for m in result if m['value'] is not None]
 
-    if cache:
-        current_cache.set(
-            'ZENODO_METRICS_CACHE::{}'.format(metric_id),
-            result, timeout=current_app.config['ZENODO_METRICS_CACHE_TIMEOUT'],
-        )
+        if cache:
+            current_cache.set(
+                _cache_key(metric_id),
+                {'metrics': result, 'updated': time.time()},
+                timeout=-1,
+            )
+    finally:
+        # The result is cached before waiting for the metrics that timed out
+        pool.close()
+        pool.join()
 
     return result
 
@@ -27,7 +27,7 @@
 from flask import Blueprint, Response, current_app
 import humanize
 
-from . import utils, tasks
+from . import instrumentation, utils
 
 blueprint = Blueprint(
     'zenodo_metrics',
@@ -35,19 +35,35 @@ blueprint = Blueprint(
 )
 
 
+@blueprint.route('/metrics')
+def instrumentation_metrics():
+    """Latency metrics endpoint."""
+    if not instrumentation.is_available():
+        return Response('Instrumentation not available', status=404,
+                        mimetype='text/plain')
+    return Response(instrumentation.exposition(),
+                    mimetype=instrumentation.CONTENT_TYPE_LATEST)
+
+
 @blueprint.route('/metrics/<string:metric_id>')
 def metrics(metric_id):
     """Metrics endpoint."""
     if metric_id not in current_app.config['ZENODO_METRICS_DATA']:
         return Response('Invalid key', status=404, mimetype='text/plain')
 
-    metrics = utils.get_metrics(metric_id)
-    if metrics:
-        response = utils.formatted_response(metrics)
-        return Response(response, mimetype='text/plain')
+    cached_metrics = utils.get_cached_metrics(metric_id)
+    if cached_metrics:
+        # Serve the last computed metrics, even if they are stale, and
+        # refresh them in the background.
+        age = utils.metrics_age(cached_metrics)
+        if age > current_app.config['ZENODO_METRICS_CACHE_TIMEOUT']:
+            utils.refresh_metrics(metric_id)
+        response = utils.formatted_response(cached_metrics['metrics'])
+        return Response(response, mimetype='text/plain',
+                        headers={'Age': age})
 
     # Send off task to compute metrics
-    tasks.calculate_metrics.delay(metric_id)
+    utils.refresh_metrics(metric_id)
     retry_after = current_app.config["ZENODO_METRICS_CACHE_UPDATE_INTERVAL"]
     return Response(
         "Metrics not available. Try again after {}.".format(
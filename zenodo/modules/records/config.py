@@ -166,3 +166,33 @@ ZENODO_RECORDS_FUNDER_PROGRAM_MATCHES = {
     '10.13039/100011102': ('^FP7$',),
     '10.13039/100018693': ('^HE$', '^Horizon Europe',),
 }
+
+ZENODO_RECORDS_INDEXER_CHUNK_SIZE = 500
+"""Number of bulk indexing queue messages whose records are prepared together.
+"""
+
+ZENODO_RECORDS_BUCKET_ACCESS_CACHE_TIMEOUT = 60
+"""Seconds to cache the access information of the record of a files bucket.
+"""
+
+ZENODO_RECORDS_SERIALIZATION_CACHE_ENABLED = True
+"""Serve the revision-dependent record serializations from a cache."""
+
+ZENODO_RECORDS_SERIALIZATION_CACHE_SIZE = 1000
+"""Number of serializations kept in each process (0 disables the local LRU).
+"""
+
+ZENODO_RECORDS_SERIALIZATION_CACHE_TIMEOUT = 60 * 60
+"""Seconds to cache a record serialization."""
+
+ZENODO_RECORDS_SERIALIZATION_CACHE_VERSION = None
+"""Version of the cached serializations, part of their keys.
+
+Defaults to the Zenodo version. Change it on deploys changing the output of
+the serializers (e.g. a schema fix, or an upgraded dependency), so that the
+serializations cached by the previous deploy are not served anymore.
+"""
+
+ZENODO_RECORDS_SERIALIZATION_CACHE_WARM_FORMATS = [
+    'dcite4', 'hx', 'xm', 'dcat']
+"""Export formats (``ZENODO_RECORDS_EXPORTFORMATS``) rendered on publish."""
@@ -30,6 +30,7 @@ import collections
 
 from invenio_indexer.signals import before_record_index
 from invenio_pidrelations.contrib.versioning import versioning_blueprint
+from invenio_records.signals import after_record_delete, after_record_update
 from six import itervalues
 from werkzeug.utils import cached_property
 
@@ -38,7 +39,10 @@ from zenodo.modules.records.models import ObjectType
 from . import config
 from .custom_metadata import CustomMetadataAPI
 from .indexer import indexer_receiver
+from .permissions import invalidate_bucket_access
 from .proxies import current_zenodo_records
+from .serializers.cache import SerializationCache, \
+    invalidate_serialization_cache
 from .utils import serialize_record, transform_record
 from .views import blueprint, record_jinja_context
 
@@ -96,6 +100,18 @@ class ZenodoRecords(object):
         )
 
         before_record_index.connect(indexer_receiver, sender=app)
+        after_record_update.connect(invalidate_bucket_access, sender=app)
+        after_record_delete.connect(invalidate_bucket_access, sender=app)
+
+        self.serialization_cache = SerializationCache(
+            maxsize=app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_SIZE'],
+            timeout=app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_TIMEOUT'],
+            version=app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_VERSION'],
+        )
+        after_record_update.connect(
+            invalidate_serialization_cache, sender=app)
+        after_record_delete.connect(
+            invalidate_serialization_cache, sender=app)
         app.extensions['zenodo-records'] = self
 
     @staticmethod
@@ -26,20 +26,179 @@
 
 from __future__ import absolute_import, print_function
 
+from flask import current_app
+from invenio_indexer.api import RecordIndexer
 from invenio_pidrelations.contrib.versioning import PIDVersioning
 from invenio_pidrelations.proxies import current_pidrelations
 from invenio_pidrelations.serializers.utils import serialize_relations
 from invenio_pidstore.models import PersistentIdentifier
+from sqlalchemy.orm.exc import NoResultFound
 
 from zenodo.modules.records.serializers.pidrelations import \
-    serialize_related_identifiers
-from zenodo.modules.records.utils import build_record_custom_fields
+    serialize_related_identifiers, serialize_version_relations
+from zenodo.modules.records.utils import build_record_custom_fields, \
+    is_record
 from zenodo.modules.spam.models import SafelistEntry
-from zenodo.modules.stats.utils import build_record_stats
+from zenodo.modules.stats.utils import build_record_stats, \
+    build_records_stats, chunkify
+
+
+class BulkIndexingContext(object):
+    """Data prefetched for all the records of a bulk indexing chunk.
+
+    The PIDs, version relations, safelist status of the owners and the
+    statistics of the records are fetched with a few queries for the whole
+    chunk, instead of several queries per record.
+
+    :param records: The records of the chunk.
+    """
+
+    def __init__(self, records):
+        """Prefetch the data of the records."""
+        records = [r for r in records if is_record(r) and r.get('recid')]
+
+        recids = dict((r.id, str(r['recid'])) for r in records)
+        self.pids = dict(
+            (pid.object_uuid, pid) for pid in
+            PersistentIdentifier.query.filter(
+                PersistentIdentifier.pid_type == 'recid',
+                PersistentIdentifier.object_uuid.in_(list(recids)),
+            ) if recids.get(pid.object_uuid) == pid.pid_value
+        ) if recids else {}
+        self.relations = serialize_version_relations(self.pids.values())
+        self.safelisted = SafelistEntry.get_safelisted_user_ids(
+            owner for r in records for owner in r.get('owners', []))
+        self.stats = build_records_stats(
+            (r['recid'], r.get('conceptrecid')) for r in records)
+
+    def get_pid(self, record):
+        """Get the recid PID of a record."""
+        return self.pids.get(record.id)
+
+    def get_relations(self, record):
+        """Get the serialized relations of a record."""
+        pid = self.get_pid(record)
+        if pid is None:
+            return None
+        return self.relations.get(
+            pid.id, {'version': [{'is_last': True, 'index': 0}, ]})
+
+    def get_related_identifiers(self, record):
+        """Get the related identifiers derived from the PID relations.
+
+        Record PIDs are only children in the version relations, thus the
+        only related identifier is the concept DOI of the record.
+        """
+        pid = self.get_pid(record)
+        if pid is not None and pid.id in self.relations and \
+                'conceptdoi' in record:
+            return [{
+                'scheme': 'doi',
+                'relation': 'isVersionOf',
+                'identifier': record['conceptdoi'],
+            }]
+        return []
+
+    def get_safelisted(self, record):
+        """Get the safelist status of a record."""
+        return any(
+            owner in self.safelisted for owner in record.get('owners', []))
+
+    def get_stats(self, record):
+        """Get the stats of a record."""
+        stats = self.stats.get(str(record['recid']))
+        if stats is None:
+            return build_record_stats(
+                record['recid'], record.get('conceptrecid'))
+        return stats
+
+
+class ZenodoRecordIndexer(RecordIndexer):
+    """Record indexer which prepares the records of a bulk chunk together.
+
+    The bulk queue is consumed in chunks. The records of a chunk are fetched
+    with a single query, and the data needed for their transformation is
+    prefetched in a :py:class:`BulkIndexingContext`, which is passed to the
+    ``before_record_index`` receivers as ``context``.
+    """
+
+    def __init__(self, chunk_size=None, **kwargs):
+        """Initialize indexer."""
+        super(ZenodoRecordIndexer, self).__init__(**kwargs)
+        self._chunk_size = chunk_size
+
+    @property
+    def chunk_size(self):
+        """Number of queued messages processed together."""
+        return self._chunk_size or \
+            current_app.config['ZENODO_RECORDS_INDEXER_CHUNK_SIZE']
+
+    def _actionsiter(self, message_iterator):
+        """Iterate bulk actions, preparing each chunk of records together.
+
+        :param message_iterator: Iterator yielding messages from a queue.
+        """
+        for messages in chunkify(message_iterator, self.chunk_size):
+            payloads = [message.decode() for message in messages]
+            try:
+                records = dict(
+                    (str(r.id), r) for r in self.record_cls.get_records(
+                        [p['id'] for p in payloads if p['op'] != 'delete']))
+                context = BulkIndexingContext(records.values())
+            except Exception:
+                current_app.logger.error(
+                    'Failed to prefetch bulk indexing chunk', exc_info=True)
+                records, context = {}, None
+
+            for message, payload in zip(messages, payloads):
+                try:
+                    if payload['op'] == 'delete':
+                        yield self._delete_action(payload)
+                    else:
+                        yield self._index_action(
+                            payload, record=records.get(payload['id']),
+                            context=context)
+                    message.ack()
+                except NoResultFound:
+                    message.reject()
+                except Exception:
+                    message.reject()
+                    current_app.logger.error(
+                        "Failed to index record {0}".format(payload.get('id')),
+                        exc_info=True)
+
+    def _index_action(self, payload, record=None, context=None):
+        """Bulk index action.
+
+        :param payload: Decoded message body.
+        :param record: The already fetched record.
+        :param context: The bulk indexing context of the record's chunk.
+        :returns: Dictionary defining an Elasticsearch bulk 'index' action.
+        """
+        if record is None:
+            record = self.record_cls.get_record(payload['id'])
+        index, doc_type = self.record_to_index(record)
+
+        arguments = {}
+        body = self._prepare_record(
+            record, index, doc_type, arguments, context=context)
+        index, doc_type = self._prepare_index(index, doc_type)
+
+        action = {
+            '_op_type': 'index',
+            '_index': index,
+            '_id': str(record.id),
+            '_version': record.revision_id,
+            '_version_type': self._version_type,
+            '_source': body
+        }
+        action.update(arguments)
+
+        return action
 
 
 def indexer_receiver(sender, json=None, record=None, index=None,
-                     **dummy_kwargs):
+                     context=None, **dummy_kwargs):
     """Connect to before_record_index signal to transform record for ES."""
     if not index.startswith('records-') or record.get('$schema') is None:
         return
@@ -53,23 +212,31 @@ def indexer_receiver(sender, json=None, record=None, index=None,
         json['filecount'] = len(files)
         json['size'] = sum([f.get('size', 0) for f in files])
 
-    pid = PersistentIdentifier.query.filter(
-        PersistentIdentifier.pid_value == str(record['recid']),
-        PersistentIdentifier.pid_type == 'recid',
-        PersistentIdentifier.object_uuid == record.id,
-    ).one_or_none()
-    if pid:
-        pv = PIDVersioning(child=pid)
-        if pv.exists:
-            relations = serialize_relations(pid)
-        else:
-            relations = {'version': [{'is_last': True, 'index': 0}, ]}
+    if context is not None and record.id in context.pids:
+        relations = context.get_relations(record)
         if relations:
             json['relations'] = relations
-
-        rels = serialize_related_identifiers(pid)
+        rels = context.get_related_identifiers(record)
         if rels:
             json.setdefault('related_identifiers', []).extend(rels)
+    else:
+        pid = PersistentIdentifier.query.filter(
+            PersistentIdentifier.pid_value == str(record['recid']),
+            PersistentIdentifier.pid_type == 'recid',
+            PersistentIdentifier.object_uuid == record.id,
+        ).one_or_none()
+        if pid:
+            pv = PIDVersioning(child=pid)
+            if pv.exists:
+                relations = serialize_relations(pid)
+            else:
+                relations = {'version': [{'is_last': True, 'index': 0}, ]}
+            if relations:
+                json['relations'] = relations
+
+            rels = serialize_related_identifiers(pid)
+            if rels:
+                json.setdefault('related_identifiers', []).extend(rels)
 
     for loc in json.get('locations', []):
         if loc.get('lat') and loc.get('lon'):
@@ -79,10 +246,16 @@ def indexer_receiver(sender, json=None, record=None, index=None,
     if '_internal' in json:
         del json['_internal']
 
-    json['_stats'] = build_record_stats(record['recid'],
-                                        record.get('conceptrecid'))
+    if context is not None:
+        json['_stats'] = context.get_stats(record)
+    else:
+        json['_stats'] = build_record_stats(record['recid'],
+                                            record.get('conceptrecid'))
 
-    json['_safelisted'] = SafelistEntry.get_record_status(record)
+    if context is not None:
+        json['_safelisted'] = context.get_safelisted(record)
+    else:
+        json['_safelisted'] = SafelistEntry.get_record_status(record)
 
     custom_es_fields = build_record_custom_fields(json)
     for es_field, es_value in custom_es_fields.items():
@@ -26,10 +26,16 @@
 
 from __future__ import absolute_import, print_function
 
-from flask import current_app, request, session
+from copy import deepcopy
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, \
+    request, session
 from flask_principal import ActionNeed
 from flask_security import current_user
 from invenio_access import Permission
+from invenio_cache import current_cache
+from invenio_db import db
 from invenio_files_rest.models import Bucket, MultipartObject, ObjectVersion
 from invenio_pidrelations.contrib.versioning import PIDVersioning
 from invenio_pidstore.models import PersistentIdentifier
@@ -37,9 +43,12 @@ from invenio_records.api import Record
 from invenio_records_files.api import FileObject
 from invenio_records_files.models import RecordsBuckets
 from invenio_rest.errors import RESTException
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from werkzeug.exceptions import HTTPException
 from zenodo_accessrequests.models import SecretLink
 
+from zenodo.modules.metrics.instrumentation import PERMISSION_CHECKS
 from zenodo.modules.tokens import decode_rat
 from zenodo.modules.utils import obj_or_import_string
 
@@ -48,6 +57,11 @@ from .api import ZenodoRecord
 from .models import AccessRight
 from .utils import is_deposit, is_record
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 
 def get_public_bucket_uuids():
     """Return a list of UUIDs (strings) with publicly accessible buckets."""
@@ -84,29 +98,148 @@ def files_permission_factory(obj, action=None):
             return PublicBucketPermission(action)
 
         # Record or deposit bucket
-        rbs = RecordsBuckets.query.filter_by(bucket_id=bucket_id).all()
-        if len(rbs) >= 2:  # Extra formats bucket or bad records-buckets state
-            # Only admins should access. Users use the ".../formats" endpoints
-            return Permission(ActionNeed('admin-access'))
-        rb = next(iter(rbs), None)  # Use first bucket
-        if rb:
-            record = Record.get_record(rb.record_id)
+        record = get_bucket_record_access(bucket_id)
+        if record is not None:
             # "Cache" the file's record in the request context (e.g for stats)
-            if record and request:
+            if request:
                 setattr(request, 'current_file_record', record)
 
             # Bail if extra formats bucket
             if str(bucket_id) == \
                     record.get('_buckets', {}).get('extra_formats'):
                 return Permission(ActionNeed('admin-access'))
-            if is_record(record):
+            if record.kind == 'record':
                 return RecordFilesPermission.create(record, action)
-            elif is_deposit(record):
+            elif record.kind == 'deposit':
                 return DepositFilesPermission.create(record, action)
 
     return Permission(ActionNeed('admin-access'))
 
 
+class RecordAccess(Mapping):
+    """Read-only subset of a record's metadata, used for access control.
+
+    It holds the record fields needed to decide on the access to the files of
+    a record or deposit (and to build their statistics events), so that file
+    requests do not need to load the full record.
+    """
+
+    fields = (
+        '$schema', 'recid', 'conceptrecid', 'doi', 'conceptdoi',
+        'access_right', 'embargo_date', 'owners', 'resource_type',
+        'communities',
+    )
+
+    def __init__(self, id, kind, data):
+        """Initialize the record access.
+
+        :param id: Record UUID, as a string.
+        :param kind: Either ``'record'``, ``'deposit'`` or ``None``.
+        :param data: Record fields.
+        """
+        self.id = id
+        self.kind = kind
+        self._data = data
+
+    @classmethod
+    def from_record(cls, record):
+        """Create the record access of a record."""
+        data = {k: deepcopy(record[k]) for k in cls.fields if k in record}
+        data['_deposit'] = {
+            k: deepcopy(v) for k, v in record.get('_deposit', {}).items()
+            if k in ('id', 'owners')}
+        data['_buckets'] = dict(record.get('_buckets', {}))
+        kind = 'record' if is_record(record) else \
+            'deposit' if is_deposit(record) else None
+        return cls(str(record.id), kind, data)
+
+    def dumps(self):
+        """Dump the record access for caching."""
+        return {'id': self.id, 'kind': self.kind, 'data': self._data}
+
+    @classmethod
+    def loads(cls, data):
+        """Load a cached record access."""
+        return cls(data['id'], data['kind'], data['data'])
+
+    def __getitem__(self, key):
+        """Get a record field (a copy, for nested values)."""
+        value = self._data[key]
+        return deepcopy(value) if isinstance(value, (dict, list)) else value
+
+    def __iter__(self):
+        """Iterate over the record fields."""
+        return iter(self._data)
+
+    def __len__(self):
+        """Get the number of record fields."""
+        return len(self._data)
+
+
+def _bucket_access_cache_key(bucket_id):
+    return 'zenodo:bucket-access:{0}'.format(bucket_id)
+
+
+def get_bucket_record_access(bucket_id):
+    """Get the access information of the record of a files bucket.
+
+    The result is memoized for the request and kept for a short time in the
+    shared cache. It is ``None`` if the bucket does not belong to exactly one
+    record or deposit, in which case it is not cached.
+    """
+    bucket_id = str(bucket_id)
+    memo = g.setdefault('zenodo_bucket_access', {})
+    if bucket_id in memo:
+        return memo[bucket_id]
+
+    key = _bucket_access_cache_key(bucket_id)
+    cached = current_cache.get(key)
+    if cached is not None:
+        access = RecordAccess.loads(cached)
+    else:
+        access = None
+        rbs = RecordsBuckets.query.filter_by(bucket_id=bucket_id).all()
+        # Extra formats bucket or bad records-buckets state otherwise
+        if len(rbs) == 1:
+            record = Record.get_record(rbs[0].record_id)
+            if record:
+                access = RecordAccess.from_record(record)
+                current_cache.set(
+                    key, access.dumps(), timeout=current_app.config[
+                        'ZENODO_RECORDS_BUCKET_ACCESS_CACHE_TIMEOUT'])
+    memo[bucket_id] = access
+    return access
+
+
+def invalidate_bucket_access(sender, record=None, **kwargs):
+    """Invalidate the cached access information of a record's buckets.
+
+    The record signals are sent before the transaction is committed, thus a
+    concurrent request could cache the old access information again in
+    between. The entries are deleted once more after the transaction ends.
+    """
+    bucket_ids = set(record.get('_buckets', {}).values())
+    if bucket_ids:
+        keys = [_bucket_access_cache_key(b) for b in bucket_ids]
+        current_cache.delete_many(*keys)
+        db.session.info.setdefault(
+            'zenodo_bucket_access_keys', set()).update(keys)
+        if has_app_context():
+            memo = g.get('zenodo_bucket_access', {})
+            for b in bucket_ids:
+                memo.pop(b, None)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _delete_bucket_access(session, transaction):
+    """Delete the access information invalidated during a transaction."""
+    if transaction.parent is not None:
+        return
+    keys = session.info.pop('zenodo_bucket_access_keys', None)
+    if keys:
+        current_cache.delete_many(*keys)
+
+
 def record_permission_factory(record=None, action=None):
     """Record permission factory."""
     return RecordPermission.create(record, action)
@@ -360,6 +493,35 @@ def allow(user, record):
     return True
 
 
+def memoize_permission(action):
+    """Decorator memoizing the decisions of a permission for the request.
+
+    The decisions are keyed by the user, the record and its revision, and the
+    action. Records without an identifier (e.g. plain dictionaries) are not
+    memoized.
+    """
+    def decorator(f):
+        @wraps(f)
+        def inner(user, record):
+            record_id = getattr(record, 'id', None)
+            if record_id is None or not has_request_context():
+                return f(user, record)
+            key = (user.get_id(), str(record_id),
+                   getattr(record, 'revision_id', None), action)
+            # Decisions depend on the request (session and token arguments)
+            decisions = g.setdefault('zenodo_permission_decisions', {})
+            cached = key in decisions
+            PERMISSION_CHECKS.labels(
+                endpoint=request.endpoint or '', action=action,
+                cached=cached).inc()
+            if not cached:
+                decisions[key] = f(user, record)
+            return decisions[key]
+        return inner
+    return decorator
+
+
+@memoize_permission('read-files')
 def has_read_files_permission(user, record):
     """Check if user has read access to the record."""
     # Allow if record is open access
@@ -392,6 +554,7 @@ def has_read_files_permission(user, record):
     return has_update_permission(user, record)
 
 
+@memoize_permission('update')
 def has_update_permission(user, record):
     """Check if user has update access to the record."""
     # Allow owners
@@ -404,6 +567,7 @@ def has_update_permission(user, record):
     return has_admin_permission(user, record)
 
 
+@memoize_permission('newversion')
 def has_newversion_permission(user, record):
     """Check if the user has permission to create a newversion for a record."""
     # Only the owner of the latest version can create new versions
@@ -29,9 +29,13 @@ from __future__ import absolute_import, print_function
 from dojson.contrib.to_marc21 import to_marc21
 from invenio_records_rest.serializers.citeproc import CiteprocSerializer
 from invenio_records_rest.serializers.datacite import OAIDataCiteSerializer
-from invenio_records_rest.serializers.response import record_responsify, \
-    search_responsify
+from invenio_records_rest.serializers.response import \
+    record_responsify as _record_responsify
+from invenio_records_rest.serializers.response import \
+    search_responsify as _search_responsify
 
+from zenodo.modules.metrics.instrumentation import SERIALIZER_DURATION, \
+    timed
 from zenodo.modules.openaire.schema import RecordSchemaOpenAIREJSON
 from zenodo.modules.records.serializers.datacite import ZenodoDataCite31Serializer, \
     ZenodoDataCite41Serializer
@@ -39,6 +43,7 @@ from zenodo.modules.records.serializers.dc import ZenodoDublinCoreSerializer
 from zenodo.modules.records.serializers.marc21 import ZenodoMARCXMLSerializer
 
 from .bibtex import BibTeXSerializer
+from .cache import cached_serializer
 from .dcat import DCATSerializer
 from .extra_formats import ExtraFormatsSerializer
 from .files import files_responsify
@@ -54,6 +59,21 @@ from .schemas.legacyjson import DepositFormSchemaV1, FileSchemaV1, \
     GitHubRecordSchemaV1, LegacyRecordSchemaV1
 from .schemas.marc21 import RecordSchemaMARC21
 
+
+def record_responsify(serializer, mimetype):
+    """Create a record response serializer observing its duration."""
+    return timed(SERIALIZER_DURATION, serializer='{0}:{1}'.format(
+        serializer.__class__.__name__, mimetype))(
+            _record_responsify(serializer, mimetype))
+
+
+def search_responsify(serializer, mimetype):
+    """Create a search response serializer observing its duration."""
+    return timed(SERIALIZER_DURATION, serializer='{0}:{1}:search'.format(
+        serializer.__class__.__name__, mimetype))(
+            _search_responsify(serializer, mimetype))
+
+
 # Serializers
 # ===========
 #: Zenodo JSON serializer version 1.0.0
@@ -73,15 +93,20 @@ deposit_formjson_v1 = LegacyJSONSerializer(
 deposit_legacyjson_v1 = DepositLegacyJSONSerializer(
     LegacyRecordSchemaV1, replace_refs=True)
 #: MARCXML serializer version 1.0.0
-marcxml_v1 = ZenodoMARCXMLSerializer(
-    to_marc21, schema_class=RecordSchemaMARC21, replace_refs=True)
+marcxml_v1 = cached_serializer(ZenodoMARCXMLSerializer(
+    to_marc21, schema_class=RecordSchemaMARC21, replace_refs=True),
+    'marcxml_v1', search_hits=True)
 #: BibTeX serializer version 1.0.0
-bibtex_v1 = BibTeXSerializer()
+bibtex_v1 = cached_serializer(BibTeXSerializer(), 'bibtex_v1')
 #: DataCite serializers
-datacite_v31 = ZenodoDataCite31Serializer(DataCiteSchemaV1, replace_refs=True)
-datacite_v41 = ZenodoDataCite41Serializer(DataCiteSchemaV4, replace_refs=True)
+datacite_v31 = cached_serializer(
+    ZenodoDataCite31Serializer(DataCiteSchemaV1, replace_refs=True),
+    'datacite_v31', search_hits=True)
+datacite_v41 = cached_serializer(
+    ZenodoDataCite41Serializer(DataCiteSchemaV4, replace_refs=True),
+    'datacite_v41', search_hits=True)
 #: DCAT serializer
-dcat_v1 = DCATSerializer(datacite_v41)
+dcat_v1 = cached_serializer(DCATSerializer(datacite_v41), 'dcat_v1')
 #: OAI DataCite serializer
 oai_datacite = OAIDataCiteSerializer(
     serializer=datacite_v31,
@@ -93,9 +118,12 @@ oai_datacite_v41 = OAIDataCiteSerializer(
     datacentre='CERN.ZENODO',
 )
 #: Dublin Core serializer
-dc_v1 = ZenodoDublinCoreSerializer(DublinCoreV1, replace_refs=True)
+dc_v1 = cached_serializer(
+    ZenodoDublinCoreSerializer(DublinCoreV1, replace_refs=True),
+    'dc_v1', search_hits=True)
 #: CSL-JSON serializer
-csl_v1 = JSONSerializer(RecordSchemaCSLJSON, replace_refs=True)
+csl_v1 = cached_serializer(
+    JSONSerializer(RecordSchemaCSLJSON, replace_refs=True), 'csl_v1')
 #: CSL Citation Formatter serializer
 citeproc_v1 = CiteprocSerializer(csl_v1)
 #: OpenAIRE JSON serializer
@@ -153,6 +181,8 @@ datacite_v31_search = search_responsify(
     datacite_v31, 'application/x-datacite+xml')
 #: DublinCore record serializer for search records.
 dc_v1_search = search_responsify(dc_v1, 'application/x-dc+xml')
+#: DCAT record serializer for search records.
+dcat_v1_search = search_responsify(dcat_v1, 'application/rdf+xml')
 schemaorg_jsonld_v1_search = record_responsify(
     schemaorg_jsonld_v1, 'application/ld+json')
 #: GeoJSON record serializer for search records.
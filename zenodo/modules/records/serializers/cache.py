@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2023 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Cache of rendered record serializations."""
+
+from __future__ import absolute_import, print_function
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import six
+from flask import current_app, has_request_context
+from flask_security import current_user
+from invenio_cache import current_cache
+from invenio_records.api import Record
+
+from zenodo.version import __version__
+
+from ..permissions import has_read_files_permission
+
+
+class SerializationCache(object):
+    """Two-level cache of record serializations.
+
+    Entries are kept in a process-local LRU with a TTL, in front of the shared
+    cache, so that processes can reuse (and warm) each other's serializations.
+    Keys include the record revision, thus a committed record change is never
+    served stale, and the version of the serializations, thus a deploy changing
+    them doesn't serve the ones cached before.
+    """
+
+    def __init__(self, maxsize=1000, timeout=3600, version=None,
+                 prefix='zenodo:serialization'):
+        """Initialize the cache."""
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.version = version or __version__
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, *parts):
+        """Build the key of an entry."""
+        return ':'.join([self.prefix, six.text_type(self.version)] +
+                        [six.text_type(p) for p in parts])
+
+    def _store(self, key, value):
+        """Store an entry in the process-local LRU."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.timeout, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Get an entry, or ``None`` if it's not cached."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > time.time():
+                self._entries[key] = entry
+                return entry[1]
+        value = current_cache.get(key)
+        if value is not None:
+            self._store(key, value)
+        return value
+
+    def set(self, key, value):
+        """Cache an entry."""
+        self._store(key, value)
+        current_cache.set(key, value, timeout=self.timeout)
+
+    def invalidate(self, record_id):
+        """Drop the process-local entries of a record."""
+        marker = ':{0}:'.format(record_id)
+        with self._lock:
+            for key in [k for k in self._entries if marker in k]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop all the process-local entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+def current_serialization_cache():
+    """Get the serialization cache of the application, if it's enabled."""
+    if not current_app.config.get(
+            'ZENODO_RECORDS_SERIALIZATION_CACHE_ENABLED'):
+        return None
+    ext = current_app.extensions.get('zenodo-records')
+    return getattr(ext, 'serialization_cache', None)
+
+
+def files_visible(record):
+    """Check if the files of a record are included in its serialization."""
+    if '_files' not in record:
+        return False
+    return not has_request_context() or \
+        has_read_files_permission(current_user, record)
+
+
+def _cached(cache, key, render):
+    """Get a value from the cache, or render and cache it."""
+    value = cache.get(key)
+    if value is None:
+        value = render()
+        cache.set(key, value)
+    elif not isinstance(value, (six.binary_type, six.text_type)):
+        # Intermediate representations get post-processed by the callers
+        value = copy.deepcopy(value)
+    return value
+
+
+def cached_serializer(serializer, name, search_hits=False):
+    """Serve the serializations of a serializer from the cache.
+
+    Single record serializations are keyed by the record UUID and revision,
+    the serializer name, the PID it is serialized for, the files visibility
+    and the presence of links. With ``search_hits``, the intermediate
+    representation of search hits is also cached, keyed by the record UUID
+    and indexed document version, so that it's reused across search pages
+    (and by serializers wrapping this one, e.g. DCAT on DataCite).
+
+    Only formats which depend solely on the record revision should be
+    cached, i.e. not the ones including usage statistics or the request host.
+    """
+    serialize = serializer.serialize
+
+    @wraps(serialize)
+    def cached_serialize(pid, record, *args, **kwargs):
+        cache = current_serialization_cache()
+        if cache is None or not isinstance(record, Record) or \
+                record.id is None or record.revision_id is None:
+            return serialize(pid, record, *args, **kwargs)
+        links_factory = args[0] if args else kwargs.get('links_factory')
+        key = cache.make_key(
+            record.id, record.revision_id, name,
+            '{0}-{1}'.format(pid.pid_type, pid.pid_value),
+            int(files_visible(record)), int(links_factory is not None))
+        return _cached(
+            cache, key, lambda: serialize(pid, record, *args, **kwargs))
+
+    serializer.serialize = cached_serialize
+
+    if search_hits:
+        transform_search_hit = serializer.transform_search_hit
+
+        @wraps(transform_search_hit)
+        def cached_transform_search_hit(pid, record_hit, **kwargs):
+            cache = current_serialization_cache()
+            if cache is None or record_hit.get('_version') is None:
+                return transform_search_hit(pid, record_hit, **kwargs)
+            key = cache.make_key(
+                record_hit['_id'], record_hit['_version'], name, 'hit',
+                int(kwargs.get('links_factory') is not None))
+            return _cached(cache, key, lambda: transform_search_hit(
+                pid, record_hit, **kwargs))
+
+        serializer.transform_search_hit = cached_transform_search_hit
+
+    return serializer
+
+
+def invalidate_serialization_cache(sender, record=None, **kwargs):
+    """Drop the cached serializations of a record when it's committed."""
+    cache = current_serialization_cache()
+    if cache is not None and record is not None and record.id is not None:
+        cache.invalidate(record.id)
@@ -27,9 +27,10 @@
 from __future__ import absolute_import, print_function
 
 import mimetypes
+import threading
 
 import idutils
-from flask import has_request_context
+from flask import has_request_context, request
 from flask_security import current_user
 from invenio_records.api import Record
 from lxml import etree as ET
@@ -41,25 +42,53 @@ from zenodo.modules.records.serializers.schemas.common import ui_link_for
 from ..permissions import has_read_files_permission
 
 
+class _Chunks(object):
+    """File-like object collecting the written chunks."""
+
+    def __init__(self):
+        """Initialize the chunks."""
+        self.chunks = []
+
+    def write(self, data):
+        """Collect a chunk."""
+        self.chunks.append(data)
+
+    def pop(self):
+        """Return and reset the collected chunks."""
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
 class DCATSerializer(object):
     """DCAT serializer for records."""
 
     def __init__(self, datacite_serializer):
         """."""
         self.datacite_serializer = datacite_serializer
+        self._local = threading.local()
 
     @cached_property
-    def xslt_transform_func(self):
-        """Return the DCAT XSLT transformation function."""
+    def xslt_stylesheet(self):
+        """Return the parsed DCAT XSLT stylesheet."""
         with resource_stream('zenodo.modules.records',
                              'data/datacite-to-dcat-ap.xsl') as f:
-            xsl = ET.XML(f.read())
-        transform = ET.XSLT(xsl)
+            return ET.XML(f.read())
+
+    @property
+    def xslt_transform_func(self):
+        """Return the DCAT XSLT transformation function.
+
+        XSLT objects are not thread-safe, thus the stylesheet is compiled once
+        per thread.
+        """
+        transform = getattr(self._local, 'transform', None)
+        if transform is None:
+            transform = self._local.transform = ET.XSLT(self.xslt_stylesheet)
         return transform
 
-    def _add_files(self, root, files, record):
+    def _add_files(self, description, files, record):
         """Add files information via distribution elements."""
-        ns = root.nsmap
+        ns = description.nsmap
 
         def download_url(file, record):
             url = ui_link_for('record_file', id=record['recid'], filename=file['key'])
@@ -85,7 +114,7 @@ class DCATSerializer(object):
 
         for f in files:
             dist_wrapper = ET.SubElement(
-                root[0], '{{{dcat}}}distribution'.format(**ns))
+                description, '{{{dcat}}}distribution'.format(**ns))
             dist = ET.SubElement(
                 dist_wrapper, '{{{dcat}}}Distribution'.format(**ns))
 
@@ -107,8 +136,27 @@ class DCATSerializer(object):
             encoding='utf-8',
         ).decode('utf-8')
 
-    def transform_with_xslt(self, pid, record, search_hit=False, **kwargs):
-        """Transform record with XSLT."""
+    def _iter_etree(self, root, pretty_print=False):
+        """Serialize an element tree in chunks of one child element."""
+        chunks = _Chunks()
+        with ET.xmlfile(chunks, encoding='utf-8') as xf:
+            xf.write_declaration()
+            with xf.element(root.tag, attrib=dict(root.attrib),
+                            nsmap=root.nsmap):
+                for child in root:
+                    xf.write(child, pretty_print=pretty_print)
+                    xf.flush()
+                    for chunk in chunks.pop():
+                        yield chunk
+        for chunk in chunks.pop():
+            yield chunk
+
+    def dump_datacite_etree(self, pid, record, search_hit=False, **kwargs):
+        """Dump the DataCite element tree of a record and its visible files.
+
+        :returns: Tuple of the DataCite resource element and the files to add
+            to the DCAT distributions (or ``None``).
+        """
         files_data = None
         if search_hit:
             dc_record = self.datacite_serializer.transform_search_hit(
@@ -130,12 +178,18 @@ class DCATSerializer(object):
         dc_etree = self.datacite_serializer.schema.dump_etree(dc_record)
         dc_namespace = self.datacite_serializer.schema.ns[None]
         dc_etree.tag = '{{{0}}}resource'.format(dc_namespace)
+        return dc_etree, files_data
+
+    def transform_with_xslt(self, pid, record, search_hit=False, **kwargs):
+        """Transform record with XSLT."""
+        dc_etree, files_data = self.dump_datacite_etree(
+            pid, record, search_hit=search_hit, **kwargs)
         dcat_etree = self.xslt_transform_func(dc_etree).getroot()
 
         # Inject files in results (since the XSLT can't do that by default)
         if files_data:
             self._add_files(
-                root=dcat_etree,
+                description=dcat_etree[0],
                 files=files_data,
                 record=(record['_source'] if search_hit else record),
             )
@@ -151,21 +205,61 @@ class DCATSerializer(object):
         return self._etree_tostring(
             self.transform_with_xslt(pid, record, **kwargs))
 
-    def serialize_search(self, pid_fetcher, search_result, **kwargs):
+    def transform_search(self, pid_fetcher, search_result,
+                         item_links_factory=None):
+        """Transform a search result with a single XSLT pass.
+
+        The DataCite resources of all the hits are collected in a single tree,
+        which is transformed into one RDF document with a description per
+        hit.
+        """
+        hits = search_result['hits']['hits']
+        collection = ET.Element('resources')
+        hits_files = []
+        for hit in hits:
+            pid = pid_fetcher(hit['_id'], hit['_source'])
+            dc_etree, files_data = self.dump_datacite_etree(
+                pid, hit, search_hit=True, links_factory=item_links_factory)
+            collection.append(dc_etree)
+            hits_files.append(files_data)
+
+        dcat_etree = self.xslt_transform_func(collection).getroot()
+
+        # Each resource is transformed into exactly one top-level description
+        descriptions = dcat_etree.findall(
+            '{{{rdf}}}Description'.format(**dcat_etree.nsmap))
+        if len(descriptions) != len(hits):
+            raise ValueError(
+                'DCAT transformation returned {0} descriptions for {1} '
+                'hits.'.format(len(descriptions), len(hits)))
+        for description, hit, files_data in \
+                zip(descriptions, hits, hits_files):
+            if files_data:
+                self._add_files(
+                    description=description, files=files_data,
+                    record=hit['_source'])
+        return dcat_etree
+
+    def serialize_search(self, pid_fetcher, search_result, links=None,
+                         item_links_factory=None, pretty_print=None,
+                         **kwargs):
         """Serialize a search result.
 
+        The search result is transformed into a single RDF document, which is
+        returned as an iterator of encoded chunks to be streamed.
+
         :param pid_fetcher: Persistent identifier fetcher.
         :param search_result: Elasticsearch search result.
         :param links: Dictionary of links to add to response.
+        :param pretty_print: Indent the output. Defaults to the
+            ``prettyprint`` request argument.
         """
-        records = []
-        for hit in search_result['hits']['hits']:
-            pid = pid_fetcher(hit['_id'], hit['_source'])
-            dcat_etree = self.transform_with_xslt(
-                pid, hit, search_hit=True, **kwargs)
-            records.append(self._etree_tostring(dcat_etree))
-
-        return '\n'.join(records)
+        if pretty_print is None:
+            pretty_print = has_request_context() and \
+                bool(request.args.get('prettyprint'))
+        dcat_etree = self.transform_search(
+            pid_fetcher, search_result, item_links_factory=item_links_factory)
+        return self._iter_etree(dcat_etree, pretty_print=pretty_print)
 
     def serialize_oaipmh(self, pid, record):
         """Serialize a single record for OAI-PMH."""
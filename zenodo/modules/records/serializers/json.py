@@ -111,6 +111,29 @@ class ZenodoJSONSerializer(JSONSerializer):
             self.transform_search_hit(pid, record)
         ).encode('utf8')  + b'\n'
 
+    def serialize_exporter_many(self, records):
+        """Serialize a batch of records for the exporter.
+
+        A single schema instance is reused for the whole batch. Its context is
+        updated in place, so that it is shared with the nested schemas.
+
+        :param records: List of ``(pid, record)`` tuples.
+        :returns: List of serialized records, with ``None`` for the records
+            which failed to serialize.
+        """
+        context = {'pid': None}
+        schema = self.schema_class(context=context)
+        results = []
+        for pid, record in records:
+            try:
+                context['pid'] = pid
+                results.append(json.dumps(
+                    schema.dump(self.preprocess_search_hit(pid, record)).data
+                ).encode('utf8') + b'\n')
+            except Exception:
+                results.append(None)
+        return results
+
     def serialize_search(self, pid_fetcher, search_result, links=None,
                          item_links_factory=None, **kwargs):
         """Serialize Zenodo search results and aggregations."""
@@ -32,12 +32,14 @@ from celery import shared_task
 from flask import current_app
 from invenio_cache import current_cache
 from invenio_db import db
-from invenio_indexer.api import RecordIndexer
-from invenio_pidstore.models import PIDStatus
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_pidstore.providers.datacite import DataCiteProvider
 from invenio_records import Record
 from lxml import etree
+from werkzeug.utils import import_string
 
+from zenodo.modules.records.api import ZenodoRecord
+from zenodo.modules.records.indexer import ZenodoRecordIndexer
 from zenodo.modules.records.models import AccessRight
 from zenodo.modules.records.serializers import datacite_v41
 from zenodo.modules.records.utils import find_registered_doi_pids, xsd41
@@ -52,11 +54,41 @@ def update_expired_embargos():
         record.commit()
     db.session.commit()
 
-    indexer = RecordIndexer()
+    indexer = ZenodoRecordIndexer()
     indexer.bulk_index(record_ids)
     indexer.process_bulk_queue()
 
 
+@shared_task(ignore_result=True)
+def warm_serialization_cache(record_uuid, formats=None):
+    """Render the export formats of a record into the serialization cache."""
+    export_formats = current_app.config['ZENODO_RECORDS_EXPORTFORMATS']
+    formats = formats or \
+        current_app.config['ZENODO_RECORDS_SERIALIZATION_CACHE_WARM_FORMATS']
+    record = ZenodoRecord.get_record(record_uuid)
+    pid = PersistentIdentifier.get('recid', str(record['recid']))
+    for fmt in formats:
+        try:
+            serializer = import_string(export_formats[fmt]['serializer'])
+            serializer.serialize(pid, record)
+        except Exception:
+            current_app.logger.exception(
+                u'Serialization cache warming failed for {0} ({1}).'.format(
+                    record_uuid, fmt))
+
+
+@shared_task(ignore_result=True)
+def process_bulk_queue(version_type=None, es_bulk_kwargs=None):
+    """Process bulk indexing queue, preparing chunks of records together.
+
+    :param str version_type: Elasticsearch version type.
+    :param dict es_bulk_kwargs: Passed to
+        :func:`elasticsearch:elasticsearch.helpers.bulk`.
+    """
+    ZenodoRecordIndexer(version_type=version_type).process_bulk_queue(
+        es_bulk_kwargs=es_bulk_kwargs)
+
+
 @shared_task(ignore_result=True, rate_limit='1000/h')
 def update_datacite_metadata(doi, object_uuid, job_id):
     """Update DataCite metadata of a single PersistentIdentifier.
@@ -31,3 +31,7 @@ ZENODO_SITEMAP_URL_SCHEME = 'https'
 
 #: Max URLs per sitemap page
 ZENODO_SITEMAP_MAX_URL_COUNT = 10000
+
+#: Record ids covered by each page of the incremental sitemap (must not be
+#: greater than ``ZENODO_SITEMAP_MAX_URL_COUNT``)
+ZENODO_SITEMAP_RECORDS_PAGE_RANGE = 10000
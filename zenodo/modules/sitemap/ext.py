@@ -26,7 +26,12 @@
 
 from __future__ import absolute_import, print_function
 
+import gzip
+import hashlib
+from datetime import datetime
+
 from invenio_cache import current_cache
+from six import BytesIO, text_type
 
 from . import config
 from .generators import generator_fns
@@ -50,20 +55,63 @@ class ZenodoSitemap(object):
         self.cache_keys = set()
 
     def set_cache(self, key, value):
-        """Set the sitemap cache."""
-        current_cache.set(key, value, timeout=-1)
+        """Set the sitemap cache.
+
+        Pages are stored gzip-compressed, along with their ETag and last
+        modification date. Pages whose content did not change are not stored
+        again, so that they keep their last modification date.
+        """
+        if isinstance(value, text_type):
+            value = value.encode('utf-8')
+        etag = hashlib.md5(value).hexdigest()
+        current = current_cache.get(key)
+        if not isinstance(current, dict) or current.get('etag') != etag:
+            current_cache.set(key, {
+                'data': self.compress(value),
+                'etag': etag,
+                'last_modified': datetime.utcnow().replace(microsecond=0),
+            }, timeout=-1)
         self.cache_keys.add(key)
 
+    @staticmethod
+    def compress(data):
+        """Gzip-compress a sitemap page."""
+        buf = BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as f:
+            f.write(data)
+        return buf.getvalue()
+
+    @staticmethod
+    def decompress(data):
+        """Decompress a gzip-compressed sitemap page."""
+        with gzip.GzipFile(fileobj=BytesIO(data), mode='rb') as f:
+            return f.read()
+
     @staticmethod
     def get_cache(key):
         """Get the sitemap cache."""
-        current_cache.get(key)
+        return current_cache.get(key)
 
-    def clear_cache(self):
-        """Clear the sitemap cache."""
-        for key in self.cache_keys:
+    def clear_cache(self, keys=None):
+        """Clear the sitemap cache.
+
+        :param keys: The cache keys to clear. By default all the currently
+            stored sitemap cache keys are cleared.
+        """
+        keys = set(self.cache_keys if keys is None else keys)
+        for key in keys:
             current_cache.delete(key)
-        self.cache_keys = set()
+        self.cache_keys -= keys
+
+    @staticmethod
+    def get_state():
+        """Get the state of the last incremental sitemap update."""
+        return current_cache.get('sitemap:state') or {}
+
+    @staticmethod
+    def set_state(state):
+        """Set the state of the last incremental sitemap update."""
+        current_cache.set('sitemap:state', state, timeout=-1)
 
     @staticmethod
     def init_config(app):
@@ -32,6 +32,9 @@ from invenio_communities.models import Community
 from invenio_db import db
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records.models import RecordMetadata
+from sqlalchemy import Integer, cast, func
+
+_PLACEHOLDER = 'zenodositemapplaceholder'
 
 
 def _sitemapdtformat(dt):
@@ -45,33 +48,90 @@ def _sitemapdtformat(dt):
     return adt.format('YYYY-MM-DDTHH:mm:ss') + 'Z'
 
 
+def url_template(endpoint, arg):
+    """Build the external URL template of an endpoint.
+
+    The URL is built only once with ``url_for``, with the ``{0}`` format
+    placeholder in the place of the ``arg`` view argument.
+    """
+    scheme = current_app.config['ZENODO_SITEMAP_URL_SCHEME']
+    url = url_for(endpoint, _external=True, _scheme=scheme,
+                  **{arg: _PLACEHOLDER})
+    return url.replace('{', '{{').replace('}', '}}').replace(
+        _PLACEHOLDER, '{0}')
+
+
+def _records_query():
+    """Query the published records."""
+    return (db.session.query(PersistentIdentifier.pid_value,
+                             RecordMetadata.updated)
+            .join(RecordMetadata,
+                  RecordMetadata.id == PersistentIdentifier.object_uuid)
+            .filter(PersistentIdentifier.status == PIDStatus.REGISTERED,
+                    PersistentIdentifier.pid_type == 'recid'))
+
+
+def _records_links(query):
+    """Generate the links of the records of a query."""
+    template = url_template('invenio_records_ui.recid', 'pid_value')
+    for pid_value, updated in query.yield_per(1000):
+        yield {
+            'loc': template.format(pid_value),
+            'lastmod': _sitemapdtformat(updated)
+        }
+
+
 def records_generator():
     """Generate the records links."""
-    q = (db.session.query(PersistentIdentifier, RecordMetadata)
+    return _records_links(_records_query())
+
+
+def records_page_generator(page, page_range):
+    """Generate the links of the records of a recid range page.
+
+    :param page: Number of the page, covering the record ids from
+        ``page * page_range`` to ``(page + 1) * page_range - 1``.
+    :param page_range: Number of record ids covered by each page.
+    """
+    recid = cast(PersistentIdentifier.pid_value, Integer)
+    start = page * page_range
+    q = (_records_query()
+         .filter(recid.between(start, start + page_range - 1))
+         .order_by(recid))
+    return _records_links(q)
+
+
+def records_pages(page_range):
+    """Get the recid range pages of the published records.
+
+    :param page_range: Number of record ids covered by each page.
+    :returns: Dictionary mapping each non-empty page to a tuple with the
+        number of records and their last modification date. The tuple
+        changes whenever a record of the page is added, modified or removed.
+    """
+    page = cast(PersistentIdentifier.pid_value, Integer) / page_range
+    q = (db.session.query(page, func.count(RecordMetadata.id),
+                          func.max(RecordMetadata.updated))
          .join(RecordMetadata,
                RecordMetadata.id == PersistentIdentifier.object_uuid)
          .filter(PersistentIdentifier.status == PIDStatus.REGISTERED,
-                 PersistentIdentifier.pid_type == 'recid'))
-
-    scheme = current_app.config['ZENODO_SITEMAP_URL_SCHEME']
-    for pid, rm in q.yield_per(1000):
-        yield {
-            'loc': url_for('invenio_records_ui.recid', pid_value=pid.pid_value,
-                           _external=True, _scheme=scheme),
-            'lastmod': _sitemapdtformat(rm.updated)
-        }
+                 PersistentIdentifier.pid_type == 'recid')
+         .group_by(page))
+    return dict((p, (count, updated)) for p, count, updated in q)
 
 
 def communities_generator():
     """Generate the communities links."""
     q = Community.query.filter(Community.deleted_at.is_(None))
-    scheme = current_app.config['ZENODO_SITEMAP_URL_SCHEME']
+    templates = [
+        url_template('invenio_communities.{}'.format(endpoint),
+                     'community_id')
+        for endpoint in ('detail', 'search', 'about')
+    ]
     for comm in q.yield_per(1000):
-        for endpoint in 'detail', 'search', 'about':
+        for template in templates:
             yield {
-                'loc': url_for('invenio_communities.{}'.format(endpoint),
-                               community_id=comm.id, _external=True,
-                               _scheme=scheme),
+                'loc': template.format(comm.id),
                 'lastmod': _sitemapdtformat(comm.updated)
             }
 
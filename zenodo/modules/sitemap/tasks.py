@@ -31,6 +31,28 @@ import itertools
 from celery import shared_task
 from flask import current_app, render_template, url_for
 
+from .generators import _sitemapdtformat, communities_generator, \
+    records_page_generator, records_pages
+
+
+def _set_index_page(sitemap, pages):
+    """Render and store the sitemap index.
+
+    :param pages: Iterable of ``(page number, last modification)`` tuples.
+    """
+    url_scheme = current_app.config['ZENODO_SITEMAP_URL_SCHEME']
+    urlset = [
+        {
+            'loc': url_for('zenodo_sitemap.sitemappage',
+                           page=pn, _external=True,
+                           _scheme=url_scheme),
+            'lastmod': _sitemapdtformat(lastmod) if lastmod else None,
+        } for pn, lastmod in pages]
+
+    index_page = render_template('zenodo_sitemap/sitemapindex.xml',
+        urlset=urlset, url_scheme=url_scheme)
+    sitemap.set_cache('sitemap:0', index_page)
+
 
 @shared_task(ignore_results=True)
 def update_sitemap_cache(urls=None, max_url_count=None):
@@ -45,11 +67,11 @@ def update_sitemap_cache(urls=None, max_url_count=None):
         sitemap = current_app.extensions['zenodo-sitemap']
         urls = iter(urls or sitemap._generate_all_urls())
 
-        url_scheme = current_app.config['ZENODO_SITEMAP_URL_SCHEME']
-
+        # Pages are overwritten in place, and the ones of the previous
+        # sitemap are removed only once the new sitemap index is stored.
+        previous_keys = set(sitemap.cache_keys)
         urls_slice = list(itertools.islice(urls, max_url_count))
         page_n = 0
-        sitemap.clear_cache()
         while urls_slice:
             page_n += 1
             page = render_template('zenodo_sitemap/sitemap.xml',
@@ -57,13 +79,63 @@ def update_sitemap_cache(urls=None, max_url_count=None):
             sitemap.set_cache('sitemap:' + str(page_n), page)
             urls_slice = list(itertools.islice(urls, max_url_count))
 
-        urlset = [
-            {
-                'loc': url_for('zenodo_sitemap.sitemappage',
-                               page=pn, _external=True,
-                               _scheme=url_scheme)
-            } for pn in range(1, page_n+1)]
+        _set_index_page(sitemap, ((pn, None) for pn in range(1, page_n+1)))
+        sitemap.clear_cache(previous_keys - set(
+            'sitemap:' + str(pn) for pn in range(page_n+1)))
+        # Pages were renumbered, so the next incremental update has to
+        # regenerate all of them (and remove the ones it doesn't produce).
+        sitemap.set_state({'pages': list(range(1, page_n+1))})
+
+
+@shared_task(ignore_results=True)
+def update_sitemap_cache_incremental():
+    """Update only the changed pages of the Sitemap cache.
+
+    Record pages cover fixed ranges of record ids, so a page is regenerated
+    only when one of its records was added, modified or removed since the
+    last update. The (few) communities pages follow the records pages and
+    are always regenerated.
+    """
+    siteurl = current_app.config['THEME_SITEURL']
+    with current_app.test_request_context(base_url=siteurl):
+        max_url_count = current_app.config['ZENODO_SITEMAP_MAX_URL_COUNT']
+        page_range = current_app.config['ZENODO_SITEMAP_RECORDS_PAGE_RANGE']
+        sitemap = current_app.extensions['zenodo-sitemap']
+
+        state = sitemap.get_state()
+        previous = state.get('records', {}) \
+            if state.get('page_range') == page_range else {}
+
+        records = records_pages(page_range)
+        pages = []
+        for page, (count, lastmod) in sorted(records.items()):
+            if previous.get(page) != (count, lastmod):
+                sitemap.set_cache(
+                    'sitemap:' + str(page + 1),
+                    render_template(
+                        'zenodo_sitemap/sitemap.xml',
+                        urlset=records_page_generator(page, page_range)))
+            pages.append((page + 1, lastmod))
+
+        urls = communities_generator()
+        urls_slice = list(itertools.islice(urls, max_url_count))
+        page_n = pages[-1][0] if pages else 0
+        while urls_slice:
+            page_n += 1
+            sitemap.set_cache(
+                'sitemap:' + str(page_n),
+                render_template('zenodo_sitemap/sitemap.xml',
+                                urlset=urls_slice))
+            pages.append((page_n, None))
+            urls_slice = list(itertools.islice(urls, max_url_count))
 
-        index_page = render_template('zenodo_sitemap/sitemapindex.xml',
-            urlset=urlset, url_scheme=url_scheme)
-        sitemap.set_cache('sitemap:0', index_page)
+        _set_index_page(sitemap, pages)
+        page_numbers = [pn for pn, _ in pages]
+        sitemap.clear_cache(
+            'sitemap:' + str(pn) for pn in
+            set(state.get('pages', [])) - set(page_numbers))
+        sitemap.set_state({
+            'page_range': page_range,
+            'records': records,
+            'pages': page_numbers,
+        })
@@ -26,7 +26,7 @@
 
 from __future__ import absolute_import, print_function, unicode_literals
 
-from flask import Blueprint, abort, current_app
+from flask import Blueprint, abort, current_app, request
 from invenio_cache import current_cache
 
 blueprint = Blueprint(
@@ -38,11 +38,31 @@ blueprint = Blueprint(
 )
 
 def _get_cached_or_404(page):
-    data =  current_cache.get('sitemap:' + str(page))
-    if data:
-        return current_app.response_class(data, mimetype='text/xml')
-    else:
+    """Serve a stored sitemap page.
+
+    The page is served as stored (gzip-compressed) to the clients accepting
+    it, and conditional requests are answered with "304 Not Modified".
+    """
+    entry = current_cache.get('sitemap:' + str(page))
+    if not entry:
         abort(404)
+    if not isinstance(entry, dict):
+        # Uncompressed page stored before the pages were compressed
+        return current_app.response_class(entry, mimetype='text/xml')
+
+    data = entry['data']
+    if request.accept_encodings['gzip']:
+        response = current_app.response_class(data, mimetype='text/xml')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        sitemap = current_app.extensions['zenodo-sitemap']
+        response = current_app.response_class(
+            sitemap.decompress(data), mimetype='text/xml')
+    response.vary.add('Accept-Encoding')
+    # The ETag is the same for both encodings of the page, hence weak
+    response.set_etag(entry['etag'], weak=True)
+    response.last_modified = entry['last_modified']
+    return response.make_conditional(request)
 
 @blueprint.route('/sitemap.xml', methods=['GET', ])
 def sitemapindex():
@@ -90,6 +90,9 @@ ZENODO_SPAM_CHECK_TIMEOUT = 8
 # Number of valid existing records and communities to skip the spam check
 ZENODO_SPAM_SKIP_CHECK_NUM = 5
 
+ZENODO_SPAM_SAFELIST_CACHE_TIMEOUT = 60 * 60
+"""Cache timeout of a version of the safelisted users set (in seconds)."""
+
 # Preload spam model on Celery app initialization
 ZENODO_SPAM_MODEL_PRELOAD = False
 
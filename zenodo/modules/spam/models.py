@@ -25,11 +25,21 @@
 """Spam models."""
 
 from datetime import datetime
+from uuid import uuid4
 
+from flask import current_app, has_app_context
 from invenio_accounts.models import User
+from invenio_cache import current_cache
 from invenio_db import db
+from sqlalchemy import event
 from sqlalchemy.dialects import mysql
 
+SAFELIST_VERSION_KEY = 'zenodo:safelist:version'
+"""Cache key of the current version of the safelisted users set."""
+
+_safelist_cache = {}
+"""In-process copy of the safelisted users set and its version."""
+
 
 class SafelistEntry(db.Model):
     """Defines a message to show to users."""
@@ -89,10 +99,70 @@ class SafelistEntry(db.Model):
         except Exception:
             pass
 
+    @classmethod
+    def _cache_version(cls):
+        """Get the current version of the cached safelist."""
+        version = current_cache.get(SAFELIST_VERSION_KEY)
+        if version is None:
+            current_cache.add(SAFELIST_VERSION_KEY, uuid4().hex, timeout=0)
+            version = current_cache.get(SAFELIST_VERSION_KEY)
+        return version
+
+    @classmethod
+    def get_safelist(cls):
+        """Get the set of the safelisted user ids.
+
+        The set is kept in process and in the cache under the current
+        safelist version, so that it is loaded from the database only once
+        per version, i.e. after every change of the safelist.
+        """
+        version = cls._cache_version()
+        if version is not None and _safelist_cache.get('version') == version:
+            return _safelist_cache['user_ids']
+
+        key = 'zenodo:safelist:{}'.format(version)
+        user_ids = current_cache.get(key) if version is not None else None
+        if user_ids is None:
+            user_ids = frozenset(
+                user_id for user_id, in db.session.query(cls.user_id))
+            if version is not None:
+                current_cache.set(
+                    key, user_ids,
+                    timeout=current_app.config[
+                        'ZENODO_SPAM_SAFELIST_CACHE_TIMEOUT'])
+        _safelist_cache.update(version=version, user_ids=user_ids)
+        return user_ids
+
+    @classmethod
+    def invalidate_cache(cls):
+        """Invalidate the cached safelist.
+
+        Must be called after committing any change to the safelist entries.
+        """
+        _safelist_cache.clear()
+        current_cache.set(SAFELIST_VERSION_KEY, uuid4().hex, timeout=0)
+
+    @classmethod
+    def get_users_status(cls, user_ids):
+        """Get the safelist status of the given users."""
+        safelist = cls.get_safelist()
+        return {user_id: user_id in safelist for user_id in user_ids}
+
+    @classmethod
+    def get_safelisted_user_ids(cls, user_ids):
+        """Get the ids of the safelisted users among the given ones."""
+        return set(user_ids) & cls.get_safelist()
+
     @classmethod
     def get_record_status(cls, record):
-        """Get entry by user_id."""
-        for owner_id in record.get("owners", []):
-            if cls.get_by_user_id(owner_id):
-                return True
-        return False
+        """Get the safelist status of a record from its owners."""
+        safelist = cls.get_safelist()
+        return any(
+            owner_id in safelist for owner_id in record.get("owners", []))
+
+
+@event.listens_for(SafelistEntry.__table__, 'after_create')
+def _invalidate_safelist_on_create(target, connection, **kwargs):
+    """Invalidate the cached safelist when its table is (re)created."""
+    if has_app_context():
+        SafelistEntry.invalidate_cache()
@@ -45,9 +45,7 @@ from zenodo.modules.spam.tasks import check_metadata_for_spam
 
 def is_user_safelisted(user):
     """Check if user is safelisted."""
-    if not SafelistEntry.query.get(user.id):
-        return False
-    return True
+    return user.id in SafelistEntry.get_safelist()
 
 
 def send_spam_user_email(recipient, deposit=None, community=None):
@@ -114,6 +114,7 @@ def delete(user_id):
             current_accounts.datastore.deactivate_user(user)
             SafelistEntry.remove_by_user_id(user.id)
             db.session.commit()
+            SafelistEntry.invalidate_cache()
         # delete_record function commits the session internally
         # for each deleted record
         if deleteform.remove_all_records.data:
@@ -325,6 +326,7 @@ def safelist_add_remove(user_id):
         SafelistEntry.remove_by_user_id(user.id)
         flash("Removed from safelist", category='warning')
     db.session.commit()
+    SafelistEntry.invalidate_cache()
 
     reindex_user_records.delay(user_id)
     return redirect(request.form['next'])
@@ -350,6 +352,7 @@ def safelist_bulk_add():
         except Exception:
             pass
     db.session.commit()
+    SafelistEntry.invalidate_cache()
 
     for user_id in user_ids:
         reindex_user_records.delay(user_id)
@@ -24,25 +24,18 @@
 
 """Zenodo statistics CLI commands."""
 
-import csv
 import glob
-import re
-import sys
-from datetime import datetime as dt
+from functools import partial
+from multiprocessing import Pool
 
 import click
 from dateutil.parser import parse as dateutil_parse
 from flask.cli import with_appcontext
 from invenio_stats.cli import stats
-from invenio_stats.proxies import current_stats
-from six.moves import filter, map
-from six.moves.urllib.parse import urlparse
 
+from zenodo.modules.stats.importer import EVENT_TYPES, import_events_file, \
+    init_import_worker
 from zenodo.modules.stats.tasks import update_record_statistics
-from zenodo.modules.stats.utils import chunkify, \
-    extract_event_record_metadata, fetch_record, fetch_record_file
-
-PY3 = sys.version_info[0] == 3
 
 
 def _verify_date(ctx, param, value):
@@ -51,76 +44,20 @@ def _verify_date(ctx, param, value):
         return value
 
 
-def parse_record_url(url):
-    """Parses a recid and filename from a record-like URL."""
-    record_url = urlparse(url)
-    assert record_url.hostname.lower().endswith('zenodo.org'), 'non-Zenodo url'
-    match = re.match(
-        # matches "/record/(123)", "/record/(123)/export", etc
-        r'^\/record\/(?P<recid>\d+)'
-        # matches "/record/(123)/files/(some.pdf)"
-        r'(?:\/files\/(?P<filename>.+)$)?',
-        record_url.path).groupdict()
-    return match.get('recid'), match.get('filename')
-
-
-def build_common_event(record, data):
-    """Build common fields of a stats event from a record and request data."""
-    return dict(
-        timestamp=dt.utcfromtimestamp(float(data['timestamp'])).isoformat(),
-        pid_type='recid',
-        pid_value=str(record.get('recid')),
-        referrer=data['referrer'],
-        ip_address=data['ipAddress'],
-        user_agent=data['userAgent'],
-        user_id=None,
-        **extract_event_record_metadata(record)
-    )
-
-
-def build_record_view_event(data):
-    """Build a 'record-view' event from request data."""
-    try:
-        recid, _ = parse_record_url(data['url'])
-        assert recid, 'no recid in url'
-        _, record = fetch_record(recid)
-    except Exception:
-        return
-
-    return build_common_event(record, data)
-
-
-def build_file_download_event(data):
-    """Build a 'file-download' event from request data."""
-    try:
-        recid, filename = parse_record_url(data['url'])
-        assert recid and filename, 'no recid and filename in url'
-        _, record = fetch_record(recid)
-        obj = fetch_record_file(recid, filename)
-    except Exception:
-        return
-
-    return dict(
-        bucket_id=str(obj.bucket_id),
-        file_id=str(obj.file_id),
-        file_key=obj.key,
-        size=obj.file.size,
-        **build_common_event(record, data)
-    )
-
-
-EVENT_TYPE_BUILDERS = {
-    'record-view': build_record_view_event,
-    'file-download': build_file_download_event,
-}
-
-
 @stats.command('import')
-@click.argument('event-type', type=click.Choice(EVENT_TYPE_BUILDERS.keys()))
+@click.argument('event-type', type=click.Choice(EVENT_TYPES))
 @click.argument('csv-dir', type=click.Path(file_okay=False, resolve_path=True))
-@click.option('--chunk-size', '-s', type=int, default=100)
+@click.option('--chunk-size', '-s', type=int, default=100,
+              help='Number of events published together to the queue.')
+@click.option('--batch-size', '-b', type=int, default=10000,
+              help='Number of CSV rows processed together.')
+@click.option('--workers', '-w', type=int, default=1,
+              help='Number of processes importing CSV files in parallel.')
+@click.option('--direct', is_flag=True,
+              help='Index the events directly, bypassing the events queue.')
 @with_appcontext
-def import_events(event_type, csv_dir, chunk_size):
+def import_events(event_type, csv_dir, chunk_size, batch_size, workers,
+                  direct):
     r"""Import stats events from a directory of CSV files.
 
     Available event types: "file-download", "record-view"
@@ -135,17 +72,33 @@ def import_events(event_type, csv_dir, chunk_size):
     - referrer ("Google", "example.com", etc)
     """
     csv_files = glob.glob(csv_dir + '/*.csv')
-    with click.progressbar(csv_files, len(csv_files)) as csv_files_bar:
-        for csv_path in csv_files_bar:
-            with open(csv_path, 'r' if PY3 else 'rb') as fp:
-                reader = csv.DictReader(fp, delimiter=',')
-                events = filter(
-                    None, map(EVENT_TYPE_BUILDERS[event_type], reader))
-                for event_chunk in chunkify(events, chunk_size):
-                    current_stats.publish(event_type, event_chunk)
-    click.secho(
-        'Run the "invenio_stats.tasks.process_events" to index the events...',
-        fg='yellow')
+    import_file = partial(import_events_file, event_type,
+                          batch_size=batch_size, chunk_size=chunk_size,
+                          direct=direct)
+    pool = Pool(workers, initializer=init_import_worker) \
+        if workers > 1 else None
+    try:
+        results = pool.imap_unordered(import_file, csv_files) if pool \
+            else (import_file(csv_path) for csv_path in csv_files)
+        read = imported = failed = 0
+        with click.progressbar(results, len(csv_files)) as results_bar:
+            for file_read, file_imported, file_failed in results_bar:
+                read += file_read
+                imported += file_imported
+                failed += file_failed
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    click.secho('Imported {0} events from {1} rows.'.format(imported, read),
+                fg='green')
+    if failed:
+        click.secho('Failed to index {0} events.'.format(failed), fg='red')
+    if not direct:
+        click.secho(
+            'Run the "invenio_stats.tasks.process_events" to index the '
+            'events...', fg='yellow')
 
 
 @stats.command('update-records')
@@ -28,7 +28,10 @@ ZENODO_STATS_PIWIK_EXPORTER = {
     'id_site': 1,
     'url': 'https://analytics.openaire.eu/piwik.php',
     'token_auth': 'api-token',
-    'chunk_size': 50  # [max piwik payload size = 64k] / [max querystring size = 750]
+    'chunk_size': 50,  # [max piwik payload size = 64k] / [max querystring size = 750]
+    'workers': 4,  # concurrent export requests
+    'timeout': 60,
+    'records_cache_size': 10000,
 }
 
 ZENODO_STATS_PIWIK_EXPORT_ENABLED = True
@@ -25,24 +25,57 @@
 """Zenodo stats exporters."""
 
 import json
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
 import requests
 from dateutil.parser import parse as dateutil_parse
 from elasticsearch_dsl import Search
 from flask import current_app
 from invenio_cache import current_cache
-from invenio_pidstore.errors import PIDDeletedError
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
 from invenio_search import current_search_client
 from invenio_search.utils import build_alias_name
+from requests.adapters import HTTPAdapter
 from six.moves.urllib.parse import urlencode, urlsplit, urlunsplit
 
 from zenodo.modules.records.serializers.schemas.common import ui_link_for
 from zenodo.modules.stats.errors import PiwikExportRequestError
-from zenodo.modules.stats.utils import chunkify, fetch_record
+from zenodo.modules.stats.utils import chunkify
+
+
+def _send_request(session, url, payload, timeout):
+    """Send an export request, returning its status code and content."""
+    res = session.post(url, json=payload, timeout=timeout)
+    return res.status_code, res.json() if res.ok else None
 
 
 class PiwikExporter:
-    """Events exporter."""
+    """Events exporter.
+
+    The export runs as a pipeline: the scanned events are split in chunks,
+    the records of each chunk are fetched with a single query, and the chunks
+    are sent by a bounded pool of concurrent HTTP senders sharing their
+    connections. The responses are handled in the order of the chunks, so
+    the bookmark only advances once all the earlier chunks were acknowledged.
+
+    Once a chunk fails, no other chunk is sent, but the ones already in
+    flight (at most ``workers``) can't be recalled. Since the bookmark can't
+    advance past the failed chunk, they are sent again by the next run, i.e.
+    a failure duplicates the events of at most ``workers`` chunks instead of
+    losing the ones of the failed chunk.
+    """
+
+    def __init__(self):
+        """Initialize the exporter."""
+        self.records = {}
+
+    @property
+    def config(self):
+        """Exporter configuration."""
+        return current_app.config['ZENODO_STATS_PIWIK_EXPORTER']
 
     def run(self, start_date=None, end_date=None, update_bookmark=True):
         """Run export job."""
@@ -69,67 +102,144 @@ class PiwikExporter:
             {'timestamp': {'order': 'asc'}}
         ).params(preserve_order=True).scan()
 
-        url = current_app.config['ZENODO_STATS_PIWIK_EXPORTER'].get('url', None)
-        token_auth = current_app.config['ZENODO_STATS_PIWIK_EXPORTER'] \
-            .get('token_auth', None)
-        chunk_size = current_app.config['ZENODO_STATS_PIWIK_EXPORTER']\
-            .get('chunk_size', 0)
-
-        for event_chunk in chunkify(events, chunk_size):
-            query_strings = []
-            for event in event_chunk:
-                if 'recid' not in event:
-                    continue
-                try:
-                    query_string = self._build_query_string(event)
-                    query_strings.append(query_string)
-                except PIDDeletedError:
-                    pass
-
-            # Check and bail if the bookmark has progressed, e.g. from another
-            # duplicate task or manual run of the exporter.
-            bookmark = current_cache.get('piwik_export:bookmark')
-            if event_chunk[-1].timestamp < bookmark:
-                return
+        url = self.config.get('url', None)
+        token_auth = self.config.get('token_auth', None)
+        chunk_size = self.config.get('chunk_size', 0)
+        workers = self.config.get('workers', 1)
+        timeout = self.config.get('timeout', 60)
 
-            payload = {
-                'requests': query_strings,
-                'token_auth': token_auth
-            }
-            res = requests.post(url, json=payload, timeout=60)
-
-            # Failure: not 200 or not "success"
-            content = res.json() if res.ok else None
-            if res.status_code == 200 and content.get('status') == 'success':
-                if content.get('invalid') != 0:
-                    msg = 'Invalid events in Piwik export request.'
-                    info = {
-                        'begin_event_timestamp': event_chunk[0].timestamp,
-                        'end_event_timestamp': event_chunk[-1].timestamp,
-                        'invalid_events': content.get('invalid')
-                    }
-                    current_app.logger.warning(msg, extra=info)
-                elif update_bookmark is True:
-                    current_cache.set('piwik_export:bookmark',
-                                      event_chunk[-1].timestamp,
-                                      timeout=-1)
-            else:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        pool = ThreadPool(workers)
+        pending = deque()
+        try:
+            for event_chunk in chunkify(events, chunk_size):
+                query_strings = self._build_query_strings(event_chunk)
+
+                # Check and bail if the bookmark has progressed, e.g. from
+                # another duplicate task or manual run of the exporter.
+                bookmark = current_cache.get('piwik_export:bookmark')
+                if bookmark and event_chunk[-1].timestamp < bookmark:
+                    break
+
+                payload = {
+                    'requests': query_strings,
+                    'token_auth': token_auth
+                }
+                result = pool.apply_async(
+                    _send_request, (session, url, payload, timeout))
+                pending.append((event_chunk[0].timestamp,
+                                event_chunk[-1].timestamp, result))
+
+                # Handle the finished requests, and wait for the oldest one
+                # when too many are in flight.
+                while pending and (
+                        len(pending) > workers or pending[0][2].ready()):
+                    self._handle_response(
+                        *pending.popleft(), update_bookmark=update_bookmark)
+
+            while pending:
+                self._handle_response(
+                    *pending.popleft(), update_bookmark=update_bookmark)
+        except Exception:
+            # Wait for the requests in flight, which are sent again by the
+            # next run.
+            for begin, end, result in pending:
+                result.wait()
+            if pending:
+                current_app.logger.warning(
+                    'Piwik export stopped with %d chunks already sent, from '
+                    '%s to %s.', len(pending), pending[0][0], pending[-1][1])
+            raise
+        finally:
+            pool.close()
+            pool.join()
+            session.close()
+
+    def _handle_response(self, begin, end, result, update_bookmark=True):
+        """Handle the response of the export request of a chunk."""
+        status_code, content = result.get()
+
+        # Failure: not 200 or not "success"
+        if status_code == 200 and content.get('status') == 'success':
+            if content.get('invalid') != 0:
                 msg = 'Invalid events in Piwik export request.'
                 info = {
-                    'begin_event_timestamp': event_chunk[0].timestamp,
-                    'end_event_timestamp': event_chunk[-1].timestamp,
+                    'begin_event_timestamp': begin,
+                    'end_event_timestamp': end,
+                    'invalid_events': content.get('invalid')
+                }
+                current_app.logger.warning(msg, extra=info)
+            elif update_bookmark is True:
+                # Never move the bookmark backwards
+                bookmark = current_cache.get('piwik_export:bookmark')
+                if not bookmark or end > bookmark:
+                    current_cache.set('piwik_export:bookmark', end,
+                                      timeout=-1)
+        else:
+            msg = 'Invalid events in Piwik export request.'
+            info = {
+                'begin_event_timestamp': begin,
+                'end_event_timestamp': end,
+            }
+            raise PiwikExportRequestError(msg, export_info=info)
+
+    def _fetch_records(self, recids):
+        """Fetch the metadata needed for the export of many records.
+
+        The records missing from the exporter's cache are fetched with a
+        single query. Removed records are cached as ``None``.
+        """
+        records = dict(
+            (recid, self.records[recid])
+            for recid in recids if recid in self.records)
+        missing = [recid for recid in recids if recid not in records]
+        if missing:
+            q = db.session.query(
+                PersistentIdentifier.pid_value, RecordMetadata.json
+            ).join(
+                RecordMetadata,
+                RecordMetadata.id == PersistentIdentifier.object_uuid
+            ).filter(
+                PersistentIdentifier.pid_type == 'recid',
+                PersistentIdentifier.status == PIDStatus.REGISTERED,
+                PersistentIdentifier.pid_value.in_(missing),
+            )
+            for recid in missing:
+                records[recid] = None
+            for recid, data in q:
+                records[recid] = {
+                    'title': data.get('title'),
+                    'oai': data.get('_oai', {}).get('id'),
                 }
-                raise PiwikExportRequestError(msg, export_info=info)
 
-    def _build_query_string(self, event):
-        id_site = current_app.config['ZENODO_STATS_PIWIK_EXPORTER']\
-            .get('id_site', None)
+            if len(self.records) + len(missing) > \
+                    self.config.get('records_cache_size', 0):
+                self.records.clear()
+            self.records.update((recid, records[recid]) for recid in missing)
+        return records
+
+    def _build_query_strings(self, event_chunk):
+        """Build the query strings of the record events of a chunk."""
+        events = [event for event in event_chunk if 'recid' in event]
+        records = self._fetch_records(
+            set(str(event.recid) for event in events))
+        query_strings = []
+        for event in events:
+            record = records[str(event.recid)]
+            # Events of removed records are not exported
+            if record is not None:
+                query_strings.append(self._build_query_string(event, record))
+        return query_strings
+
+    def _build_query_string(self, event, record):
+        id_site = self.config.get('id_site', None)
         url = ui_link_for('record_html', id=event.recid)
         visitor_id = event.visitor_id[0:16]
-        _, record = fetch_record(event.recid)
-        oai = record.get('_oai', {}).get('id')
-        cvar = json.dumps({'1': ['oaipmhID', oai]})
-        action_name = record.get('title')[:150]  # max 150 characters
+        cvar = json.dumps({'1': ['oaipmhID', record['oai']]})
+        action_name = record['title'][:150]  # max 150 characters
         urlref = None
         if event.referrer:
             try:
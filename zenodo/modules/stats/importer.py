@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Zenodo.
+# Copyright (C) 2018 CERN.
+#
+# Zenodo is free software; you can redistribute it
+# and/or modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Zenodo is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Zenodo; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+# MA 02111-1307, USA.
+#
+# In applying this license, CERN does not
+# waive the privileges and immunities granted to it by virtue of its status
+# as an Intergovernmental Organization or submit itself to any jurisdiction.
+
+"""Bulk import of statistics events."""
+
+from __future__ import absolute_import, print_function
+
+import csv
+import re
+import sys
+from datetime import datetime as dt
+
+from elasticsearch.helpers import bulk
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
+from invenio_stats.proxies import current_stats
+
+from zenodo.modules.records.api import ZenodoRecord
+from zenodo.modules.stats.utils import chunkify, extract_event_record_metadata
+
+PY3 = sys.version_info[0] == 3
+
+RECORD_URL_RE = re.compile(
+    r'^[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^/?#@]*@)?(?P<host>[^/?#:]*)(?::\d*)?'
+    # matches "/record/(123)", "/record/(123)/export", etc
+    r'/record/(?P<recid>\d+)'
+    # matches "/record/(123)/files/(some.pdf)"
+    r'(?:/files/(?P<filename>[^?#]+))?'
+)
+
+EVENT_TYPES = ('record-view', 'file-download')
+
+
+def parse_record_urls(urls):
+    """Parse the recids and filenames of many record-like URLs at once.
+
+    :returns: List of ``(recid, filename)`` tuples, with ``(None, None)``
+        for the URLs which are not Zenodo record URLs.
+    """
+    matches = map(RECORD_URL_RE.match, (url or '' for url in urls))
+    return [
+        (m.group('recid'), m.group('filename'))
+        if m and m.group('host').lower().endswith('zenodo.org')
+        else (None, None)
+        for m in matches
+    ]
+
+
+def fetch_records(recids):
+    """Fetch the published records of many recids with a single query.
+
+    :returns: Dictionary mapping each recid to a ``(record id, record)``
+        tuple. Removed and unknown records are omitted.
+    """
+    if not recids:
+        return {}
+    q = db.session.query(
+        PersistentIdentifier.pid_value, RecordMetadata.id, RecordMetadata.json
+    ).join(
+        RecordMetadata, RecordMetadata.id == PersistentIdentifier.object_uuid
+    ).filter(
+        PersistentIdentifier.pid_type == 'recid',
+        PersistentIdentifier.status == PIDStatus.REGISTERED,
+        PersistentIdentifier.pid_value.in_(list(recids)),
+    )
+    return dict(
+        (recid, (record_id, ZenodoRecord(data)))
+        for recid, record_id, data in q)
+
+
+def build_common_event(record, data, record_id=None):
+    """Build common fields of a stats event from a record and request data."""
+    return dict(
+        timestamp=dt.utcfromtimestamp(float(data['timestamp'])).isoformat(),
+        pid_type='recid',
+        pid_value=str(record.get('recid')),
+        referrer=data['referrer'],
+        ip_address=data['ipAddress'],
+        user_agent=data['userAgent'],
+        user_id=None,
+        **extract_event_record_metadata(record, record_id=record_id)
+    )
+
+
+def build_events(event_type, rows):
+    """Build the events of a batch of request data rows.
+
+    The recids of all the rows are parsed in one pass, and the records they
+    refer to are fetched with a single query. The files are resolved from
+    the records' metadata.
+    """
+    rows = list(rows)
+    parsed = parse_record_urls(row.get('url') for row in rows)
+    records = fetch_records(set(recid for recid, _ in parsed if recid))
+
+    files = {}
+    events = []
+    for data, (recid, filename) in zip(rows, parsed):
+        if recid not in records:
+            continue
+        record_id, record = records[recid]
+        if event_type == 'file-download':
+            if recid not in files:
+                files[recid] = dict(
+                    (f['key'], f) for f in record.get('_files', []))
+            obj = files[recid].get(filename)
+            if obj is None:
+                continue
+            events.append(dict(
+                bucket_id=str(obj['bucket']),
+                file_id=str(obj['file_id']),
+                file_key=obj['key'],
+                size=obj['size'],
+                **build_common_event(record, data, record_id=record_id)
+            ))
+        else:
+            events.append(
+                build_common_event(record, data, record_id=record_id))
+    return events
+
+
+class _EventsQueue(object):
+    """Queue-like source of already built events for an events indexer."""
+
+    def __init__(self, routing_key, events):
+        """Initialize the events source."""
+        self.routing_key = routing_key
+        self.events = events
+
+    def consume(self):
+        """Iterate over the events."""
+        return iter(self.events)
+
+
+def index_events(event_type, events, chunk_size=500):
+    """Index events directly, bypassing the events queue.
+
+    The events go through the same preprocessing (robots flagging,
+    anonymization, double-click deduplication) as the queued ones.
+
+    :returns: Tuple with the number of indexed and failed events.
+    """
+    event = current_stats.events[event_type]
+    params = dict(event.params,
+                  queue=_EventsQueue(event.queue.routing_key, events))
+    indexer = event.cls(**params)
+    return bulk(indexer.client, indexer.actionsiter(), stats_only=True,
+                chunk_size=chunk_size, raise_on_error=False)
+
+
+def import_events_file(event_type, csv_path, batch_size=10000,
+                       chunk_size=100, direct=False):
+    """Import the stats events of a CSV file.
+
+    :param batch_size: Number of CSV rows processed together.
+    :param chunk_size: Number of events published together to the events
+        queue.
+    :param direct: Index the events directly instead of publishing them to
+        the events queue.
+    :returns: Tuple with the number of read rows, imported events and events
+        which failed to be indexed (only with ``direct``).
+    """
+    read = imported = failed = 0
+    with open(csv_path, 'r' if PY3 else 'rb') as fp:
+        reader = csv.DictReader(fp, delimiter=',')
+        for rows in chunkify(reader, batch_size):
+            events = build_events(event_type, rows)
+            if direct:
+                success, errors = index_events(event_type, events)
+                imported += success
+                failed += errors
+            else:
+                for event_chunk in chunkify(events, chunk_size):
+                    current_stats.publish(event_type, list(event_chunk))
+                imported += len(events)
+            read += len(rows)
+    return read, imported, failed
+
+
+def init_import_worker():
+    """Initialize a bulk import worker process with its own application."""
+    from zenodo.factory import create_app
+    create_app().app_context().push()
@@ -30,12 +30,10 @@ from celery import shared_task
 from dateutil.parser import parse as dateutil_parse
 from elasticsearch_dsl import Index, Search
 from flask import current_app
-from invenio_indexer.api import RecordIndexer
-from invenio_pidrelations.contrib.versioning import PIDVersioning
-from invenio_pidstore.models import PersistentIdentifier
 from invenio_stats import current_stats
 
 from zenodo.modules.stats.exporters import PiwikExporter
+from zenodo.modules.stats.utils import update_records_stats
 
 
 @shared_task(ignore_result=True)
@@ -90,12 +88,11 @@ def update_record_statistics(start_date=None, end_date=None):
         ).source(include='conceptrecid')
         conceptrecids |= {b.conceptrecid for b in query.scan()}
 
-    indexer = RecordIndexer()
-    for concpetrecid_val in conceptrecids:
-        conceptrecid = PersistentIdentifier.get('recid', concpetrecid_val)
-        pv = PIDVersioning(parent=conceptrecid)
-        children_recids = pv.children.all()
-        indexer.bulk_index([str(p.object_uuid) for p in children_recids])
+    # Only update the "_stats" of the affected records, instead of reindexing
+    updated, reindexed = update_records_stats(sorted(conceptrecids))
+    current_app.logger.info(
+        'Updated statistics of %d records (%d sent for reindexing).',
+        updated, reindexed)
 
 
 @shared_task(ignore_result=True, max_retries=3, default_retry_delay=60 * 60)
@@ -27,11 +27,19 @@
 import itertools
 
 from elasticsearch.exceptions import NotFoundError
-from flask import request
+from elasticsearch.helpers import streaming_bulk
+from elasticsearch_dsl import MultiSearch, Search
+from flask import current_app, request
+from invenio_db import db
+from invenio_indexer.api import RecordIndexer
+from invenio_pidrelations.models import PIDRelation
+from invenio_pidrelations.utils import resolve_relation_type_config
+from invenio_pidstore.models import PersistentIdentifier
 from invenio_search.api import RecordsSearch
 from invenio_search.proxies import current_search_client
 from invenio_search.utils import build_alias_name
 from invenio_stats import current_stats
+from sqlalchemy.orm import aliased
 
 from zenodo.modules.records.resolvers import record_resolver
 
@@ -51,10 +59,10 @@ def get_record_from_context(**kwargs):
             return request.current_file_record
 
 
-def extract_event_record_metadata(record):
+def extract_event_record_metadata(record, record_id=None):
     """Extract from a record the payload needed for a statistics event."""
     return dict(
-        record_id=str(record.id),
+        record_id=str(record_id or record.id),
         recid=str(record['recid']) if record.get('recid') else None,
         conceptrecid=record.get('conceptrecid'),
         doi=record.get('doi'),
@@ -66,53 +74,210 @@ def extract_event_record_metadata(record):
     )
 
 
-def build_record_stats(recid, conceptrecid):
-    """Build the record's stats."""
-    stats = {}
-    stats_sources = {
-        'record-view': {
-            'params': {'recid': recid},
-            'fields': {
-                'views': 'count',
-                'unique_views': 'unique_count',
-            },
+RECORD_STATS_SOURCES = {
+    'record-view': {
+        'param': 'recid',
+        'fields': {
+            'views': 'count',
+            'unique_views': 'unique_count',
         },
-        'record-download': {
-            'params': {'recid': recid},
-            'fields': {
-                'downloads': 'count',
-                'unique_downloads': 'unique_count',
-                'volume': 'volume',
-            },
+    },
+    'record-download': {
+        'param': 'recid',
+        'fields': {
+            'downloads': 'count',
+            'unique_downloads': 'unique_count',
+            'volume': 'volume',
         },
-        'record-view-all-versions': {
-            'params': {'conceptrecid': conceptrecid},
-            'fields': {
-                'version_views': 'count',
-                'version_unique_views': 'unique_count',
-            }
+    },
+    'record-view-all-versions': {
+        'param': 'conceptrecid',
+        'fields': {
+            'version_views': 'count',
+            'version_unique_views': 'unique_count',
+        }
+    },
+    'record-download-all-versions': {
+        'param': 'conceptrecid',
+        'fields': {
+            'version_downloads': 'count',
+            'version_unique_downloads': 'unique_count',
+            'version_volume': 'volume',
         },
-        'record-download-all-versions': {
-            'params': {'conceptrecid': conceptrecid},
-            'fields': {
-                'version_downloads': 'count',
-                'version_unique_downloads': 'unique_count',
-                'version_volume': 'volume',
-            },
-        },
-    }
-    for query_name, cfg in stats_sources.items():
+    },
+}
+"""Statistics queries and the record's "_stats" fields built from them."""
+
+
+def build_record_stats(recid, conceptrecid):
+    """Build the record's stats."""
+    stats = {}
+    params = {'recid': recid, 'conceptrecid': conceptrecid}
+    for query_name, cfg in RECORD_STATS_SOURCES.items():
         try:
             query_cfg = current_stats.queries[query_name]
             query = query_cfg.cls(name=query_name, **query_cfg.params)
-            result = query.run(**cfg['params'])
+            result = query.run(**{cfg['param']: params[cfg['param']]})
             for dst, src in cfg['fields'].items():
                 stats[dst] = result.get(src)
         except Exception:
-            pass
+            current_app.logger.warning(
+                'Failed to run statistics query %s for record %s.',
+                query_name, recid, exc_info=True)
+    return stats
+
+
+def build_records_stats(records):
+    """Build the stats of many records at once.
+
+    Instead of running the statistics queries for each record, each query is
+    run once for all records, as a terms aggregation on the record (or
+    concept record) IDs. All queries are sent in a single multi-search
+    request.
+
+    :param records: Iterable of ``(recid, conceptrecid)`` tuples.
+    :returns: Dictionary of ``recid`` (as string) to the record's stats.
+    """
+    records = [(str(recid), str(conceptrecid) if conceptrecid else None)
+               for recid, conceptrecid in records]
+    ids = {
+        'recid': sorted(set(r for r, _ in records)),
+        'conceptrecid': sorted(set(c for _, c in records if c)),
+    }
+
+    msearch, sources = None, []
+    for query_name, cfg in RECORD_STATS_SOURCES.items():
+        values = ids[cfg['param']]
+        if not values:
+            continue
+        query_cfg = current_stats.queries[query_name]
+        query = query_cfg.cls(name=query_name, **query_cfg.params)
+        field = query.required_filters[cfg['param']]
+        search = Search(index=query.index)[0:0]
+        for modifier in query.query_modifiers:
+            search = modifier(search)
+        search = search.filter('terms', **{field: values})
+        terms = search.aggs.bucket(
+            'ids', 'terms', field=field, size=len(values))
+        for dst, (metric, src, opts) in query.metric_fields.items():
+            terms.metric(dst, metric, field=src, **opts)
+        msearch = (msearch or MultiSearch(using=query.client)).add(search)
+        sources.append(cfg)
+
+    stats = dict((recid, {}) for recid, _ in records)
+    if msearch is None:
+        return stats
+    try:
+        responses = msearch.execute(raise_on_error=False)
+    except Exception:
+        current_app.logger.exception('Failed to fetch records statistics.')
+        return stats
+
+    for cfg, response in zip(sources, responses):
+        if response is None:
+            # Leave out the fields of failed queries (e.g. missing indices)
+            current_app.logger.warning(
+                'Failed to fetch records statistics from %s.', cfg['fields'])
+            continue
+        buckets = dict((b.key, b) for b in response.aggregations.ids.buckets)
+        for recid, conceptrecid in records:
+            key = recid if cfg['param'] == 'recid' else conceptrecid
+            if key is None:
+                continue
+            bucket = buckets.get(key)
+            for dst, src in cfg['fields'].items():
+                # A sum over no aggregated documents is zero
+                stats[recid][dst] = bucket[src].value if bucket else 0.0
     return stats
 
 
+def get_record_versions(conceptrecids):
+    """Get the versions of many concept records with a single query.
+
+    :param conceptrecids: Iterable of concept record IDs.
+    :returns: List of ``(recid, conceptrecid, record UUID)`` tuples.
+    """
+    conceptrecids = [str(c) for c in conceptrecids]
+    if not conceptrecids:
+        return []
+    parent = aliased(PersistentIdentifier)
+    query = (
+        db.session.query(
+            PersistentIdentifier.pid_value,
+            parent.pid_value,
+            PersistentIdentifier.object_uuid,
+        )
+        .join(PIDRelation, PIDRelation.child_id == PersistentIdentifier.id)
+        .join(parent, PIDRelation.parent_id == parent.id)
+        .filter(
+            parent.pid_type == 'recid',
+            parent.pid_value.in_(conceptrecids),
+            PIDRelation.relation_type ==
+            resolve_relation_type_config('version').id,
+        )
+    )
+    return query.all()
+
+
+def update_records_stats(conceptrecids, chunk_size=500):
+    """Update the "_stats" of all versions of many concept records.
+
+    Only the "_stats" field of the indexed records is replaced, instead of
+    reindexing the whole records (which rebuilds them from the database).
+    The indexed documents are fetched with a multi-get and written back with
+    their new "_stats", using their current version with the ``external_gte``
+    version type. Unlike a partial update, this keeps the document version
+    equal to the record revision, so that later reindexing of the record is
+    not rejected. A document reindexed in the meantime (from a newer
+    revision, thus with fresh statistics) makes the write conflict and is
+    left as is. Records which are not indexed yet are sent to the bulk
+    indexer queue instead.
+
+    :param conceptrecids: Iterable of concept record IDs.
+    :param chunk_size: Number of concept records handled at once.
+    :returns: Tuple with the number of updated and reindexed records.
+    """
+    updated, missing = 0, []
+    index = build_alias_name('records')
+    for chunk in chunkify(conceptrecids, chunk_size):
+        versions = get_record_versions(chunk)
+        stats = build_records_stats((r, c) for r, c, _ in versions)
+        uuids = dict((str(uuid), recid) for recid, _, uuid in versions)
+        if not uuids:
+            continue
+        docs = current_search_client.mget(
+            index=index, body={'ids': list(uuids)})['docs']
+        missing.extend(d['_id'] for d in docs if not d.get('found'))
+
+        def actions():
+            for doc in docs:
+                recid = uuids[doc['_id']]
+                if not doc.get('found') or not stats[recid]:
+                    continue
+                source = doc['_source']
+                source['_stats'] = stats[recid]
+                yield {
+                    '_op_type': 'index',
+                    '_index': doc['_index'],
+                    '_id': doc['_id'],
+                    '_version': doc['_version'],
+                    '_version_type': 'external_gte',
+                    '_source': source,
+                }
+
+        for ok, item in streaming_bulk(current_search_client, actions(),
+                                       raise_on_error=False,
+                                       raise_on_exception=False):
+            if ok:
+                updated += 1
+            elif item['index'].get('status') != 409:
+                current_app.logger.warning(
+                    'Failed to update record statistics: %s', item)
+    if missing:
+        RecordIndexer().bulk_index(missing)
+    return updated, len(missing)
+
+
 def get_record_stats(recordid, throws=True):
     """Fetch record statistics from Elasticsearch."""
     try:
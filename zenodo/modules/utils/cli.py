@@ -29,6 +29,7 @@ from __future__ import absolute_import, print_function
 import json
 import os
 from io import SEEK_END, SEEK_SET
+from itertools import islice
 
 import click
 from flask.cli import with_appcontext
@@ -45,7 +46,8 @@ from zenodo.modules.records.resolvers import record_resolver
 from .grants import OpenAIREGrantsDump
 from .openaire import OpenAIRECommunitiesMappingUpdater
 from .tasks import has_corrupted_files_meta, repair_record_metadata, \
-    sync_record_oai, update_oaisets_cache, update_search_pattern_sets
+    sync_record_oai, sync_records_oai, update_oaisets_cache, \
+    update_search_pattern_sets
 
 
 @click.group()
@@ -311,8 +313,11 @@ def list_files(recid):
 @click.option('--eager', '-e', is_flag=True)
 @click.option('--oai-cache', is_flag=True)
 @click.option('--uuid', '-i')
+@click.option('--chunk-size', '-c', type=int, default=500,
+              help='Number of records synced per task (0 syncs each record '
+                   'in a separate task).')
 @with_appcontext
-def sync_oai(eager, oai_cache, uuid):
+def sync_oai(eager, oai_cache, uuid, chunk_size):
     """Update OAI IDs in the records."""
     if uuid:
         sync_record_oai(str(uuid))
@@ -321,6 +326,18 @@ def sync_oai(eager, oai_cache, uuid):
             PersistentIdentifier.pid_type == 'recid',
             PersistentIdentifier.object_type == 'rec',
             PersistentIdentifier.status == 'R')
+        if chunk_size:
+            uuids = (str(u) for u, in pids.with_entities(
+                PersistentIdentifier.object_uuid).yield_per(chunk_size))
+            with click.progressbar(uuids, length=pids.count()) as uuids_bar:
+                uuids_iter = iter(uuids_bar)
+                for chunk in iter(lambda: list(islice(uuids_iter, chunk_size)),
+                                  []):
+                    if eager:
+                        sync_records_oai(chunk)
+                    else:
+                        sync_records_oai.delay(chunk)
+            return
         uuids = (pid.get_assigned_object() for pid in pids)
         oaisets_cache = {} if oai_cache else None
         with click.progressbar(uuids, length=pids.count()) as uuids_bar:
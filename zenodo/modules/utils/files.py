@@ -26,9 +26,20 @@
 
 from __future__ import absolute_import, print_function
 
+import csv
+import json
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+import six
 import sqlalchemy as sa
 from flask import current_app
-from invenio_files_rest.models import FileInstance
+from invenio_db import db
+from invenio_files_rest.models import FileInstance, ObjectVersion
+from invenio_records.models import RecordMetadata
+from invenio_records_files.models import RecordsBuckets
+
+from zenodo.modules.records.utils import schema_prefix
 
 
 def checksum_verification_files_query():
@@ -40,3 +51,155 @@ def checksum_verification_files_query():
         files = files.filter(
             sa.or_(*[FileInstance.uri.startswith(p) for p in uri_prefixes]))
     return files
+
+
+#: Columns of the file integrity report.
+FILE_INTEGRITY_REPORT_FIELDS = (
+    'file_id', 'uri', 'filename', 'created', 'checksum', 'last_check',
+    'last_check_at', 'bucket_id', 'type', 'recid', 'deposit_id',
+)
+
+
+def _file_checksum(app, fileinstance):
+    """Compute the checksum of a file from its storage."""
+    with app.app_context():
+        try:
+            return fileinstance.storage().checksum()
+        except Exception as exc:
+            current_app.logger.exception(str(exc))
+
+
+def revalidate_files(files, workers, page_size):
+    """Verify the checksums of files with bounded concurrency.
+
+    The checksums of each page of files are computed by at most ``workers``
+    threads, and their results are stored in a single transaction.
+
+    :param files: Query of the files to verify.
+    :param workers: Maximum number of checksums computed in parallel.
+    :param page_size: Number of files verified per transaction.
+    """
+    app = current_app._get_current_object()
+    ids = [i for i, in files.with_entities(FileInstance.id)]
+    pool = ThreadPool(workers)
+    try:
+        for i in range(0, len(ids), page_size):
+            page = FileInstance.query.filter(
+                FileInstance.id.in_(ids[i:i + page_size])).all()
+            checksums = pool.map(
+                lambda f: _file_checksum(app, f), page)
+            for f, checksum in zip(page, checksums):
+                f.last_check = (None if checksum is None
+                                else f.checksum == checksum)
+                f.last_check_at = datetime.utcnow()
+            db.session.commit()
+    finally:
+        pool.close()
+        pool.join()
+
+
+def file_integrity_report_rows(files, page_size):
+    """Yield the report rows of files, with their records and deposits.
+
+    Each page of files is fetched in a single query, joined with the object
+    versions of the files and the record or deposit of their bucket. Pages
+    are selected by keyset on the file creation date and identifier.
+
+    :param files: Query of the reported files.
+    :param page_size: Number of files fetched per query.
+    """
+    order = (FileInstance.created.desc(), FileInstance.id.desc())
+    schema_types = {}
+    last = None
+    while True:
+        page_files = files.with_entities(FileInstance.id)
+        if last is not None:
+            page_files = page_files.filter(sa.or_(
+                FileInstance.created < last[0],
+                sa.and_(FileInstance.created == last[0],
+                        FileInstance.id < last[1])))
+        page_files = page_files.order_by(*order).limit(page_size).subquery()
+        rows = (
+            db.session.query(
+                FileInstance.id, FileInstance.uri, FileInstance.created,
+                FileInstance.checksum, FileInstance.last_check,
+                FileInstance.last_check_at, ObjectVersion.key,
+                ObjectVersion.bucket_id, RecordMetadata.json['$schema'],
+                RecordMetadata.json['recid'],
+                RecordMetadata.json['_deposit']['id'])
+            .filter(FileInstance.id.in_(sa.select([page_files.c.id])))
+            .outerjoin(ObjectVersion,
+                       ObjectVersion.file_id == FileInstance.id)
+            .outerjoin(RecordsBuckets,
+                       RecordsBuckets.bucket_id == ObjectVersion.bucket_id)
+            .outerjoin(RecordMetadata,
+                       RecordMetadata.id == RecordsBuckets.record_id)
+            .order_by(*order)
+            .all()
+        )
+        if not rows:
+            return
+        for (file_id, uri, created, checksum, last_check, last_check_at,
+             key, bucket_id, schema, recid, deposit_id) in rows:
+            if schema not in schema_types:
+                schema_types[schema] = schema_prefix(schema)
+            yield {
+                'file_id': str(file_id),
+                'uri': uri,
+                'filename': key,
+                'created': created,
+                'checksum': checksum,
+                'last_check': last_check,
+                'last_check_at': last_check_at,
+                'bucket_id': str(bucket_id) if bucket_id else None,
+                'type': {'records': 'record', 'deposits': 'deposit'}.get(
+                    schema_types[schema]),
+                'recid': recid,
+                'deposit_id': deposit_id,
+            }
+        last = rows[-1][2], rows[-1][0]
+
+
+def _csv_value(value):
+    """Format a value for the CSV writer."""
+    if value is None:
+        return ''
+    value = six.text_type(value)
+    return value.encode('utf-8') if six.PY2 else value
+
+
+def write_file_integrity_report(rows, fp, fmt='csv'):
+    """Write report rows to a file as they are produced.
+
+    :param rows: Iterable of report rows, grouped by file.
+    :param fp: File object to write to (in binary mode on Python 2).
+    :param fmt: Either ``'csv'`` or ``'json'``.
+    :returns: Summary of the report, with the number of reported files and
+        of files failing their checksum, erroring and linked to records or
+        deposits.
+    """
+    summary = {'files': 0, 'failed': 0, 'errored': 0, 'records': 0,
+               'deposits': 0}
+    last_file, file_types = None, set()
+    if fmt == 'csv':
+        writer = csv.DictWriter(fp, FILE_INTEGRITY_REPORT_FIELDS)
+        writer.writeheader()
+    else:
+        fp.write('[')
+    for i, row in enumerate(rows):
+        if row['file_id'] != last_file:
+            last_file, file_types = row['file_id'], set()
+            summary['files'] += 1
+            summary['failed' if row['last_check'] is False
+                    else 'errored'] += 1
+        # A file is counted once per kind, whatever its number of objects
+        if row['type'] and row['type'] not in file_types:
+            file_types.add(row['type'])
+            summary[row['type'] + 's'] += 1
+        if fmt == 'csv':
+            writer.writerow({k: _csv_value(v) for k, v in row.items()})
+        else:
+            fp.write((',\n' if i else '\n') + json.dumps(row, default=str))
+    if fmt != 'csv':
+        fp.write('\n]\n')
+    return summary
@@ -21,17 +21,21 @@
 
 from __future__ import absolute_import, unicode_literals
 
-from collections import namedtuple
+import tempfile
+from collections import defaultdict, namedtuple
 from datetime import datetime
 from itertools import chain as ichain
+from uuid import uuid4
 
+import six
 import sqlalchemy as sa
-from celery import chain, group, shared_task
+from celery import chain, chord, shared_task
 from celery.utils.log import get_task_logger
 from dictdiffer import diff
 from elasticsearch_dsl import Q
 from flask import current_app
 from flask_mail import Message
+from invenio_cache import current_cache
 from invenio_db import db
 from invenio_files_rest.models import FileInstance
 from invenio_indexer.api import RecordIndexer
@@ -39,13 +43,14 @@ from invenio_oaiserver.minters import oaiid_minter
 from invenio_oaiserver.models import OAISet
 from invenio_oaiserver.query import OAIServerSearch
 from invenio_oaiserver.utils import datetime_to_datestamp
-from invenio_pidstore.models import PersistentIdentifier
+from invenio_pidstore import current_pidstore
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_records.api import Record
-from invenio_records_files.models import RecordsBuckets
 from six.moves import filter
+from sqlalchemy.exc import IntegrityError
 
-from zenodo.modules.records.serializers.schemas.common import ui_link_for
-from zenodo.modules.records.utils import is_deposit, is_record
+from .files import file_integrity_report_rows, revalidate_files, \
+    write_file_integrity_report
 
 logger = get_task_logger(__name__)
 
@@ -155,6 +160,89 @@ def sync_record_oai(uuid, cache=None):
                 pid=pid, id=uuid))
 
 
+def load_oaisets_cache():
+    """Return an OAISet cache prewarmed with all the OAISets."""
+    oaisets = OAISet.query.with_entities(OAISet.spec, OAISet.search_pattern)
+    return {spec: OAISetCache(search_pattern=search_pattern)
+            for spec, search_pattern in oaisets}
+
+
+@shared_task
+def sync_records_oai(uuids):
+    """Mint and sync the OAI ID information of a chunk of records.
+
+    Behaves like :func:`sync_record_oai` for each record, but fetches the
+    existing OAI PIDs of the chunk in one query, mints the missing ones in
+    bulk, and commits and reindexes all the records together.
+
+    :param uuids: UUIDs of the records of the chunk.
+    :type uuids: list
+    """
+    cache = load_oaisets_cache()
+    records = Record.get_records(uuids)
+    oai_pids = defaultdict(list)
+    for pid in PersistentIdentifier.query.filter(
+            PersistentIdentifier.pid_type == 'oai',
+            PersistentIdentifier.object_uuid.in_([r.id for r in records])):
+        oai_pids[pid.object_uuid].append(pid)
+
+    fetcher = current_pidstore.fetchers[
+        current_app.config['OAISERVER_CONTROL_NUMBER_FETCHER']]
+    id_prefix = current_app.config['OAISERVER_ID_PREFIX']
+    managed_prefixes = current_app.config['OAISERVER_MANAGED_ID_PREFIXES']
+    new_pids, synced = [], []
+    for rec in records:
+        pids = oai_pids.get(rec.id, [])
+        if not pids:
+            rec.setdefault('_oai', {})
+            if rec['_oai'].get('id') is None:
+                rec['_oai']['id'] = id_prefix + str(
+                    fetcher(rec.id, rec).pid_value)
+            new_pids.append(dict(
+                pid_type='oai', pid_value=str(rec['_oai']['id']),
+                pid_provider='oai', object_type='rec', object_uuid=rec.id,
+                status=PIDStatus.REGISTERED))
+            rec['_oai']['sets'] = get_synced_sets(rec, cache=cache)
+            synced.append(rec)
+        elif len(pids) == 1:
+            pid = pids[0]
+            if not any(pid.pid_value.startswith(p) for p in managed_prefixes):
+                logger.exception(
+                    'Unknown OAIID prefix: {0}'.format(pid.pid_value))
+            elif requires_sync(rec, cache=cache):
+                rec.setdefault('_oai', {})
+                rec['_oai']['id'] = pid.pid_value
+                rec['_oai']['updated'] = datetime_to_datestamp(
+                    datetime.utcnow())
+                rec['_oai']['sets'] = get_synced_sets(rec, cache=cache)
+                if not rec['_oai']['sets']:
+                    del rec['_oai']['sets']  # Don't store empty list
+                synced.append(rec)
+
+    try:
+        if new_pids:
+            db.session.bulk_insert_mappings(PersistentIdentifier, new_pids)
+        for rec in synced:
+            rec.commit()
+        db.session.commit()
+    except IntegrityError:
+        # An OAI ID was minted meanwhile (e.g. by a concurrent mint), thus
+        # sync the records one by one, so that only the conflicting ones fail.
+        db.session.rollback()
+        for rec in records:
+            try:
+                sync_record_oai(str(rec.id), cache=cache)
+            except Exception:
+                db.session.rollback()
+                logger.exception(
+                    'Failed to sync the OAI ID of record {0}'.format(rec.id))
+        return
+    if synced:
+        RecordIndexer().bulk_index([str(rec.id) for rec in synced])
+    logger.info('Minted {minted} and synced {synced} OAI PIDs.'.format(
+        minted=len(new_pids), synced=len(synced) - len(new_pids)))
+
+
 #
 # Files metadata repair task
 #
@@ -223,120 +311,193 @@ def add_oaiset_spec(record_uuid, spec):
     RecordIndexer().bulk_index([str(rec.id), ])
 
 
-def iter_record_oai_tasks(query, spec, func):
-    """Turn an ES query and a task function into an iterable of celery tasks.
+def _oaiset_sync_key(run_id, spec, action, chunk):
+    """Get the cache key for the result of an OAISet sync chunk."""
+    return 'zenodo:oaisets:sync:{0}:{1}:{2}:{3}'.format(
+        run_id, spec, action, chunk)
+
+
+@shared_task(acks_late=True)
+def sync_oaiset_chunk(run_id, spec, action, chunk, record_uuids):
+    """Add or remove an OAISet spec on a chunk of records.
+
+    The records are updated in a single transaction and sent for bulk
+    indexing together. Records which are already in the expected state are
+    left untouched, and the result of a finished chunk is kept for the run,
+    so that redelivered chunks are neither applied nor counted twice.
+
+    :param run_id: Identifier of the synchronization run.
+    :param spec: OAISet.spec name
+    :param action: Either ``'add'`` or ``'remove'``.
+    :param chunk: Index of the chunk in the run.
+    :param record_uuids: UUIDs of the records of the chunk.
+    :returns: Number of records changed, keyed by action.
+    """
+    key = _oaiset_sync_key(run_id, spec, action, chunk)
+    result = current_cache.get(key)
+    if result is not None:
+        return result
+
+    updated = datetime_to_datestamp(datetime.utcnow())
+    changed = []
+    for rec in Record.get_records(record_uuids):
+        sets = set(rec.get('_oai', {}).get('sets', []))
+        if (spec in sets) == (action == 'add'):
+            continue
+        if action == 'add':
+            sets.add(spec)
+        else:
+            sets.discard(spec)
+        rec.setdefault('_oai', {})
+        rec['_oai']['sets'] = sorted(sets)
+        rec['_oai']['updated'] = updated
+        if not rec['_oai']['sets']:
+            del rec['_oai']['sets']
+        rec.commit()
+        changed.append(str(rec.id))
+    db.session.commit()
+    if changed:
+        RecordIndexer().bulk_index(changed)
+
+    result = {action: len(changed)}
+    current_cache.set(
+        key, result,
+        timeout=current_app.config['ZENODO_OAISETS_SYNC_PROGRESS_TIMEOUT'])
+    return result
+
+
+@shared_task
+def report_oaiset_sync(results, spec):
+    """Report the number of records added to and removed from an OAISet."""
+    report = {
+        'spec': spec,
+        'added': sum(r.get('add', 0) for r in results),
+        'removed': sum(r.get('remove', 0) for r in results),
+    }
+    logger.info('OAISet {spec} synchronized: {added} records added, '
+                '{removed} records removed.'.format(**report))
+    return report
+
+
+def iter_record_uuid_chunks(query, chunk_size):
+    """Turn an ES query into an iterable of record UUID chunks.
 
     :param query: Elasticsearch query
     :type query: elasticsearch_dsl.Q
-    :param spec: OAISet.spec name
-    :type spec: str
-    :param func: shared_task function to execute for given record
-    :type func: function
+    :param chunk_size: Number of record UUIDs per chunk.
     """
     search = OAIServerSearch(
         index=current_app.config['OAISERVER_RECORD_INDEX'],
-    ).query(query)
+    ).query(query).source(False)
+    chunk = []
     for result in search.scan():
-        yield func.si(result.meta.id, spec)
+        chunk.append(result.meta.id)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
-def make_oai_task_group(oais):
-    """Make a celery group for an OAISet.
+def make_oai_task_group(oais, run_id, chunk_size):
+    """Make a celery chord for an OAISet.
 
     Since for each OAISet any given record has to be modified by either
     removing or adding the OAISet.spec, it's save to create a single
     group per OAISet for all records (no risk of racing conditions in parallel
-    execution).
+    execution). The records are updated in chunks and the chunk results are
+    collected in a single report.
 
     :param oais: OAISet for which the task group is to be made.
     :type oais: invenio_oaiserver.modules.OAISet
+    :param run_id: Identifier of the synchronization run.
+    :param chunk_size: Number of records updated per task.
     """
     spec_q = Q('match', **{'_oai.sets': oais.spec})
     pattern_q = Q('query_string', query=oais.search_pattern)
     spec_remove_q = Q('bool', must=spec_q, must_not=pattern_q)
     spec_add_q = Q('bool', must=pattern_q, must_not=spec_q)
-    return group(ichain(iter_record_oai_tasks(spec_remove_q, oais.spec,
-                                              remove_oaiset_spec),
-                        iter_record_oai_tasks(spec_add_q, oais.spec,
-                                              add_oaiset_spec)))
+    chunks = ichain(
+        (('remove', c) for c in
+         iter_record_uuid_chunks(spec_remove_q, chunk_size)),
+        (('add', c) for c in iter_record_uuid_chunks(spec_add_q, chunk_size)),
+    )
+    header = [sync_oaiset_chunk.si(run_id, oais.spec, action, i, uuids)
+              for i, (action, uuids) in enumerate(chunks)]
+    if not header:
+        return report_oaiset_sync.si([], oais.spec)
+    return chord(header, report_oaiset_sync.s(oais.spec))
 
 
 @shared_task
-def update_search_pattern_sets():
+def update_search_pattern_sets(chunk_size=None):
     """Update all records affected by search-patterned OAISets.
 
     In order to avoid racing condition when editing the records, all
     OAISet task groups are chained.
+
+    :param chunk_size: Number of records updated per task.
     """
+    chunk_size = chunk_size or \
+        current_app.config['ZENODO_OAISETS_SYNC_CHUNK_SIZE']
+    run_id = str(update_search_pattern_sets.request.id or uuid4())
     oaisets = OAISet.query.filter(OAISet.search_pattern.isnot(None))
-    chain(make_oai_task_group(oais) for oais in oaisets).apply_async()
-
-
-def format_file_integrity_report(report):
-    """Format the email body for the file integrity report."""
-    lines = []
-    for entry in report:
-        f = entry['file']
-        lines.append('ID: {}'.format(str(f.id)))
-        lines.append('URI: {}'.format(f.uri))
-        lines.append('Name: {}'.format(entry.get('filename')))
-        lines.append('Created: {}'.format(f.created))
-        lines.append('Checksum: {}'.format(f.checksum))
-        lines.append('Last Check: {}'.format(f.last_check_at))
-        if 'record' in entry:
-            lines.append(u'Record: {}'.format(
-                ui_link_for('record_html', id=entry['record'].get('recid'))
-            ))
-        if 'deposit' in entry:
-            lines.append(u'Deposit: {}'.format(
-                ui_link_for(
-                    'deposit_html',
-                    id=entry['deposit'].get('_deposit', {}).get('id'))
-            ))
-        lines.append(('-' * 80) + '\n')
-    return '\n'.join(lines)
+    chain(make_oai_task_group(oais, run_id, chunk_size)
+          for oais in oaisets).apply_async()
+
+
+def format_file_integrity_report(summary):
+    """Format the email body for the file integrity report summary."""
+    return '\n'.join([
+        'Unhealthy files: {files}',
+        '  - with a checksum mismatch: {failed}',
+        '  - with a failed checksum check: {errored}',
+        'Affected record files: {records}',
+        'Affected deposit files: {deposits}',
+        '',
+        'The unhealthy files are listed in the attached report.',
+    ]).format(**summary)
 
 
 @shared_task
-def file_integrity_report():
-    """Send a report of uhealthy/missing files to Zenodo admins."""
+def file_integrity_report(fmt='csv'):
+    """Send a report of uhealthy/missing files to Zenodo admins.
+
+    :param fmt: Format of the attached report (``'csv'`` or ``'json'``).
+    """
+    page_size = current_app.config['ZENODO_FILE_INTEGRITY_REPORT_PAGE_SIZE']
     # First retry verifying files that errored during their last check
-    files = FileInstance.query.filter(FileInstance.last_check.is_(None))
-    for f in files:
-        try:
-            f.clear_last_check()
-            db.session.commit()
-            f.verify_checksum(throws=False)
-            db.session.commit()
-        except Exception:
-            pass  # Don't fail sending the report in case of some file error
-
-    report = []
-    unhealthy_files = (
-        FileInstance.query
-        .filter(sa.or_(FileInstance.last_check.is_(None),
-                       FileInstance.last_check.is_(False)))
-        .order_by(FileInstance.created.desc()))
-
-    for f in unhealthy_files:
-        entry = {'file': f}
-        for o in f.objects:
-            entry['filename'] = o.key
-            # Find records/deposits for the files
-            rb = RecordsBuckets.query.filter(
-                RecordsBuckets.bucket_id == o.bucket_id).one_or_none()
-            if rb and rb.record and rb.record.json:
-                if is_deposit(rb.record.json):
-                    entry['deposit'] = rb.record.json
-                elif is_record(rb.record.json):
-                    entry['record'] = rb.record.json
-        report.append(entry)
-
-    if report:
+    try:
+        revalidate_files(
+            FileInstance.query.filter(FileInstance.last_check.is_(None)),
+            current_app.config['ZENODO_FILE_INTEGRITY_REPORT_WORKERS'],
+            page_size)
+    except Exception:
+        # Don't fail sending the report in case of some file error
+        db.session.rollback()
+        logger.exception('Failed to revalidate the errored files.')
+
+    unhealthy_files = FileInstance.query.filter(
+        sa.or_(FileInstance.last_check.is_(None),
+               FileInstance.last_check.is_(False)))
+
+    with tempfile.TemporaryFile('w+b' if six.PY2 else 'w+') as report:
+        summary = write_file_integrity_report(
+            file_integrity_report_rows(unhealthy_files, page_size),
+            report, fmt=fmt)
+        if not summary['files']:
+            return
+        report.seek(0)
+
         # Format and send the email
-        subject = u'Zenodo files integrity report [{}]'.format(datetime.now())
-        body = format_file_integrity_report(report)
+        now = datetime.now()
+        subject = u'Zenodo files integrity report [{}]'.format(now)
+        body = format_file_integrity_report(summary)
         sender = current_app.config['ZENODO_SYSTEM_SENDER_EMAIL']
         recipients = [current_app.config['ZENODO_ADMIN_EMAIL']]
         msg = Message(subject, sender=sender, recipients=recipients, body=body)
+        msg.attach(
+            'files-integrity-report-{0:%Y-%m-%d}.{1}'.format(now, fmt),
+            'text/csv' if fmt == 'csv' else 'application/json',
+            report.read())
         current_app.extensions['mail'].send(msg)